@@ -0,0 +1,55 @@
+# Compare response-cache key generation: legacy MD5-over-JSON vs. content-addressed BLAKE2b
+# Usage: python bench_cache_keys.py [iterations]
+import sys
+import json
+import time
+import hashlib
+
+from cache_keys import build_response_cache_key, hash_grid_children
+
+URL = "https://www.youtube.com/"
+WHITELIST = ["electronic", "programming"]
+BLACKLIST = ["music", "shorts", "clickbait/exaggerated titles", "brainrot"]
+
+
+def legacy_cache_key(grid_structure, url, whitelist, blacklist):
+    """The previous get_cache_key: layout only, child text never hashed"""
+    key_data = {
+        'url': url,
+        'whitelist': sorted(whitelist) if whitelist else [],
+        'blacklist': sorted(blacklist) if blacklist else [],
+        'grid_ids': [grid.get('id') for grid in grid_structure.get('grids', [])],
+        'total_children': sum(grid.get('totalChildren', 0) for grid in grid_structure.get('grids', []))
+    }
+    key_string = json.dumps(key_data, sort_keys=True)
+    return hashlib.md5(key_string.encode()).hexdigest()
+
+
+def build_grid(children_per_grid):
+    """Cleaned grid in the shape clean_grid_structure_for_llm produces, from gridstructure.json text"""
+    with open("gridstructure.json") as f:
+        sample = json.load(f)
+    texts = [line for line in sample['grids'][0]['gridText'].split('\n') if len(line) > 8]
+    children = [{'id': f"g1c{i}", 'text': texts[i % len(texts)][:50]} for i in range(children_per_grid)]
+    return {'totalGrids': 1, 'grids': [{'id': 'g1', 'totalChildren': len(children), 'children': children}]}
+
+
+def bench(label, func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    per_call = (time.perf_counter() - start) / iterations * 1e6
+    print(f"  {label:<44} {per_call:8.2f} us/key")
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    for size in (10, 40, 100):
+        grid = build_grid(size)
+        hashes = hash_grid_children(grid)
+        print(f"{size} children:")
+        bench("legacy md5(json) - layout only", lambda: legacy_cache_key(grid, URL, WHITELIST, BLACKLIST), iterations)
+        bench("blake2b - hash children + key", lambda: build_response_cache_key(
+            URL, WHITELIST, BLACKLIST, hash_grid_children(grid)), iterations)
+        bench("blake2b - key from reused child hashes", lambda: build_response_cache_key(
+            URL, WHITELIST, BLACKLIST, hashes), iterations)
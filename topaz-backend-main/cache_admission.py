@@ -0,0 +1,109 @@
+"""
+Frequency-aware cache admission (TinyLFU)
+Every lookup is counted in a fixed-size count-min sketch; when the cache is full a new
+key is admitted if it has been requested more often than the entry it would evict, and
+on a tie with probability tie_probability (a first-seen key usually ties with a cold
+victim, so strict "more often" would keep new popular keys out until missed again).
+Counters are halved every sample_size additions so old popularity fades, and the
+sketch never grows with the number of distinct keys.
+"""
+
+import random
+from typing import Any, Dict, Optional
+
+_HASH_MASK = (1 << 64) - 1
+
+
+class CountMinSketch:
+    """
+    depth rows of width 4-bit-range counters (one byte each, saturating at max_count),
+    indexed by double hashing. Uses conservative update: only the smallest counters
+    of a key are incremented, which keeps overestimation low.
+    """
+
+    def __init__(self, width: int, depth: int = 4, max_count: int = 15):
+        self.width = 1 << max(4, (width - 1).bit_length())  # power of two for masking
+        self.depth = depth
+        self.max_count = max_count
+        self.table = bytearray(self.width * self.depth)
+
+    def _indexes(self, key: str):
+        h = hash(key) & _HASH_MASK
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        mask = self.width - 1
+        return [row * self.width + ((h1 + row * h2) & mask) for row in range(self.depth)]
+
+    def increment(self, key: str):
+        indexes = self._indexes(key)
+        table = self.table
+        current = min(table[i] for i in indexes)
+        if current >= self.max_count:
+            return
+        for i in indexes:
+            if table[i] == current:
+                table[i] = current + 1
+
+    def estimate(self, key: str) -> int:
+        table = self.table
+        return min(table[i] for i in self._indexes(key))
+
+    def halve(self):
+        self.table = bytearray(count >> 1 for count in self.table)
+
+
+class TinyLFUAdmission:
+    """Admission policy: record() every access, admit(candidate, victim) on inserts into a full cache"""
+
+    def __init__(self, capacity: int, counters_per_entry: int = 4, depth: int = 4,
+                 sample_factor: int = 10, tie_probability: float = 0.5,
+                 rng: Optional[random.Random] = None):
+        self.sketch = CountMinSketch(max(16, capacity * counters_per_entry), depth=depth)
+        self.sample_size = max(100, capacity * sample_factor)
+        self.additions = 0
+        self.tie_probability = tie_probability
+        self.rng = rng or random.Random()
+        # Metrics for monitoring
+        self.resets = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.tie_admissions = 0
+
+    def record(self, key: str):
+        self.sketch.increment(key)
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            # Aging: halve every counter so frequency reflects recent traffic
+            self.sketch.halve()
+            self.additions //= 2
+            self.resets += 1
+
+    def frequency(self, key: str) -> int:
+        return self.sketch.estimate(key)
+
+    def admit(self, candidate: str, victim: str) -> bool:
+        candidate_count = self.sketch.estimate(candidate)
+        victim_count = self.sketch.estimate(victim)
+        if candidate_count > victim_count:
+            self.admitted += 1
+            return True
+        if candidate_count == victim_count and self.rng.random() < self.tie_probability:
+            self.admitted += 1
+            self.tie_admissions += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        decisions = self.admitted + self.rejected
+        return {
+            'policy': 'tinylfu',
+            'sketch_width': self.sketch.width,
+            'sketch_depth': self.sketch.depth,
+            'sketch_bytes': len(self.sketch.table),
+            'sample_size': self.sample_size,
+            'aging_resets': self.resets,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'tie_admissions': self.tie_admissions,
+            'rejection_rate_percent': round(self.rejected / decisions * 100, 2) if decisions else 0,
+        }
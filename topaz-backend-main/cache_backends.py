@@ -0,0 +1,445 @@
+"""
+Shared response-cache backends
+A per-worker ResponseCache (L1) sits in front of a backend every worker on the host can
+read: SQLite in WAL mode needs no extra service; the Redis backend works with any
+redis-py compatible client (LocalRedis is an in-process stand-in for tests)
+"""
+
+import os
+import json
+import time
+import asyncio
+import fnmatch
+import sqlite3
+import logging
+import threading
+from collections import namedtuple
+from typing import Any, Dict, Optional
+
+from cache_engine import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+# redis is optional; only needed for RESPONSE_CACHE_BACKEND=redis
+try:
+    import redis
+except ImportError:
+    redis = None
+
+StoredEntry = namedtuple('StoredEntry', ['value', 'stored_at', 'expires_at', 'metadata'])
+CacheLookup = namedtuple('CacheLookup', ['value', 'stale', 'metadata'])
+_MISS = CacheLookup(None, False, {})
+
+
+class CacheBackend:
+    """Interface for shared (L2) cache stores"""
+    name = "base"
+
+    def get(self, key: str) -> Optional[StoredEntry]:
+        raise NotImplementedError
+
+    def put(self, key: str, value: Any, expires_at: float, stored_at: Optional[float] = None,
+            metadata: Optional[Dict[str, Any]] = None):
+        raise NotImplementedError
+
+    def delete(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def delete_matching(self, criteria: Dict[str, Any]) -> int:
+        """Delete entries whose metadata has all the given field values; returns the count"""
+        raise NotImplementedError
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'backend': self.name}
+
+
+def _metadata_matches(metadata: Optional[Dict[str, Any]], criteria: Dict[str, Any]) -> bool:
+    return bool(metadata) and all(metadata.get(field) == value for field, value in criteria.items())
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    Host-local store shared by all workers through one SQLite file in WAL mode
+    (readers never block the writer). Eviction is oldest-stored-first, trimmed
+    every trim_interval writes so reads stay read-only. Calls block on disk and on
+    other workers' writes, so TieredCache runs them in worker threads.
+
+    The metadata fields invalidation filters on (INDEXED_FIELDS) are also stored as
+    indexed columns, so delete_matching is a single WHERE query.
+
+    The file is opened on first use in each process, so a backend created at import time
+    under gunicorn --preload never shares a connection across forked workers.
+    """
+    name = "sqlite"
+    INDEXED_FIELDS = ('pattern', 'profile')
+
+    def __init__(self, path: str, max_entries: int = 20000, trim_interval: int = 100,
+                 busy_timeout_ms: int = 2000):
+        self.path = path
+        self.max_entries = max_entries
+        self.trim_interval = trim_interval
+        self.busy_timeout_ms = busy_timeout_ms
+        self.writes_since_trim = 0
+        self.lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid: Optional[int] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """This process's connection, opened (and the schema created) on first use; callers hold self.lock"""
+        if self._conn is None or self._conn_pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000.0,
+                                   isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " stored_at REAL NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " metadata TEXT,"
+                " pattern TEXT,"
+                " profile TEXT)"
+            )
+            self._migrate(conn)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_stored ON response_cache(stored_at)")
+            for field in self.INDEXED_FIELDS:
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_response_cache_{field} ON response_cache({field})")
+            self._conn, self._conn_pid = conn, os.getpid()
+        return self._conn
+
+    def _migrate(self, conn: sqlite3.Connection):
+        """Add the indexed columns to a file written by an older version (its rows cannot be matched, so drop them)"""
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(response_cache)")}
+        missing = [field for field in self.INDEXED_FIELDS if field not in columns]
+        if not missing:
+            return
+        for field in missing:
+            try:
+                conn.execute(f"ALTER TABLE response_cache ADD COLUMN {field} TEXT")
+            except sqlite3.OperationalError:
+                pass  # another worker added it first
+        conn.execute("DELETE FROM response_cache")
+
+    def get(self, key: str) -> Optional[StoredEntry]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value, stored_at, expires_at, metadata FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[2] <= time.time():
+            return None
+        return StoredEntry(json.loads(row[0]), row[1], row[2], json.loads(row[3]) if row[3] else {})
+
+    def put(self, key: str, value: Any, expires_at: float, stored_at: Optional[float] = None,
+            metadata: Optional[Dict[str, Any]] = None):
+        metadata = metadata or {}
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, stored_at, expires_at, metadata, pattern, profile)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, json.dumps(value), stored_at or time.time(), expires_at,
+                 json.dumps(metadata, default=str) if metadata else None,
+                 metadata.get('pattern'), metadata.get('profile'))
+            )
+            self.writes_since_trim += 1
+            if self.writes_since_trim >= self.trim_interval:
+                self.writes_since_trim = 0
+                self._trim()
+
+    def _trim(self):
+        self.conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+        self.conn.execute(
+            "DELETE FROM response_cache WHERE key IN ("
+            " SELECT key FROM response_cache ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def delete(self, key: str) -> bool:
+        with self.lock:
+            return self.conn.execute("DELETE FROM response_cache WHERE key = ?", (key,)).rowcount > 0
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM response_cache")
+
+    def delete_matching(self, criteria: Dict[str, Any]) -> int:
+        indexed = {field: value for field, value in criteria.items() if field in self.INDEXED_FIELDS}
+        other = {field: value for field, value in criteria.items() if field not in self.INDEXED_FIELDS}
+        if not indexed:
+            # Only non-indexed fields: fall back to checking every row's metadata
+            with self.lock:
+                rows = self.conn.execute("SELECT key, metadata FROM response_cache WHERE metadata IS NOT NULL").fetchall()
+                keys = [(key,) for key, metadata in rows if _metadata_matches(json.loads(metadata), other)]
+                if keys:
+                    self.conn.executemany("DELETE FROM response_cache WHERE key = ?", keys)
+            return len(keys)
+        where = " AND ".join(f"{field} = ?" for field in indexed)
+        params = [str(value) for value in indexed.values()]
+        with self.lock:
+            if not other:
+                return self.conn.execute(f"DELETE FROM response_cache WHERE {where}", params).rowcount
+            rows = self.conn.execute(f"SELECT key, metadata FROM response_cache WHERE {where}", params).fetchall()
+            keys = [(key,) for key, metadata in rows if metadata and _metadata_matches(json.loads(metadata), other)]
+            if keys:
+                self.conn.executemany("DELETE FROM response_cache WHERE key = ?", keys)
+        return len(keys)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+        return {'backend': self.name, 'path': self.path, 'entries': entries, 'max_entries': self.max_entries}
+
+
+class RedisCacheBackend(CacheBackend):
+    """Redis (or any client with get/set(px=)/delete/scan_iter) as the shared store"""
+    name = "redis"
+
+    def __init__(self, client, prefix: str = "topaz:response:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisCacheBackend":
+        if redis is None:
+            raise ImportError("redis package is not installed")
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def get(self, key: str) -> Optional[StoredEntry]:
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        if data['expires_at'] <= time.time():
+            return None
+        return StoredEntry(data['value'], data['stored_at'], data['expires_at'], data.get('metadata') or {})
+
+    def put(self, key: str, value: Any, expires_at: float, stored_at: Optional[float] = None,
+            metadata: Optional[Dict[str, Any]] = None):
+        ttl_ms = int((expires_at - time.time()) * 1000)
+        if ttl_ms <= 0:
+            return
+        payload = json.dumps({
+            'value': value,
+            'stored_at': stored_at or time.time(),
+            'expires_at': expires_at,
+            'metadata': metadata or {},
+        }, default=str)
+        self.client.set(self.prefix + key, payload, px=ttl_ms)
+
+    def delete(self, key: str) -> bool:
+        return bool(self.client.delete(self.prefix + key))
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def delete_matching(self, criteria: Dict[str, Any]) -> int:
+        keys = []
+        for name in self.client.scan_iter(match=self.prefix + "*"):
+            raw = self.client.get(name)
+            if raw is not None and _metadata_matches(json.loads(raw).get('metadata'), criteria):
+                keys.append(name)
+        return self.client.delete(*keys) if keys else 0
+
+
+class LocalRedis:
+    """Minimal in-process stand-in for the redis-py calls RedisCacheBackend uses"""
+
+    def __init__(self):
+        self.data: Dict[str, tuple] = {}
+
+    def _live(self, name: str):
+        item = self.data.get(name)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.time():
+            del self.data[name]
+            return None
+        return value
+
+    def get(self, name: str):
+        value = self._live(name)
+        return value.encode('utf-8') if isinstance(value, str) else value
+
+    def set(self, name: str, value, ex: Optional[int] = None, px: Optional[int] = None):
+        ttl = px / 1000.0 if px is not None else ex
+        self.data[name] = (value, time.time() + ttl if ttl is not None else None)
+        return True
+
+    def delete(self, *names) -> int:
+        return sum(1 for name in names if self.data.pop(name, None) is not None)
+
+    def scan_iter(self, match: str = "*"):
+        return [name for name in list(self.data) if fnmatch.fnmatchcase(name, match) and self._live(name) is not None]
+
+    def ping(self) -> bool:
+        return True
+
+
+class TieredCache:
+    """
+    Per-worker L1 (ResponseCache) in front of an optional shared backend (L2).
+    L1 entries live at most l1_ttl so invalidations in other workers propagate quickly.
+    Backend errors are logged and counted but never fail the request. Code on the event
+    loop uses alookup/aput/adelete_matching, which run backend calls in worker threads.
+
+    Entries written with stale_ttl stay in L2 until the end of their grace window, with
+    the real expiry in metadata['fresh_until'] (L1 copies always carry it when there is a
+    backend, since their own expiry is capped). With a backend, stale reads come from L2
+    (so deletes are honoured); the L1 copy is only served stale when L2 is unreachable.
+    """
+
+    def __init__(self, l1: ResponseCache, backend: Optional[CacheBackend] = None, l1_ttl: float = 60):
+        self.l1 = l1
+        self.backend = backend
+        self.l1_ttl = l1_ttl
+        # Metrics for monitoring
+        self.l2_hits = 0
+        self.l2_misses = 0
+        self.backend_errors = 0
+
+    def _l1_ttl(self, expires_at: float) -> float:
+        remaining = expires_at - time.time()
+        return min(remaining, self.l1_ttl) if self.backend is not None else remaining
+
+    def get(self, key: str) -> Any:
+        return self.lookup(key).value
+
+    def lookup(self, key: str, allow_stale: bool = False) -> CacheLookup:
+        """CacheLookup(value, stale, metadata); value is None on a miss. Stale values only with allow_stale."""
+        cached = self._lookup_l1(key, allow_stale)
+        if cached is not None:
+            return cached
+        try:
+            stored = self.backend.get(key)
+        except Exception as e:
+            return self._read_failed(key, allow_stale, e)
+        return self._from_backend(key, stored, allow_stale)
+
+    async def alookup(self, key: str, allow_stale: bool = False) -> CacheLookup:
+        """lookup() for the event loop: the backend read runs in a worker thread"""
+        cached = self._lookup_l1(key, allow_stale)
+        if cached is not None:
+            return cached
+        try:
+            stored = await asyncio.to_thread(self.backend.get, key)
+        except Exception as e:
+            return self._read_failed(key, allow_stale, e)
+        return self._from_backend(key, stored, allow_stale)
+
+    def _lookup_l1(self, key: str, allow_stale: bool) -> Optional[CacheLookup]:
+        """The L1 answer, _MISS without a backend, or None when L2 must be asked"""
+        entry = self.l1.get_entry(key, allow_stale=allow_stale and self.backend is None)
+        if entry is not None:
+            return CacheLookup(entry.value, entry.is_stale(), entry.metadata)
+        return _MISS if self.backend is None else None
+
+    def _read_failed(self, key: str, allow_stale: bool, error: Exception) -> CacheLookup:
+        self.backend_errors += 1
+        logger.warning(f"Shared cache read failed ({self.backend.name}): {error}")
+        if allow_stale:
+            entry = self.l1.get_entry(key, allow_stale=True)
+            if entry is not None:
+                return CacheLookup(entry.value, True, entry.metadata)
+        return _MISS
+
+    def _from_backend(self, key: str, stored: Optional[StoredEntry], allow_stale: bool) -> CacheLookup:
+        now = time.time()
+        fresh_until = stored.metadata.get('fresh_until', stored.expires_at) if stored is not None else 0
+        if stored is None or (fresh_until <= now and not allow_stale):
+            self.l2_misses += 1
+            return _MISS
+        self.l2_hits += 1
+        metadata = {k: v for k, v in stored.metadata.items() if k != 'fresh_until'}
+        if fresh_until <= now:
+            return CacheLookup(stored.value, True, metadata)
+        l1_ttl = self._l1_ttl(fresh_until)
+        stale_ttl = stored.expires_at - now - l1_ttl if 'fresh_until' in stored.metadata else 0
+        self.l1.put(key, stored.value, ttl=l1_ttl, stale_ttl=stale_ttl, fresh_until=fresh_until, **metadata)
+        return CacheLookup(stored.value, False, metadata)
+
+    def put(self, key: str, value: Any, ttl: Optional[float] = None, stale_ttl: float = 0, **metadata):
+        write = self._put_l1(key, value, ttl, stale_ttl, metadata)
+        if write is None:
+            return
+        try:
+            self.backend.put(key, value, **write)
+        except Exception as e:
+            self._write_failed(e)
+
+    async def aput(self, key: str, value: Any, ttl: Optional[float] = None, stale_ttl: float = 0, **metadata):
+        """put() for the event loop: the backend write runs in a worker thread"""
+        write = self._put_l1(key, value, ttl, stale_ttl, metadata)
+        if write is None:
+            return
+        try:
+            await asyncio.to_thread(self.backend.put, key, value, **write)
+        except Exception as e:
+            self._write_failed(e)
+
+    def _put_l1(self, key: str, value: Any, ttl: Optional[float], stale_ttl: float,
+                metadata: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Store the L1 copy; returns the backend.put keyword arguments, or None without a backend"""
+        ttl = self.l1.ttl if ttl is None else ttl
+        now = time.time()
+        l1_ttl = self._l1_ttl(now + ttl)
+        # The L1 copy keeps the full grace window as a fallback for when L2 is unreachable
+        l1_metadata = {**metadata, 'fresh_until': now + ttl} if self.backend is not None else metadata
+        self.l1.put(key, value, ttl=l1_ttl, stale_ttl=ttl + stale_ttl - l1_ttl if stale_ttl else 0, **l1_metadata)
+        if self.backend is None:
+            return None
+        if stale_ttl:
+            metadata = {**metadata, 'fresh_until': now + ttl}
+        return {'expires_at': now + ttl + stale_ttl, 'stored_at': now, 'metadata': metadata}
+
+    def _write_failed(self, error: Exception):
+        self.backend_errors += 1
+        logger.warning(f"Shared cache write failed ({self.backend.name}): {error}")
+
+    def delete(self, key: str) -> bool:
+        removed = self.l1.delete(key)
+        if self.backend is not None:
+            try:
+                removed = self.backend.delete(key) or removed
+            except Exception as e:
+                self.backend_errors += 1
+                logger.warning(f"Shared cache delete failed ({self.backend.name}): {e}")
+        return removed
+
+    def delete_matching(self, criteria: Dict[str, Any]) -> int:
+        """Delete matching entries from the shared backend (L1 copies are the caller's concern)"""
+        if self.backend is None:
+            return 0
+        try:
+            return self.backend.delete_matching(criteria)
+        except Exception as e:
+            self.backend_errors += 1
+            logger.warning(f"Shared cache invalidation failed ({self.backend.name}): {e}")
+            return 0
+
+    async def adelete_matching(self, criteria: Dict[str, Any]) -> int:
+        """delete_matching() for the event loop: runs in a worker thread"""
+        return await asyncio.to_thread(self.delete_matching, criteria)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {'l1': self.l1.get_stats()}
+        if self.backend is not None:
+            try:
+                backend_stats = self.backend.get_stats()
+            except Exception as e:
+                backend_stats = {'backend': self.backend.name, 'error': str(e)}
+            stats['l2'] = {
+                **backend_stats,
+                'hits': self.l2_hits,
+                'misses': self.l2_misses,
+                'errors': self.backend_errors,
+                'l1_ttl_seconds': self.l1_ttl,
+            }
+        return stats
@@ -0,0 +1,203 @@
+"""
+Response cache engine
+One copy per entry in a single LRU map: O(1) get/put, TTL checked lazily on read
+(plus a cheap sweep of the least recently used end on write), and strict entry-count
+and byte limits enforced on every insert. An entry written with stale_ttl stays readable
+as stale (get_entry(..., allow_stale=True)) for that long after it expires. An optional
+admission policy (cache_admission.TinyLFUAdmission) decides whether a new key may displace
+the least recently used entry of a full cache.
+"""
+
+import json
+import time
+from collections import OrderedDict
+from itertools import islice
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate in-memory footprint of a cached value (its JSON length)"""
+    try:
+        return len(json.dumps(value, separators=(',', ':'), default=str))
+    except (TypeError, ValueError):
+        return len(repr(value))
+
+
+class CacheEntry:
+    __slots__ = ('value', 'stored_at', 'expires_at', 'stale_until', 'size', 'hits', 'metadata')
+
+    def __init__(self, value: Any, stored_at: float, expires_at: float, size: int,
+                 metadata: Optional[Dict[str, Any]] = None, stale_until: Optional[float] = None):
+        self.value = value
+        self.stored_at = stored_at
+        self.expires_at = expires_at
+        # Kept (readable as stale) until stale_until; equal to expires_at when there is no grace window
+        self.stale_until = expires_at if stale_until is None else max(stale_until, expires_at)
+        self.size = size
+        self.hits = 0
+        self.metadata = metadata or {}
+
+    def is_stale(self, now: Optional[float] = None) -> bool:
+        return (now or time.time()) >= self.expires_at
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache with entry-count and byte limits.
+
+    Entries are kept in recency order (least recently used first), so eviction is a
+    popitem from the front. Expired entries are dropped when read, and each write
+    also drops up to sweep_limit expired entries from the LRU end.
+
+    With an admission policy every lookup is recorded, and when the cache is full a new
+    key is stored only if the policy prefers it over the LRU victim (put returns None).
+    """
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 64 * 1024 * 1024,
+                 ttl: float = 1800, sizeof: Callable[[Any], int] = estimate_size,
+                 sweep_limit: int = 8, admission=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.sweep_limit = sweep_limit
+        self.admission = admission
+        self.entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.total_bytes = 0
+        # Metrics for monitoring
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.expirations = 0
+        self.evictions = {'entries': 0, 'bytes': 0}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: str) -> bool:
+        return self.peek(key) is not None
+
+    def _remove(self, key: str) -> Optional[CacheEntry]:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry.size
+        return entry
+
+    def peek(self, key: str, now: Optional[float] = None) -> Optional[CacheEntry]:
+        """Return the live entry without touching recency or hit counters"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if (now or time.time()) >= entry.expires_at:
+            return None
+        return entry
+
+    def get_entry(self, key: str, now: Optional[float] = None,
+                  allow_stale: bool = False) -> Optional[CacheEntry]:
+        """
+        Live entry for key, or None. With allow_stale, an expired entry still inside its
+        grace window is returned too (check entry.is_stale()).
+        """
+        if self.admission is not None:
+            self.admission.record(key)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        now = now or time.time()
+        if now >= entry.stale_until:
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        if now >= entry.expires_at:
+            if not allow_stale:
+                self.misses += 1
+                return None
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+        self.entries.move_to_end(key)
+        entry.hits += 1
+        return entry
+
+    def get(self, key: str, now: Optional[float] = None) -> Any:
+        entry = self.get_entry(key, now)
+        return entry.value if entry is not None else None
+
+    def put(self, key: str, value: Any, ttl: Optional[float] = None,
+            size: Optional[int] = None, stale_ttl: float = 0, **metadata) -> Optional[CacheEntry]:
+        now = time.time()
+        replacing = self._remove(key) is not None
+        self._sweep_expired(now)
+        if (not replacing and self.admission is not None and self.entries
+                and len(self.entries) >= self.max_entries):
+            victim = next(iter(self.entries))
+            if not self.admission.admit(key, victim):
+                return None
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        entry = CacheEntry(
+            value,
+            stored_at=now,
+            expires_at=expires_at,
+            size=self.sizeof(value) if size is None else size,
+            metadata=metadata,
+            stale_until=expires_at + stale_ttl,
+        )
+        self.entries[key] = entry
+        self.total_bytes += entry.size
+        self._enforce_limits()
+        return entry
+
+    def delete(self, key: str) -> bool:
+        return self._remove(key) is not None
+
+    def clear(self):
+        self.entries.clear()
+        self.total_bytes = 0
+
+    def _sweep_expired(self, now: float):
+        """Drop expired entries (past their grace window) among the sweep_limit least recently used ones"""
+        if not self.sweep_limit:
+            return
+        expired = [key for key, entry in islice(self.entries.items(), self.sweep_limit)
+                   if entry.stale_until <= now]
+        for key in expired:
+            self._remove(key)
+            self.expirations += 1
+
+    def _enforce_limits(self):
+        while len(self.entries) > self.max_entries:
+            self._evict_oldest('entries')
+        # The entry just written is most recent, so it is only evicted if it alone is over budget
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            self._evict_oldest('bytes')
+
+    def _evict_oldest(self, cause: str):
+        _, entry = self.entries.popitem(last=False)
+        self.total_bytes -= entry.size
+        self.evictions[cause] += 1
+
+    def items(self, now: Optional[float] = None) -> Iterator[Tuple[str, CacheEntry]]:
+        """Live (key, entry) pairs, least recently used first"""
+        now = now or time.time()
+        for key, entry in list(self.entries.items()):
+            if entry.expires_at > now:
+                yield key, entry
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.stale_hits
+        return {
+            'entries': len(self.entries),
+            'max_entries': self.max_entries,
+            'bytes': self.total_bytes,
+            'max_bytes': self.max_bytes,
+            'ttl_seconds': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate_percent': round(self.hits / lookups * 100, 2) if lookups else 0,
+            'stale_hits': self.stale_hits,
+            'expirations': self.expirations,
+            'evictions': dict(self.evictions),
+            'admission': self.admission.get_stats() if self.admission is not None else None,
+        }
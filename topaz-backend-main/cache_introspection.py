@@ -0,0 +1,150 @@
+"""
+Response-cache introspection
+Lookup outcomes counted by URL pattern and result source, plus a report over this worker's
+L1 entries (memory, age histogram, hottest keys) and targeted invalidation by the
+pattern/profile recorded in each entry's metadata. Results computed before a matching
+invalidation (a background refresh racing it) are not written back; invalidation times are
+kept for max_compute_seconds, and results whose computation started earlier than that are
+not written back either.
+"""
+
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from cache_backends import TieredCache
+
+# Upper bounds (seconds) of the key-age histogram buckets; the last bucket is open-ended
+AGE_BUCKETS: List[Tuple[str, float]] = [
+    ('<1m', 60), ('1-5m', 300), ('5-15m', 900), ('15-30m', 1800), ('30-60m', 3600), ('1-6h', 21600),
+]
+
+
+def _rates(counts: Dict[str, int]) -> Dict[str, Any]:
+    lookups = counts['hits'] + counts['misses'] + counts['stale']
+    return {
+        **counts,
+        'lookups': lookups,
+        'hit_rate_percent': round(counts['hits'] / lookups * 100, 2) if lookups else 0,
+        'stale_rate_percent': round(counts['stale'] / lookups * 100, 2) if lookups else 0,
+        'miss_rate_percent': round(counts['misses'] / lookups * 100, 2) if lookups else 0,
+    }
+
+
+class CacheInspector:
+    def __init__(self, store: TieredCache, max_compute_seconds: float = 300):
+        self.store = store
+        self.max_compute_seconds = max_compute_seconds
+        self.by_pattern: Dict[str, Dict[str, int]] = defaultdict(lambda: {'hits': 0, 'misses': 0, 'stale': 0})
+        self.by_source: Dict[str, Dict[str, int]] = defaultdict(lambda: {'hits': 0, 'misses': 0, 'stale': 0})
+        self.invalidations = 0
+        self.writes_dropped = 0
+        # Matched criteria (frozenset of (field, value)) -> time of the last invalidation
+        self.invalidated_at: Dict[frozenset, float] = {}
+
+    def record_lookup(self, pattern: str, found: bool, stale: bool = False, source: Optional[str] = None):
+        """Count one response-cache lookup (misses have no source)"""
+        outcome = 'misses' if not found else ('stale' if stale else 'hits')
+        self.by_pattern[pattern or 'default'][outcome] += 1
+        if found:
+            self.by_source[source or 'model'][outcome] += 1
+
+    def report(self, top_n: int = 20, now: Optional[float] = None) -> Dict[str, Any]:
+        now = now or time.time()
+        l1 = self.store.l1
+        histogram = {label: 0 for label, _ in AGE_BUCKETS}
+        histogram['>6h'] = 0
+        entries_by_pattern: Dict[str, Dict[str, int]] = defaultdict(lambda: {'entries': 0, 'bytes': 0})
+        entries_by_source: Dict[str, Dict[str, int]] = defaultdict(lambda: {'entries': 0, 'bytes': 0})
+        stale_entries = 0
+        hottest = []
+
+        for key, entry in list(l1.entries.items()):
+            if entry.stale_until <= now:
+                continue
+            age = now - entry.stored_at
+            for label, upper in AGE_BUCKETS:
+                if age < upper:
+                    histogram[label] += 1
+                    break
+            else:
+                histogram['>6h'] += 1
+            pattern = entry.metadata.get('pattern', 'default')
+            source = entry.metadata.get('source', 'model')
+            for bucket in (entries_by_pattern[pattern], entries_by_source[source]):
+                bucket['entries'] += 1
+                bucket['bytes'] += entry.size
+            if entry.is_stale(now):
+                stale_entries += 1
+            hottest.append((entry.hits, key, entry))
+
+        hottest.sort(key=lambda item: item[0], reverse=True)
+        top_keys = [{
+            'key': key,
+            'hits': hits,
+            'pattern': entry.metadata.get('pattern'),
+            'profile': entry.metadata.get('profile'),
+            'source': entry.metadata.get('source', 'model'),
+            'bytes': entry.size,
+            'age_seconds': round(now - entry.stored_at, 1),
+            'expires_in_seconds': round(entry.metadata.get('fresh_until', entry.expires_at) - now, 1),
+        } for hits, key, entry in hottest[:top_n]]
+
+        return {
+            'scope': 'worker',
+            'entries': len(l1),
+            'stale_entries': stale_entries,
+            'bytes': l1.total_bytes,
+            'max_entries': l1.max_entries,
+            'max_bytes': l1.max_bytes,
+            'evictions': dict(l1.evictions),
+            'expirations': l1.expirations,
+            'admission': l1.admission.get_stats() if l1.admission is not None else None,
+            'lookups_by_pattern': {pattern: _rates(counts) for pattern, counts in self.by_pattern.items()},
+            'lookups_by_source': {source: _rates(counts) for source, counts in self.by_source.items()},
+            'entries_by_pattern': dict(entries_by_pattern),
+            'entries_by_source': dict(entries_by_source),
+            'age_histogram': histogram,
+            'top_keys': top_keys,
+            'tiers': self.store.get_stats(),
+            'invalidations': self.invalidations,
+            'writes_dropped': self.writes_dropped,
+        }
+
+    async def invalidate(self, pattern: Optional[str] = None, profile: Optional[str] = None) -> Dict[str, int]:
+        """
+        Drop every entry whose metadata matches all given fields, from this worker's L1 and
+        the shared backend (other workers' L1 copies age out within the L1 TTL)
+        """
+        criteria = {k: v for k, v in (('pattern', pattern), ('profile', profile)) if v is not None}
+        if not criteria:
+            return {'l1': 0, 'l2': 0}
+        now = time.time()
+        self._prune_invalidations(now)
+        self.invalidated_at[frozenset(criteria.items())] = now
+        matched = [key for key, entry in list(self.store.l1.entries.items())
+                   if all(entry.metadata.get(field) == value for field, value in criteria.items())]
+        for key in matched:
+            self.store.l1.delete(key)
+        l2_removed = await self.store.adelete_matching(criteria)
+        self.invalidations += 1
+        return {'l1': len(matched), 'l2': l2_removed}
+
+    def _prune_invalidations(self, now: float):
+        cutoff = now - self.max_compute_seconds
+        for criteria in [criteria for criteria, at in self.invalidated_at.items() if at < cutoff]:
+            del self.invalidated_at[criteria]
+
+    def should_drop_write(self, started_at: float, metadata: Dict[str, Any]) -> bool:
+        """
+        True if an entry with this metadata was invalidated after its computation started at
+        started_at, or if the computation started before the invalidations still remembered
+        """
+        now = time.time()
+        self._prune_invalidations(now)
+        tags = set(metadata.items())
+        if (started_at < now - self.max_compute_seconds
+                or any(at >= started_at and criteria <= tags for criteria, at in self.invalidated_at.items())):
+            self.writes_dropped += 1
+            return True
+        return False
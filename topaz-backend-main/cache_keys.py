@@ -0,0 +1,68 @@
+"""
+Content-addressed cache keys
+Children are hashed once per request (BLAKE2b over the preprocessed, normalized text,
+so an updated view count or "3 hours ago" does not change the hash) and the same hashes
+feed the response-cache key and the verdict cache
+"""
+
+import re
+import hashlib
+from typing import Dict, List, Optional
+
+_WHITESPACE_RE = re.compile(r'\s+')
+# Parts of a feed item that change while the item stays the same: engagement counts
+# ("1.2M views", "3,401 likes"), relative times ("3 hours ago") and durations ("12:07")
+_VOLATILE_RE = re.compile(
+    r'\b\d[\d.,]*\s*[kmb]?\s*(?:views?|likes?|comments?|replies|reply|retweets?|reposts?|'
+    r'upvotes?|points?|subscribers?|watching)\b'
+    r'|\b\d+\s*(?:seconds?|secs?|minutes?|mins?|hours?|hrs?|days?|weeks?|months?|years?|[smhdwy])\s+ago\b'
+    r'|\b\d{1,2}(?::\d{2}){1,2}\b'
+)
+
+
+def normalize_child_text(text: str) -> str:
+    """Case/whitespace-insensitive form of a child's text without counts, relative times and durations"""
+    return _WHITESPACE_RE.sub(' ', _VOLATILE_RE.sub(' ', (text or '').lower())).strip()
+
+
+def hash_child_text(text: str) -> str:
+    """Stable short hash of a child's normalized text"""
+    return hashlib.blake2b(normalize_child_text(text).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def canonical_terms(terms: Optional[List[str]]) -> List[str]:
+    """Sorted, lowercased, de-duplicated filter terms"""
+    return sorted({(t or '').strip().lower() for t in (terms or []) if (t or '').strip()})
+
+
+def hash_grid_children(cleaned_grid: Dict) -> Dict[str, str]:
+    """child ID -> text hash for every child of a cleaned grid, in grid order"""
+    hashes = {}
+    for grid in cleaned_grid.get('grids', []):
+        for child in grid.get('children', []):
+            child_id = child.get('id')
+            if child_id:
+                hashes[child_id] = hash_child_text(child.get('text', ''))
+    return hashes
+
+
+def build_response_cache_key(url: str, whitelist: Optional[List[str]], blacklist: Optional[List[str]],
+                             child_hashes: Dict[str, str], variant: Optional[str] = None,
+                             prompt_revision: Optional[str] = None) -> str:
+    """
+    Response-cache key over the URL, the canonical lists and each (child ID, text hash).
+    IDs are part of the key because the cached response is a list of IDs.
+    variant (a prompt experiment variant) and prompt_revision (the URL pattern's prompt content
+    hash, as in build_profile_key) are mixed in only when set; a prompt edit retires old keys.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(url.encode('utf-8'))
+    if variant:
+        h.update(b'\x1dv:' + variant.encode('utf-8'))
+    if prompt_revision:
+        h.update(b'\x1dr:' + prompt_revision.encode('utf-8'))
+    h.update(b'\x1e' + '\x1f'.join(canonical_terms(whitelist)).encode('utf-8'))
+    h.update(b'\x1e' + '\x1f'.join(canonical_terms(blacklist)).encode('utf-8'))
+    for child_id, text_hash in child_hashes.items():
+        h.update(f'\x1e{child_id}:{text_hash}'.encode('utf-8'))
+    return h.hexdigest()
@@ -0,0 +1,216 @@
+"""
+Response-cache snapshots for warm starts
+The hottest live entries are written as gzipped JSON lines (atomically, via a temp file)
+on shutdown and periodically; a new instance replays the file in small slices in the
+background under a time budget, so startup and readiness never wait for it.
+Every worker writes the same file: under a file lock, a worker merges its entries into the
+live ones already there (the hotter copy of a key wins) instead of overwriting them.
+"""
+
+import os
+import gzip
+import json
+import time
+import asyncio
+import logging
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+# fcntl is POSIX-only; without it concurrent writers are not serialized
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from cache_backends import TieredCache
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+
+class CacheSnapshotter:
+    def __init__(self, store: TieredCache, path: str, max_entries: int = 500,
+                 load_budget: float = 2.0, load_slice: int = 50,
+                 current_revision: Optional[Callable[[str], Optional[str]]] = None):
+        self.store = store
+        self.path = path
+        # pattern -> current prompt revision; entries stored under another revision are skipped
+        self.current_revision = current_revision
+        self.max_entries = max_entries
+        self.load_budget = load_budget
+        self.load_slice = load_slice
+        # Metrics for monitoring
+        self.writes = 0
+        self.write_errors = 0
+        self.last_write_at: Optional[float] = None
+        self.last_written_entries = 0
+        self.last_merged_entries = 0
+        self.loaded_entries = 0
+        self.skipped_expired = 0
+        self.skipped_outdated = 0
+        self.load_truncated = False
+        self.load_seconds: Optional[float] = None
+
+    def collect(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """The max_entries most-hit live L1 entries with their real (not L1-capped) expiry"""
+        now = now or time.time()
+        entries = []
+        for key, entry in self.store.l1.items(now):
+            metadata = dict(entry.metadata)
+            expires_at = metadata.pop('fresh_until', entry.expires_at)
+            entries.append({
+                'k': key,
+                'v': entry.value,
+                'e': expires_at,
+                's': max(entry.stale_until, expires_at),
+                'h': entry.hits,
+                'm': metadata,
+            })
+        entries.sort(key=lambda item: item['h'], reverse=True)
+        return entries[:self.max_entries]
+
+    @contextmanager
+    def _locked(self):
+        """Hold an exclusive lock on path.lock so workers writing at shutdown merge in turn"""
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def merge(self, entries: List[Dict[str, Any]], existing: List[Dict[str, Any]],
+              now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Live entries of both lists, one per key (the most-hit copy), hottest max_entries first"""
+        now = now or time.time()
+        by_key: Dict[str, Dict[str, Any]] = {}
+        for item in existing + entries:
+            if item['s'] <= now:
+                continue
+            current = by_key.get(item['k'])
+            if current is None or (item['h'], item['e']) > (current['h'], current['e']):
+                by_key[item['k']] = item
+        merged = sorted(by_key.values(), key=lambda item: item['h'], reverse=True)
+        return merged[:self.max_entries]
+
+    def write(self, entries: List[Dict[str, Any]]):
+        """Merge collected entries into the file at path (blocking; run in a thread from async code)"""
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with self._locked():
+                try:
+                    existing = self._read()
+                except Exception as e:
+                    logger.warning(f"Replacing unreadable cache snapshot ({self.path}): {e}")
+                    existing = []
+                merged = self.merge(entries, existing)
+                with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=5) as f:
+                    f.write(json.dumps({'version': SNAPSHOT_VERSION, 'written_at': time.time(),
+                                        'entries': len(merged)}) + '\n')
+                    for item in merged:
+                        f.write(json.dumps(item, separators=(',', ':'), default=str) + '\n')
+                os.replace(tmp_path, self.path)
+        except Exception as e:
+            self.write_errors += 1
+            logger.warning(f"Cache snapshot write failed ({self.path}): {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        self.writes += 1
+        self.last_write_at = time.time()
+        self.last_written_entries = len(merged)
+        own_keys = {item['k'] for item in entries}
+        self.last_merged_entries = sum(1 for item in merged if item['k'] not in own_keys)
+
+    def save(self):
+        """Collect and write synchronously (shutdown path)"""
+        self.write(self.collect())
+
+    async def save_async(self):
+        """Collect on the event loop, serialize and write in a worker thread"""
+        entries = self.collect()
+        await asyncio.to_thread(self.write, entries)
+
+    def _read(self) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return []
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            header = json.loads(f.readline() or '{}')
+            if header.get('version') != SNAPSHOT_VERSION:
+                logger.warning(f"Ignoring cache snapshot with version {header.get('version')}")
+                return []
+            return [json.loads(line) for line in f if line.strip()]
+
+    async def _restore(self, item: Dict[str, Any], now: float) -> bool:
+        if item['s'] <= now:
+            self.skipped_expired += 1
+            return False
+        metadata = item.get('m', {})
+        if (self.current_revision is not None and
+                metadata.get('revision') != self.current_revision(metadata.get('pattern'))):
+            self.skipped_outdated += 1
+            return False
+        ttl = max(0.0, item['e'] - now)
+        stale_ttl = item['s'] - max(item['e'], now)
+        await self.store.aput(item['k'], item['v'], ttl=ttl, stale_ttl=stale_ttl, **metadata)
+        admission = self.store.l1.admission
+        if admission is not None:
+            # Carry some of the old popularity over so admission does not evict restored hot keys
+            for _ in range(min(item.get('h', 0), 4)):
+                admission.record(item['k'])
+        self.loaded_entries += 1
+        return True
+
+    async def load(self):
+        """
+        Replay the snapshot (hottest first) in slices of load_slice entries, yielding to the
+        event loop between slices and stopping once load_budget seconds have passed
+        """
+        start = time.monotonic()
+        try:
+            items = await asyncio.to_thread(self._read)
+        except Exception as e:
+            logger.warning(f"Cache snapshot load failed ({self.path}): {e}")
+            return
+        for index, item in enumerate(items):
+            if index and index % self.load_slice == 0:
+                if time.monotonic() - start > self.load_budget:
+                    self.load_truncated = True
+                    break
+                await asyncio.sleep(0)
+            try:
+                await self._restore(item, time.time())
+            except Exception as e:
+                logger.warning(f"Skipping unreadable cache snapshot entry: {e}")
+        self.load_seconds = time.monotonic() - start
+        logger.info(f"Cache snapshot restored {self.loaded_entries}/{len(items)} entries "
+                    f"in {self.load_seconds:.3f}s")
+
+    async def run_periodic(self, interval: float):
+        """Write a snapshot every interval seconds until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            await self.save_async()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'path': self.path,
+            'max_entries': self.max_entries,
+            'writes': self.writes,
+            'write_errors': self.write_errors,
+            'last_write_at': self.last_write_at,
+            'last_written_entries': self.last_written_entries,
+            'last_merged_entries': self.last_merged_entries,
+            'loaded_entries': self.loaded_entries,
+            'skipped_expired': self.skipped_expired,
+            'skipped_outdated': self.skipped_outdated,
+            'load_truncated': self.load_truncated,
+            'load_seconds': round(self.load_seconds, 3) if self.load_seconds is not None else None,
+        }
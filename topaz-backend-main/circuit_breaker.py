@@ -0,0 +1,202 @@
+"""
+Async circuit breaker for outbound LLM calls
+Awaits the wrapped coroutine so failures and slow calls are actually recorded,
+trips on the error/slow-call rate over a sliding window, and rejects instantly
+while open so a dead provider stops eating the extension's timeout budget
+"""
+
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreakerOpenError(Exception):
+    """Raised without calling the provider while the breaker is OPEN (or probes are exhausted)"""
+
+
+class AsyncCircuitBreaker:
+    def __init__(self, name: str = "default",
+                 window_size: int = 20,
+                 window_seconds: float = 60.0,
+                 min_calls: int = 5,
+                 failure_rate_threshold: float = 50.0,
+                 slow_call_seconds: float = 6.0,
+                 reset_timeout: float = 30.0,
+                 half_open_max_calls: int = 1,
+                 half_open_success_threshold: int = 1):
+        self.name = name
+        self.window_size = window_size
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.half_open_success_threshold = half_open_success_threshold
+
+        self.state = 'CLOSED'  # CLOSED, OPEN, HALF_OPEN
+        self.opened_at = None
+        self.window = deque()  # (timestamp, failed, slow)
+        self.half_open_in_flight = 0
+        self.half_open_successes = 0
+
+        # Metrics for monitoring
+        self.total_requests = 0
+        self.total_failures = 0
+        self.total_slow_calls = 0
+        self.total_rejections = 0
+        self.state_changes = {'CLOSED': 0, 'OPEN': 0, 'HALF_OPEN': 0}
+        self.created_at = time.time()
+
+    @property
+    def failure_count(self) -> int:
+        """Failed or slow calls currently inside the sliding window"""
+        self._prune_window()
+        return sum(1 for _, failed, _ in self.window if failed)
+
+    def _prune_window(self):
+        cutoff = time.monotonic() - self.window_seconds
+        while self.window and (self.window[0][0] < cutoff or len(self.window) > self.window_size):
+            self.window.popleft()
+
+    def _change_state(self, new_state):
+        """Track state changes for metrics"""
+        if new_state != self.state:
+            self.state_changes[new_state] += 1
+            self.state = new_state
+
+    def _open(self, reason: str):
+        self._change_state('OPEN')
+        self.opened_at = time.monotonic()
+        self.half_open_in_flight = 0
+        self.half_open_successes = 0
+        logger.error(f"Circuit breaker {self.name} opened: {reason}")
+
+    def _close(self):
+        self._change_state('CLOSED')
+        self.window.clear()
+        self.half_open_in_flight = 0
+        self.half_open_successes = 0
+        logger.warning(f"Circuit breaker {self.name} reset to CLOSED")
+
+    def allows_calls(self) -> bool:
+        """True if a call made now would reach the provider (closed, or open and due for a probe)"""
+        if self.state == 'OPEN':
+            return time.monotonic() - self.opened_at >= self.reset_timeout
+        if self.state == 'HALF_OPEN':
+            return self.half_open_in_flight < self.half_open_max_calls
+        return True
+
+    def _acquire(self) -> bool:
+        """Admit or reject a call before it starts. Returns True if the call is a half-open probe."""
+        if self.state == 'OPEN':
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.total_rejections += 1
+                raise CircuitBreakerOpenError(f"Circuit breaker is OPEN for {self.name}")
+            self._change_state('HALF_OPEN')
+            self.half_open_successes = 0
+            logger.warning(f"Circuit breaker {self.name} transitioning to HALF_OPEN")
+
+        if self.state == 'HALF_OPEN':
+            if self.half_open_in_flight >= self.half_open_max_calls:
+                self.total_rejections += 1
+                raise CircuitBreakerOpenError(f"Circuit breaker is HALF_OPEN for {self.name} and probes are in flight")
+            self.half_open_in_flight += 1
+            return True
+
+        return False
+
+    def _record(self, is_probe: bool, failed: bool, duration: float):
+        slow = duration >= self.slow_call_seconds
+        counted_as_failure = failed or slow
+        if failed:
+            self.total_failures += 1
+        if slow:
+            self.total_slow_calls += 1
+
+        if is_probe:
+            self.half_open_in_flight = max(0, self.half_open_in_flight - 1)
+            if self.state != 'HALF_OPEN':
+                return
+            if counted_as_failure:
+                self._open("half-open probe failed" if failed else f"half-open probe slow ({duration:.2f}s)")
+                return
+            self.half_open_successes += 1
+            if self.half_open_successes >= self.half_open_success_threshold:
+                self._close()
+            return
+
+        if self.state != 'CLOSED':
+            return
+        self.window.append((time.monotonic(), counted_as_failure, slow))
+        self._prune_window()
+        if len(self.window) >= self.min_calls:
+            bad = sum(1 for _, f, _ in self.window if f)
+            rate = bad / len(self.window) * 100
+            if rate >= self.failure_rate_threshold:
+                self._open(f"{bad}/{len(self.window)} failed or slow calls ({rate:.0f}%)")
+
+    async def call(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        self.total_requests += 1
+        is_probe = self._acquire()
+        start = time.monotonic()
+        try:
+            result = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            # Caller went away; say nothing about the provider's health
+            if is_probe:
+                self.half_open_in_flight = max(0, self.half_open_in_flight - 1)
+            raise
+        except Exception:
+            self._record(is_probe, True, time.monotonic() - start)
+            raise
+        self._record(is_probe, False, time.monotonic() - start)
+        return result
+
+    def get_metrics(self):
+        """Get circuit breaker metrics"""
+        uptime = time.time() - self.created_at
+        failure_rate = (self.total_failures / self.total_requests * 100) if self.total_requests > 0 else 0
+        self._prune_window()
+        window_failures = sum(1 for _, failed, _ in self.window if failed)
+
+        return {
+            'name': self.name,
+            'state': self.state,
+            'total_requests': self.total_requests,
+            'total_failures': self.total_failures,
+            'total_slow_calls': self.total_slow_calls,
+            'total_rejections': self.total_rejections,
+            'failure_rate_percent': round(failure_rate, 2),
+            'window_calls': len(self.window),
+            'window_failure_rate_percent': round(window_failures / len(self.window) * 100, 2) if self.window else 0,
+            'current_failure_count': window_failures,
+            'failure_rate_threshold': self.failure_rate_threshold,
+            'slow_call_seconds': self.slow_call_seconds,
+            'half_open_in_flight': self.half_open_in_flight,
+            'state_changes': self.state_changes.copy(),
+            'uptime_seconds': round(uptime, 2)
+        }
+
+
+class CircuitBreakerRegistry:
+    """
+    One breaker per provider/model, created on first use with shared defaults
+    """
+
+    def __init__(self, **defaults):
+        self.defaults = defaults
+        self.breakers: Dict[str, AsyncCircuitBreaker] = {}
+
+    def get(self, provider: str, model: Optional[str] = None) -> AsyncCircuitBreaker:
+        name = f"{provider}:{model}" if model else provider
+        if name not in self.breakers:
+            self.breakers[name] = AsyncCircuitBreaker(name=name, **self.defaults)
+        return self.breakers[name]
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {name: breaker.get_metrics() for name, breaker in self.breakers.items()}
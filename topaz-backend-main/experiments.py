@@ -0,0 +1,216 @@
+r"""
+Prompt variant experiments
+Experiments are declared per URL prompt pattern in a JSON file; each visitor is assigned a
+variant deterministically from a hash of the experiment name and visitorId. A variant can
+swap the prompt (another prompts JSON file, a plain-text template or an inline prompt)
+and/or the wire format. Model calls and served responses (cache hits included) are
+aggregated per variant.
+
+Example file:
+{
+  "youtube-home-mini": {
+    "pattern": "^(https?://)?(www\\.)?youtube\\.com/?$",
+    "variants": {
+      "control": {"weight": 50},
+      "mini": {"weight": 25, "prompts_file": "miniprompts.json"},
+      "compact": {"weight": 25, "wire_format": "compact"}
+    }
+  }
+}
+"""
+
+import os
+import json
+import hashlib
+import logging
+from collections import namedtuple
+from typing import Any, Dict, List, Optional
+
+from prompt_layout import PromptTemplate
+from prompt_registry import PromptSet, validate_prompts
+from wire_format import WIRE_FORMATS
+
+logger = logging.getLogger(__name__)
+
+# Every pattern an experiment can target ("*" runs it on all patterns)
+ALL_PATTERNS = "*"
+BUCKETS = 10000
+
+# A visitor's variant for one request; key is None for a variant that changes nothing
+Assignment = namedtuple('Assignment', ['experiment', 'variant', 'key'])
+
+
+class Variant:
+    __slots__ = ('name', 'weight', 'prompts', 'template', 'wire_format')
+
+    def __init__(self, name: str, config: Dict[str, Any], base_dir: str = '.'):
+        self.name = name
+        self.weight = float(config.get('weight', 1))
+        if self.weight < 0:
+            raise ValueError(f"variant {name!r} has a negative weight")
+        self.prompts: Optional[PromptSet] = None
+        self.template: Optional[PromptTemplate] = None
+        if config.get('prompts_file'):
+            with open(os.path.join(base_dir, config['prompts_file']), 'r') as f:
+                data = json.load(f)
+            validate_prompts(data)
+            self.prompts = PromptSet(data)
+        elif config.get('prompt_file'):
+            with open(os.path.join(base_dir, config['prompt_file']), 'r') as f:
+                self.template = PromptTemplate(f.read())
+        elif config.get('prompt'):
+            self.template = PromptTemplate(config['prompt'])
+        self.wire_format = config.get('wire_format')
+        if self.wire_format is not None and self.wire_format not in WIRE_FORMATS:
+            raise ValueError(f"variant {name!r} has unknown wire_format {self.wire_format!r}")
+
+    @property
+    def changes_prompt(self) -> bool:
+        return self.prompts is not None or self.template is not None
+
+    @property
+    def is_control(self) -> bool:
+        return not self.changes_prompt and self.wire_format is None
+
+    def template_for_url(self, url: str) -> Optional[PromptTemplate]:
+        """This variant's prompt template for a URL, or None to keep the served prompt"""
+        if self.prompts is not None:
+            return self.prompts.templates.get(self.prompts.router.route(url).pattern)
+        return self.template
+
+
+def _new_totals() -> Dict[str, float]:
+    return {
+        'requests': 0, 'cache_hits': 0, 'fallbacks': 0, 'model_calls': 0, 'model_errors': 0,
+        'input_tokens': 0, 'output_tokens': 0, 'latency_total': 0.0,
+        'children_shown': 0, 'children_hidden': 0,
+    }
+
+
+class Experiment:
+    def __init__(self, name: str, config: Dict[str, Any], base_dir: str = '.'):
+        self.name = name
+        self.pattern = config.get('pattern', ALL_PATTERNS)
+        self.variants: List[Variant] = [
+            Variant(variant_name, variant_config, base_dir)
+            for variant_name, variant_config in (config.get('variants') or {}).items()
+        ]
+        total_weight = sum(variant.weight for variant in self.variants)
+        if not self.variants or total_weight <= 0:
+            raise ValueError(f"experiment {name!r} needs at least one variant with a positive weight")
+        # Cumulative bucket upper bounds, one per variant
+        self.bounds: List[int] = []
+        cumulative = 0.0
+        for variant in self.variants:
+            cumulative += variant.weight
+            self.bounds.append(round(cumulative / total_weight * BUCKETS))
+        self.totals: Dict[str, Dict[str, float]] = {variant.name: _new_totals() for variant in self.variants}
+
+    def assign(self, visitor_id: str) -> Variant:
+        digest = hashlib.blake2b(f"{self.name}:{visitor_id}".encode('utf-8'), digest_size=8).digest()
+        bucket = int.from_bytes(digest, 'big') % BUCKETS
+        for variant, bound in zip(self.variants, self.bounds):
+            if bucket < bound:
+                return variant
+        return self.variants[-1]
+
+
+class ExperimentRegistry:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.experiments: Dict[str, Experiment] = {}
+        if path:
+            self.load(path)
+
+    def load(self, path: str):
+        """Load experiments from path; a bad file disables experiments rather than failing startup"""
+        try:
+            with open(path, 'r') as f:
+                config = json.load(f)
+            base_dir = os.path.dirname(os.path.abspath(path))
+            self.experiments = {name: Experiment(name, experiment_config, base_dir)
+                                for name, experiment_config in config.items()}
+            logger.info(f"Loaded {len(self.experiments)} prompt experiments from {path}")
+        except Exception as e:
+            self.experiments = {}
+            logger.error(f"Error loading prompt experiments from {path}: {e}")
+
+    def assign(self, pattern: str, visitor_id: str) -> Optional[Assignment]:
+        """The first experiment running on pattern decides the visitor's variant"""
+        for experiment in self.experiments.values():
+            if experiment.pattern in (pattern, ALL_PATTERNS):
+                variant = experiment.assign(visitor_id)
+                return Assignment(experiment.name, variant.name,
+                                  None if variant.is_control else f"{experiment.name}/{variant.name}")
+        return None
+
+    def variant(self, assignment: Optional[Assignment]) -> Optional[Variant]:
+        if assignment is None or assignment.experiment not in self.experiments:
+            return None
+        for variant in self.experiments[assignment.experiment].variants:
+            if variant.name == assignment.variant:
+                return variant
+        return None
+
+    def _totals(self, assignment: Optional[Assignment]) -> Optional[Dict[str, float]]:
+        if assignment is None or assignment.experiment not in self.experiments:
+            return None
+        return self.experiments[assignment.experiment].totals.get(assignment.variant)
+
+    def record_call(self, assignment: Optional[Assignment], latency: float, input_tokens: int,
+                    output_tokens: int, children_shown: int, children_hidden: int, error: bool = False):
+        """One classification call made for a request in the experiment"""
+        totals = self._totals(assignment)
+        if totals is None:
+            return
+        totals['model_calls'] += 1
+        if error:
+            totals['model_errors'] += 1
+            return
+        totals['input_tokens'] += input_tokens
+        totals['output_tokens'] += output_tokens
+        totals['latency_total'] += latency
+        totals['children_shown'] += children_shown
+        totals['children_hidden'] += children_hidden
+
+    def record_outcome(self, assignment: Optional[Assignment], fallback: bool, cached: bool = False):
+        """One served response, whether a fallback produced it and whether it came from the cache"""
+        totals = self._totals(assignment)
+        if totals is None:
+            return
+        totals['requests'] += 1
+        if cached:
+            totals['cache_hits'] += 1
+        if fallback:
+            totals['fallbacks'] += 1
+
+    def summary(self) -> Dict[str, Any]:
+        result = {}
+        for name, experiment in self.experiments.items():
+            variants = {}
+            for variant in experiment.variants:
+                totals = experiment.totals[variant.name]
+                answered = totals['model_calls'] - totals['model_errors']
+                variants[variant.name] = {
+                    'weight': variant.weight,
+                    'wire_format': variant.wire_format,
+                    'changes_prompt': variant.changes_prompt,
+                    **{k: round(v, 3) if isinstance(v, float) else v for k, v in totals.items()},
+                    'avg_input_tokens': round(totals['input_tokens'] / answered, 1) if answered else 0,
+                    'avg_output_tokens': round(totals['output_tokens'] / answered, 1) if answered else 0,
+                    'avg_latency_ms': round(totals['latency_total'] / answered * 1000, 1) if answered else 0,
+                    'hide_rate_percent': round(totals['children_hidden'] / totals['children_shown'] * 100, 2)
+                                         if totals['children_shown'] else 0,
+                    'fallback_rate_percent': round(totals['fallbacks'] / totals['requests'] * 100, 2)
+                                             if totals['requests'] else 0,
+                    'cache_hit_rate_percent': round(totals['cache_hits'] / totals['requests'] * 100, 2)
+                                              if totals['requests'] else 0,
+                    'error_rate_percent': round(totals['model_errors'] / totals['model_calls'] * 100, 2)
+                                          if totals['model_calls'] else 0,
+                }
+            result[name] = {'pattern': experiment.pattern, 'variants': variants}
+        return result
+
+    def reset(self):
+        for experiment in self.experiments.values():
+            experiment.totals = {variant.name: _new_totals() for variant in experiment.variants}
@@ -0,0 +1,157 @@
+"""
+Compiled filter profiles
+Everything derived from a user's lists and the page's prompt pattern - canonical lists,
+expanded terms, the rendered prompt parts and compiled keyword matchers - built once per
+profile key (the same key the verdict cache uses) and kept in an LRU map
+"""
+
+import re
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from cache_keys import canonical_terms
+
+# Synonyms added when a list term matches one of these exactly
+SYNONYMS: Dict[str, List[str]] = {
+    'clickbait': ['bait', 'sensational', "you won't believe", 'shocking', 'overhyped', 'insane', 'crazy', 'gone wrong'],
+    'drama': ['beef', 'tea', 'exposed', 'callout', 'feud'],
+    'gossip': ['rumor', 'rumour', 'tea', 'leak', 'leaked'],
+    'reaction': ['reacts', 'reacting', 'reaction video'],
+    'prank': ['pranks', 'pranking'],
+    'conspiracy': ['theory', 'theories', 'conspiracies'],
+    'shorts': ['short', 'reel', 'reels', 'short video', 'yt shorts'],
+    'mixes': ['mix', 'playlist mix'],
+    'music': ['song', 'track', 'audio', 'lyrics', 'official video', 'mv'],
+    'compilation': ['compilations', 'best of', 'highlights', 'fails']
+}
+
+
+def generate_variants(term: str) -> List[str]:
+    """Simple morphological and obfuscation variants of a term (lowercased)"""
+    t = (term or '').strip().lower()
+    if not t:
+        return []
+    variants = {t}
+    # Basic morphological tweaks
+    if len(t) > 2:
+        variants.add(f"{t}s")
+    if t.endswith('y') and len(t) > 3:
+        variants.add(t[:-1] + 'ies')
+    if not t.endswith('ing') and len(t) > 3:
+        variants.add(t + 'ing')
+    if not t.endswith('ed') and len(t) > 3:
+        variants.add(t + 'ed')
+    if not t.endswith('er') and len(t) > 3:
+        variants.add(t + 'er')
+    if not t.endswith('est') and len(t) > 3:
+        variants.add(t + 'est')
+    # Simple obfuscation variants
+    variants.add(t.replace(' ', ''))
+    variants.add(t.replace('-', ' '))
+    variants.add(t.replace(' ', '-'))
+    return list(variants)
+
+
+def expand_terms(terms: Optional[List[str]]) -> List[str]:
+    """Terms plus their variants and synonyms, de-duplicated in first-seen order"""
+    expanded: List[str] = []
+    seen = set()
+    for term in (terms or []):
+        for v in generate_variants(term):
+            if v not in seen:
+                seen.add(v)
+                expanded.append(v)
+        base = (term or '').strip().lower()
+        for syn in SYNONYMS.get(base, []):
+            for sv in generate_variants(syn):
+                if sv not in seen:
+                    seen.add(sv)
+                    expanded.append(sv)
+    # If expansion produced nothing, return original terms
+    return expanded if expanded else (terms or [])
+
+
+class KeywordMatcher:
+    """Case-insensitive substring match against any of a list of terms, as one compiled regex"""
+    __slots__ = ('terms', 'pattern')
+
+    def __init__(self, terms: Optional[List[str]]):
+        self.terms = tuple(canonical_terms(terms))
+        # Longest first so the alternation prefers the most specific term
+        ordered = sorted(self.terms, key=len, reverse=True)
+        self.pattern = re.compile('|'.join(re.escape(t) for t in ordered)) if ordered else None
+
+    def __bool__(self) -> bool:
+        return self.pattern is not None
+
+    def matches(self, text: str) -> bool:
+        return self.pattern is not None and self.pattern.search((text or '').lower()) is not None
+
+
+class FilterProfile:
+    __slots__ = ('key', 'pattern', 'search_query', 'whitelist', 'blacklist',
+                 'expanded_whitelist', 'expanded_blacklist', 'static_prompt', 'variable_prompt',
+                 'wire_format', 'whitelist_matcher', 'blacklist_matcher', 'uses')
+
+    def __init__(self, key: str, pattern: str, search_query: Optional[str],
+                 whitelist: List[str], blacklist: List[str],
+                 expanded_whitelist: List[str], expanded_blacklist: List[str],
+                 static_prompt: str, variable_prompt: str, wire_format: str):
+        self.key = key
+        self.pattern = pattern
+        self.search_query = search_query
+        self.whitelist = whitelist
+        self.blacklist = blacklist
+        self.expanded_whitelist = expanded_whitelist
+        self.expanded_blacklist = expanded_blacklist
+        self.static_prompt = static_prompt
+        self.variable_prompt = variable_prompt
+        self.wire_format = wire_format
+        self.whitelist_matcher = KeywordMatcher(whitelist)
+        self.blacklist_matcher = KeywordMatcher(blacklist)
+        self.uses = 0
+
+
+class FilterProfileCache:
+    """LRU map of profile key -> FilterProfile; the builder runs only on a miss"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.profiles: "OrderedDict[str, FilterProfile]" = OrderedDict()
+        # Metrics for monitoring
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_build(self, key: str, build: Callable[[], FilterProfile]) -> FilterProfile:
+        profile = self.profiles.get(key)
+        if profile is not None:
+            self.profiles.move_to_end(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+            profile = build()
+            self.profiles[key] = profile
+            while len(self.profiles) > self.max_entries:
+                self.profiles.popitem(last=False)
+                self.evictions += 1
+        profile.uses += 1
+        return profile
+
+    def invalidate(self, predicate: Optional[Callable[[FilterProfile], bool]] = None) -> int:
+        """Drop every profile (or those matching predicate); returns the count"""
+        keys = [key for key, profile in self.profiles.items() if predicate is None or predicate(profile)]
+        for key in keys:
+            del self.profiles[key]
+        return len(keys)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.profiles),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate_percent': round(self.hits / lookups * 100, 2) if lookups else 0,
+            'evictions': self.evictions,
+        }
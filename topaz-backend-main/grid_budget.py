@@ -0,0 +1,187 @@
+"""
+Token-budgeted grid trimming
+Decides what the model is shown from a preprocessed grid. Every grid gets its own token
+budget (the default matches the old 10 children x 50 characters per grid), so a page with
+many grids still has all of them represented. Within a grid, children are admitted in
+visibility order with a short head of their text. The grid's leftover budget then
+lengthens the truncated texts most informative first: informativeness is the share of a
+text's words not already in a text admitted before it on the page (ties go to the more
+visible child). Empty texts are skipped, texts that exactly repeat one already shown
+(ignoring case) get no extra budget, and gridText (the children's text joined again) is
+dropped.
+"""
+
+import re
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+# tiktoken is optional; without it tokens are estimated at ~4 characters each
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Per-child cost of the ID and JSON punctuation around the text (same as estimate_child_tokens)
+CHILD_OVERHEAD_TOKENS = 8
+# The previous fixed trim: 10 children per grid, 50 characters (~13 tokens) each
+BASELINE_CHILDREN_PER_GRID = 10
+BASELINE_CHILD_TOKENS = 13
+BASELINE_GRID_TOKENS = BASELINE_CHILDREN_PER_GRID * (CHILD_OVERHEAD_TOKENS + BASELINE_CHILD_TOKENS)
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def novelty(text: str, seen_words: set) -> float:
+    """Share of text's distinct words not in seen_words (0 for a text without words)"""
+    words = set(_WORD_RE.findall(text.lower()))
+    return len(words - seen_words) / len(words) if words else 0.0
+
+
+class TokenCounter:
+    def __init__(self, encoding_name: str = "o200k_base"):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.get_encoding(encoding_name)
+            except Exception as e:
+                logger.warning(f"tiktoken encoding {encoding_name} unavailable, estimating tokens: {e}")
+        self.name = encoding_name if self.encoding is not None else "chars/4"
+
+    def count(self, text: str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        return (len(text) + 3) // 4
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if self.encoding is not None:
+            return self.encoding.decode(self.encoding.encode(text)[:max_tokens])
+        return text[:max_tokens * 4]
+
+
+class GridTrimmer:
+    def __init__(self, token_budget: int = BASELINE_GRID_TOKENS, max_children_per_grid: int = 50,
+                 min_child_tokens: int = BASELINE_CHILD_TOKENS, max_child_tokens: int = 48,
+                 counter: Optional[TokenCounter] = None):
+        # token_budget applies to each grid separately
+        self.token_budget = token_budget
+        self.max_children_per_grid = max_children_per_grid
+        self.min_child_tokens = min_child_tokens
+        self.max_child_tokens = max_child_tokens
+        self.counter = counter or TokenCounter()
+        # Metrics for monitoring
+        self.requests = 0
+        self.grids = 0
+        self.tokens_used = 0
+        self.children_kept = 0
+        self.children_dropped = 0
+        self.children_truncated = 0
+        self.over_budget_requests = 0
+
+    def trim(self, grid_structure: Dict, token_budget: Optional[int] = None,
+             max_children_per_grid: Optional[int] = None) -> Tuple[Dict, Dict[str, Any]]:
+        """Returns (cleaned grid, usage report with the estimated tokens used); token_budget is per grid"""
+        budget = token_budget or self.token_budget
+        cap = max_children_per_grid or self.max_children_per_grid
+        grids = [grid for grid in (grid_structure.get('grids') or []) if isinstance(grid, dict)]
+        cleaned_grids = []
+        seen = set()
+        seen_words = set()
+        used = 0
+        children_in = 0
+        kept = 0
+        truncated = 0
+        for grid in grids:
+            children = grid.get('children') or []
+            children_in += len(children)
+            grid_kept, grid_used, grid_truncated = self._trim_grid(
+                [child for child in children[:cap] if isinstance(child, dict)], budget, seen, seen_words
+            )
+            used += grid_used
+            kept += len(grid_kept)
+            truncated += grid_truncated
+            cleaned_grids.append({
+                'id': grid.get('id'),
+                'totalChildren': grid.get('totalChildren', 0),
+                'children': grid_kept,
+            })
+
+        usage = {
+            'tokens_used': used,
+            'token_budget_per_grid': budget,
+            'grids': len(grids),
+            'children_in': children_in,
+            'children_kept': kept,
+            'children_dropped': children_in - kept,
+            'children_truncated': truncated,
+            'tokenizer': self.counter.name,
+        }
+        self.requests += 1
+        self.grids += len(grids)
+        self.tokens_used += used
+        self.children_kept += kept
+        self.children_dropped += usage['children_dropped']
+        self.children_truncated += truncated
+        if usage['children_dropped']:
+            self.over_budget_requests += 1
+
+        cleaned = {'totalGrids': grid_structure.get('totalGrids', 0), 'grids': cleaned_grids}
+        return cleaned, usage
+
+    def _trim_grid(self, children: List[Dict], budget: int, seen: set,
+                   seen_words: set) -> Tuple[List[Dict], int, int]:
+        """(kept children, tokens used, children truncated) for one grid's children under budget"""
+        # Coverage pass: every child that fits gets the head of its text, in visibility order
+        used = 0
+        kept: List[List[Any]] = []  # [child, text, full tokens, granted tokens, repeated, novelty]
+        for child in children:
+            text = (child.get('text') or '').strip()
+            if not text:
+                continue
+            full_tokens = self.counter.count(text)
+            head_tokens = min(full_tokens, self.min_child_tokens)
+            if used + CHILD_OVERHEAD_TOKENS + head_tokens > budget:
+                continue
+            used += CHILD_OVERHEAD_TOKENS + head_tokens
+            repeated = text.lower() in seen
+            seen.add(text.lower())
+            score = novelty(text, seen_words)
+            seen_words.update(_WORD_RE.findall(text.lower()))
+            kept.append([child, text, full_tokens, head_tokens, repeated, score])
+
+        # Depth pass: lengthen truncated texts that do not repeat an earlier one with what is
+        # left, most informative first (sorted() is stable, so ties stay in visibility order)
+        for item in sorted(kept, key=lambda item: -item[5]):
+            if used >= budget:
+                break
+            _, _, full_tokens, granted, repeated, _ = item
+            if repeated or granted >= full_tokens:
+                continue
+            extra = min(min(full_tokens, self.max_child_tokens) - granted, budget - used)
+            if extra > 0:
+                item[3] += extra
+                used += extra
+
+        cleaned_children = []
+        truncated = 0
+        for child, text, full_tokens, granted, _, _ in kept:
+            if granted < full_tokens:
+                text = self.counter.truncate(text, granted).rstrip() + "..."
+                truncated += 1
+            cleaned_children.append({'id': child.get('id'), 'text': text})
+        return cleaned_children, used, truncated
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'token_budget_per_grid': self.token_budget,
+            'max_children_per_grid': self.max_children_per_grid,
+            'tokenizer': self.counter.name,
+            'requests': self.requests,
+            'avg_tokens_used': round(self.tokens_used / self.requests, 1) if self.requests else 0,
+            'avg_tokens_per_grid': round(self.tokens_used / self.grids, 1) if self.grids else 0,
+            'children_kept': self.children_kept,
+            'children_dropped': self.children_dropped,
+            'children_truncated': self.children_truncated,
+            'requests_with_dropped_children': self.over_budget_requests,
+        }
@@ -0,0 +1,292 @@
+"""
+Pooled HTTP clients for outbound LLM calls
+One long-lived httpx.AsyncClient per provider per worker, so cache misses reuse
+warm TCP/TLS connections instead of paying a fresh handshake on every request
+"""
+
+import os
+import json as _json
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Optional, Any
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# HTTP/2 needs the optional `h2` package (installed via httpx[http2])
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+@dataclass
+class PoolConfig:
+    max_connections: int = 50
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 60.0
+    http2: bool = True
+    connect_timeout: float = 10.0
+    read_timeout: float = 25.0
+    write_timeout: float = 10.0
+    pool_timeout: float = 5.0
+    warm_up: bool = True
+    warm_up_timeout: float = 3.0
+
+    @classmethod
+    def from_env(cls, prefix: str = "LLM_POOL") -> "PoolConfig":
+        """
+        Build a pool config from environment variables, e.g. LLM_POOL_MAX_CONNECTIONS
+        """
+        defaults = cls()
+
+        def _get(name, cast, default):
+            raw = os.getenv(f"{prefix}_{name}")
+            if raw is None or raw == "":
+                return default
+            try:
+                if cast is bool:
+                    return raw.lower() in ("1", "true", "yes", "on")
+                return cast(raw)
+            except ValueError:
+                logger.warning(f"Invalid value for {prefix}_{name}: {raw!r}, using {default}")
+                return default
+
+        return cls(
+            max_connections=_get("MAX_CONNECTIONS", int, defaults.max_connections),
+            max_keepalive_connections=_get("MAX_KEEPALIVE", int, defaults.max_keepalive_connections),
+            keepalive_expiry=_get("KEEPALIVE_EXPIRY", float, defaults.keepalive_expiry),
+            http2=_get("HTTP2", bool, defaults.http2),
+            connect_timeout=_get("CONNECT_TIMEOUT", float, defaults.connect_timeout),
+            read_timeout=_get("READ_TIMEOUT", float, defaults.read_timeout),
+            write_timeout=_get("WRITE_TIMEOUT", float, defaults.write_timeout),
+            pool_timeout=_get("POOL_TIMEOUT", float, defaults.pool_timeout),
+            warm_up=_get("WARM_UP", bool, defaults.warm_up),
+            warm_up_timeout=_get("WARM_UP_TIMEOUT", float, defaults.warm_up_timeout),
+        )
+
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(
+            connect=self.connect_timeout,
+            read=self.read_timeout,
+            write=self.write_timeout,
+            pool=self.pool_timeout,
+        )
+
+
+class ProviderClient:
+    """
+    A single provider's pooled client plus the counters behind its pool stats
+    """
+
+    def __init__(self, name: str, base_url: str, headers: Dict[str, str],
+                 config: Optional[PoolConfig] = None, warmup_path: str = "/"):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.headers = headers
+        self.config = config or PoolConfig()
+        self.warmup_path = warmup_path
+        self.client: Optional[httpx.AsyncClient] = None
+
+        # Metrics for monitoring
+        self.total_requests = 0
+        self.total_errors = 0
+        self.connections_opened = 0
+        self.warmup_connections = 0
+        self.warmed_up = False
+        self.started_at = None
+
+    @property
+    def http2_enabled(self) -> bool:
+        return self.config.http2 and HTTP2_AVAILABLE
+
+    async def start(self):
+        """Open the pooled client (idempotent)"""
+        if self.client is not None and not self.client.is_closed:
+            return
+        limits = httpx.Limits(
+            max_connections=self.config.max_connections,
+            max_keepalive_connections=self.config.max_keepalive_connections,
+            keepalive_expiry=self.config.keepalive_expiry,
+        )
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=self.headers,
+            timeout=self.config.timeout(),
+            limits=limits,
+            http2=self.http2_enabled,
+        )
+        self.started_at = time.time()
+        if self.config.http2 and not HTTP2_AVAILABLE:
+            logger.warning(f"HTTP/2 requested for {self.name} but h2 is not installed, using HTTP/1.1")
+
+    async def warm_up(self):
+        """
+        Open one connection ahead of the first real request, giving up after warm_up_timeout.
+        The warm-up is not a request: it and its connection stay out of handshakes_avoided.
+        """
+        await self.start()
+        try:
+            await asyncio.wait_for(
+                self.client.head(self.warmup_path, timeout=self.config.warm_up_timeout,
+                                 extensions={"trace": self._warmup_trace}),
+                timeout=self.config.warm_up_timeout
+            )
+            self.warmed_up = True
+        except Exception as e:
+            # A failed warm-up only means the first real call pays the handshake
+            logger.warning(f"Warm-up for {self.name} failed: {e!r}")
+
+    async def _trace(self, event_name: str, info: Dict[str, Any]):
+        """httpcore trace hook - counts fresh TCP connections (i.e. handshakes paid)"""
+        if event_name == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+
+    async def _warmup_trace(self, event_name: str, info: Dict[str, Any]):
+        if event_name == "connection.connect_tcp.complete":
+            self.warmup_connections += 1
+
+    async def post(self, url: str, json: Any = None, timeout: Optional[float] = None,
+                   headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        """POST through the pooled client, opening it lazily if the lifespan did not"""
+        if self.client is None or self.client.is_closed:
+            await self.start()
+        self.total_requests += 1
+        try:
+            return await self.client.post(
+                url,
+                json=json,
+                headers=headers,
+                timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+                extensions={"trace": self._trace},
+            )
+        except Exception:
+            self.total_errors += 1
+            raise
+
+    async def stream_chat(self, url: str, json: Any = None,
+                          timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        POST a streaming (SSE) chat completion and yield content deltas as they arrive
+        """
+        if self.client is None or self.client.is_closed:
+            await self.start()
+        self.total_requests += 1
+        try:
+            async with self.client.stream(
+                "POST",
+                url,
+                json=json,
+                timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+                extensions={"trace": self._trace},
+            ) as response:
+                if response.status_code != 200:
+                    body = (await response.aread()).decode('utf-8', errors='replace')
+                    raise Exception(f"{self.name} API error: {response.status_code} - {body}")
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        chunk = _json.loads(data)
+                    except ValueError:
+                        continue
+                    for choice in chunk.get("choices") or []:
+                        delta = (choice.get("delta") or {}).get("content")
+                        if delta:
+                            yield delta
+        except Exception:
+            self.total_errors += 1
+            raise
+
+    def _connection_states(self) -> Dict[str, int]:
+        """Inspect the underlying httpcore pool for idle/active connections"""
+        idle = active = 0
+        try:
+            pool = self.client._transport._pool
+            for connection in pool.connections:
+                if connection.is_closed():
+                    continue
+                if connection.is_idle():
+                    idle += 1
+                else:
+                    active += 1
+        except Exception:
+            pass
+        return {'idle': idle, 'active': active}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get pool metrics"""
+        is_open = self.client is not None and not self.client.is_closed
+        states = self._connection_states() if is_open else {'idle': 0, 'active': 0}
+        return {
+            'open': is_open,
+            'http2': self.http2_enabled,
+            'warmed_up': self.warmed_up,
+            'idle_connections': states['idle'],
+            'active_connections': states['active'],
+            'connections_opened': self.connections_opened,
+            'warmup_connections': self.warmup_connections,
+            'total_requests': self.total_requests,
+            'total_errors': self.total_errors,
+            'handshakes_avoided': max(0, self.total_requests - self.connections_opened),
+            'limits': {
+                'max_connections': self.config.max_connections,
+                'max_keepalive_connections': self.config.max_keepalive_connections,
+                'keepalive_expiry': self.config.keepalive_expiry,
+            },
+        }
+
+    async def close(self):
+        if self.client is not None and not self.client.is_closed:
+            await self.client.aclose()
+        self.client = None
+
+
+class LLMClientPool:
+    """
+    Registry of per-provider pooled clients, started and closed by the app lifespan
+    """
+
+    def __init__(self):
+        self.providers: Dict[str, ProviderClient] = {}
+
+    def register(self, name: str, base_url: str, headers: Dict[str, str],
+                 config: Optional[PoolConfig] = None, warmup_path: str = "/") -> ProviderClient:
+        provider = ProviderClient(name, base_url, headers, config or PoolConfig.from_env(), warmup_path)
+        self.providers[name] = provider
+        return provider
+
+    def get(self, name: str) -> ProviderClient:
+        if name not in self.providers:
+            raise KeyError(f"LLM provider not registered: {name}")
+        return self.providers[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.providers
+
+    async def start_all(self):
+        """Open every provider's client; connections are only made by warm_up_all or real calls"""
+        for provider in self.providers.values():
+            await provider.start()
+
+    async def warm_up_all(self):
+        """Warm every provider with warm_up enabled concurrently (run as a background task)"""
+        await asyncio.gather(*(provider.warm_up() for provider in self.providers.values()
+                               if provider.config.warm_up))
+
+    async def close_all(self):
+        for provider in self.providers.values():
+            try:
+                await provider.close()
+            except Exception as e:
+                logger.warning(f"Error closing {provider.name} client: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {name: provider.get_stats() for name, provider in self.providers.items()}
@@ -0,0 +1,229 @@
+"""
+LLM provider abstraction with hedged racing
+Each provider tracks its own latency; the router sends a hedged request to the next
+provider once the primary is slower than its recent latency percentile, takes the
+first valid answer and cancels the rest
+"""
+
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from llm_client import ProviderClient
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """Rolling window of successful call durations (seconds)"""
+
+    def __init__(self, size: int = 200):
+        self.samples = deque(maxlen=size)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, int(round(p / 100 * (len(ordered) - 1)))))
+        return ordered[index]
+
+
+class LLMProvider:
+    """
+    Base provider: subclasses implement _request(payload, context) -> response text.
+    complete() adds the circuit breaker, latency tracking and counters.
+    """
+
+    def __init__(self, name: str, model: str, breaker=None):
+        self.name = name
+        self.model = model
+        self.breaker = breaker
+        self.latency = LatencyTracker()
+        # Metrics for monitoring
+        self.calls = 0
+        self.errors = 0
+        self.wins = 0
+        self.cancelled = 0
+
+    async def _request(self, payload: Dict, context: Any = None) -> str:
+        raise NotImplementedError
+
+    async def complete(self, payload: Dict, context: Any = None) -> str:
+        self.calls += 1
+        start = time.monotonic()
+        try:
+            if self.breaker is not None:
+                text = await self.breaker.call(self._request, payload, context)
+            else:
+                text = await self._request(payload, context)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        except Exception:
+            self.errors += 1
+            raise
+        self.latency.record(time.monotonic() - start)
+        return text
+
+    def get_stats(self) -> Dict[str, Any]:
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+        return {
+            'model': self.model,
+            'calls': self.calls,
+            'errors': self.errors,
+            'wins': self.wins,
+            'cancelled': self.cancelled,
+            'latency_samples': len(self.latency.samples),
+            'p50_ms': ms(self.latency.percentile(50)),
+            'p90_ms': ms(self.latency.percentile(90)),
+            'p99_ms': ms(self.latency.percentile(99)),
+        }
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """Any chat-completions API (OpenAI, Groq, ...) reached through a pooled client"""
+
+    def __init__(self, name: str, model: str, client: ProviderClient,
+                 path: str = "/v1/chat/completions", breaker=None):
+        super().__init__(name, model, breaker)
+        self.client = client
+        self.path = path
+
+    async def _request(self, payload: Dict, context: Any = None) -> str:
+        response = await self.client.post(self.path, json={**payload, 'model': self.model})
+        if response.status_code != 200:
+            raise Exception(f"{self.name} API error: {response.status_code} - {response.text}")
+        result = response.json()
+        if isinstance(context, dict) and result.get('usage'):
+            # Token usage (incl. prompt_tokens_details.cached_tokens) keyed by provider
+            context.setdefault('usage', {})[self.name] = result['usage']
+        return result['choices'][0]['message']['content'].strip()
+
+
+class MockProvider(LLMProvider):
+    """
+    Local provider for tests and load experiments: answers via responder(payload, context)
+    after a fixed delay, or raises when fail is set
+    """
+
+    def __init__(self, name: str = "mock", responder: Optional[Callable[[Dict, Any], str]] = None,
+                 delay: float = 0.0, fail: bool = False, breaker=None):
+        super().__init__(name, "mock", breaker)
+        self.responder = responder
+        self.delay = delay
+        self.fail = fail
+
+    async def _request(self, payload: Dict, context: Any = None) -> str:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.fail:
+            raise Exception(f"{self.name} API error: mock failure")
+        return self.responder(payload, context) if self.responder else ""
+
+
+class HedgedRouter:
+    """
+    Runs a completion on the first provider and hedges to the next one when the primary
+    has not answered within its latency percentile (clamped to [min_delay, max_delay];
+    default_delay until min_samples calls have been seen). A provider that fails or returns
+    an invalid answer triggers the next provider immediately.
+    """
+
+    def __init__(self, providers: List[LLMProvider], percentile: float = 90.0,
+                 min_delay: float = 0.3, max_delay: float = 4.0,
+                 default_delay: float = 1.5, min_samples: int = 20):
+        self.providers = providers
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        # Metrics for monitoring
+        self.requests = 0
+        self.hedges_sent = 0
+        self.hedge_wins = 0
+
+    def hedge_delay(self) -> float:
+        tracker = self.providers[0].latency
+        if len(tracker.samples) < self.min_samples:
+            return self.default_delay
+        return min(self.max_delay, max(self.min_delay, tracker.percentile(self.percentile)))
+
+    async def complete(self, payload: Dict, context: Any = None,
+                       validate: Optional[Callable[[str], bool]] = None) -> Tuple[str, str]:
+        """Return (response text, provider name) from the first provider with a valid answer"""
+        if not self.providers:
+            raise Exception("No LLM providers configured")
+        self.requests += 1
+
+        if len(self.providers) == 1:
+            provider = self.providers[0]
+            text = await provider.complete(payload, context)
+            provider.wins += 1
+            return text, provider.name
+
+        pending: Dict[asyncio.Task, LLMProvider] = {}
+        launched = 0
+        first_error: Optional[BaseException] = None
+        invalid_result: Optional[Tuple[str, str]] = None
+
+        def launch():
+            nonlocal launched
+            provider = self.providers[launched]
+            launched += 1
+            pending[asyncio.create_task(provider.complete(payload, context))] = provider
+
+        launch()
+        try:
+            while pending:
+                timeout = self.hedge_delay() if launched < len(self.providers) else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.hedges_sent += 1
+                    logger.info(f"Hedging to {self.providers[launched].name} after {timeout:.2f}s")
+                    launch()
+                    continue
+
+                for task in done:
+                    provider = pending.pop(task)
+                    if task.exception() is not None:
+                        first_error = first_error or task.exception()
+                        continue
+                    text = task.result()
+                    if validate is None or validate(text):
+                        provider.wins += 1
+                        if provider is not self.providers[0]:
+                            self.hedge_wins += 1
+                        return text, provider.name
+                    invalid_result = invalid_result or (text, provider.name)
+
+                # The finished provider had no usable answer: fail over without waiting
+                if launched < len(self.providers):
+                    launch()
+        finally:
+            # Losers are cancelled and awaited so no request outlives the call that started it
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        if invalid_result is not None:
+            return invalid_result
+        raise first_error
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'order': [p.name for p in self.providers],
+            'hedging': len(self.providers) > 1,
+            'hedge_delay_ms': round(self.hedge_delay() * 1000, 1) if self.providers else None,
+            'requests': self.requests,
+            'hedges_sent': self.hedges_sent,
+            'hedge_wins': self.hedge_wins,
+            'providers': {p.name: p.get_stats() for p in self.providers},
+        }
@@ -4,29 +4,51 @@ import time
 import logging
 import asyncio
 import re
+from contextlib import asynccontextmanager
 from typing import Dict, Optional, Any, Union, List
 
 from datetime import datetime
 
 from dotenv import load_dotenv
 from fastapi import FastAPI, Depends, HTTPException, Request, Response, status, WebSocket, WebSocketDisconnect
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.httpsredirect import HTTPSRedirectMiddleware
 from starlette.middleware.trustedhost import TrustedHostMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
 
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, PrivateAttr, validator
 # from starlette.middleware.sessions import SessionMiddleware
 # from authlib.integrations.starlette_client import OAuth, OAuthError
 from supabase import create_client, Client
 import uuid
 import secrets
-from functools import wraps
+from functools import lru_cache, wraps
+from collections import namedtuple
 import jwt
 
 # HTTP requests
 import httpx
+from llm_client import LLMClientPool
+from verdict_cache import VerdictCache, build_profile_key, order_child_ids
+from filter_profiles import FilterProfile, FilterProfileCache, KeywordMatcher, expand_terms
+from cache_keys import build_response_cache_key, canonical_terms, hash_grid_children
+from circuit_breaker import CircuitBreakerRegistry
+from singleflight import Singleflight
+from micro_batcher import MicroBatcher
+from llm_providers import HedgedRouter, MockProvider, OpenAICompatibleProvider
+from grid_budget import BASELINE_GRID_TOKENS, GridTrimmer
+from wire_format import WIRE_FORMATS, WireFormatStats, estimate_tokens, serialize_grid
+from prompt_layout import PromptCacheStats, PromptTemplate
+from prompt_registry import PromptRegistry
+from experiments import Assignment, ExperimentRegistry
+from cache_engine import ResponseCache
+from cache_admission import TinyLFUAdmission
+from cache_backends import RedisCacheBackend, SQLiteCacheBackend, TieredCache
+from cache_snapshot import CacheSnapshotter
+from cache_introspection import CacheInspector
+from similarity_index import SimilarityIndex
+from revalidation import Revalidator
 
 # Configure structured logging (env-driven)
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
@@ -64,72 +86,17 @@ class StructuredLogger:
 
 logger = StructuredLogger(__name__)
 
-# Circuit Breaker Implementation
-class CircuitBreaker:
-    def __init__(self, failure_threshold=5, reset_timeout=60):
-        self.failure_threshold = failure_threshold
-        self.reset_timeout = reset_timeout
-        self.failure_count = 0
-        self.last_failure_time = None
-        self.state = 'CLOSED'  # CLOSED, OPEN, HALF_OPEN
-        # Metrics for monitoring
-        self.total_requests = 0
-        self.total_failures = 0
-        self.state_changes = {'CLOSED': 0, 'OPEN': 0, 'HALF_OPEN': 0}
-        self.created_at = time.time()
-    
-    def call(self, func, *args, **kwargs):
-        self.total_requests += 1
-
-        if self.state == 'OPEN':
-            if time.time() - self.last_failure_time >= self.reset_timeout:
-                self._change_state('HALF_OPEN')
-                logger.info("Circuit breaker transitioning to HALF_OPEN")
-            else:
-                raise Exception("Circuit breaker is OPEN")
-
-        try:
-            result = func(*args, **kwargs)
-            if self.state == 'HALF_OPEN':
-                self._change_state('CLOSED')
-                self.failure_count = 0
-                logger.info("Circuit breaker reset to CLOSED")
-            return result
-        except Exception as e:
-            self.failure_count += 1
-            self.total_failures += 1
-            self.last_failure_time = time.time()
-
-            if self.failure_count >= self.failure_threshold:
-                self._change_state('OPEN')
-                logger.error(f"Circuit breaker opened due to {self.failure_count} failures")
-
-            raise e
-
-    def _change_state(self, new_state):
-        """Track state changes for metrics"""
-        if new_state != self.state:
-            self.state_changes[new_state] += 1
-            self.state = new_state
-
-    def get_metrics(self):
-        """Get circuit breaker metrics"""
-        uptime = time.time() - self.created_at
-        failure_rate = (self.total_failures / self.total_requests * 100) if self.total_requests > 0 else 0
-
-        return {
-            'state': self.state,
-            'total_requests': self.total_requests,
-            'total_failures': self.total_failures,
-            'failure_rate_percent': round(failure_rate, 2),
-            'current_failure_count': self.failure_count,
-            'failure_threshold': self.failure_threshold,
-            'state_changes': self.state_changes.copy(),
-            'uptime_seconds': round(uptime, 2)
-        }
-
-# Global circuit breaker for OpenAI API
-openai_circuit_breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+# Circuit breakers for LLM providers, one per provider/model
+circuit_breakers = CircuitBreakerRegistry(
+    window_size=int(os.getenv("CIRCUIT_BREAKER_WINDOW_SIZE", "20")),
+    window_seconds=float(os.getenv("CIRCUIT_BREAKER_WINDOW_SECONDS", "60")),
+    min_calls=int(os.getenv("CIRCUIT_BREAKER_MIN_CALLS", "5")),
+    failure_rate_threshold=float(os.getenv("CIRCUIT_BREAKER_FAILURE_RATE", "50")),
+    slow_call_seconds=float(os.getenv("CIRCUIT_BREAKER_SLOW_CALL_SECONDS", "6")),
+    reset_timeout=float(os.getenv("CIRCUIT_BREAKER_RESET_TIMEOUT", "30")),
+    half_open_max_calls=int(os.getenv("CIRCUIT_BREAKER_HALF_OPEN_PROBES", "1")),
+)
+openai_circuit_breaker = circuit_breakers.get("openai", "gpt-4o-mini")
 
 # Authentication middleware
 class AuthenticationMiddleware(BaseHTTPMiddleware):
@@ -211,18 +178,19 @@ if ENV != "production":
 # Load prompts from JSON
 logger.info("Loading prompts from JSON file...")
 import os
-prompts_file_path = os.path.join(os.path.dirname(__file__), 'prompts_simplified.json')
-try:
-    with open(prompts_file_path, 'r') as f:
-        prompts_data = json.load(f)
-    logger.info("Prompts loaded successfully")
-except FileNotFoundError:
-    logger.error(f"Prompts file not found at {prompts_file_path}")
-    # Fallback to empty prompts
-    prompts_data = {}
-except Exception as e:
-    logger.error(f"Error loading prompts: {e}")
-    prompts_data = {}
+prompts_file_path = os.getenv("PROMPTS_FILE", os.path.join(os.path.dirname(__file__), 'prompts_simplified.json'))
+# Compiled prompt set (host-indexed router + pre-split templates), swapped atomically on reload.
+# The callback is resolved at reload time; invalidate_prompt_dependents is defined further down.
+prompt_registry = PromptRegistry(
+    prompts_file_path,
+    memo_size=int(os.getenv("PROMPT_ROUTER_MEMO_SIZE", "4096")),
+    on_change=lambda affected: invalidate_prompt_dependents(affected)
+)
+prompt_registry.load()
+# Seconds between prompt file mtime checks (0 disables; POST /admin/prompts/reload still works)
+PROMPTS_WATCH_INTERVAL = float(os.getenv("PROMPTS_WATCH_INTERVAL", "10"))
+# Prompt/wire-format variant experiments, assigned per URL pattern by visitorId hash (unset disables)
+experiments = ExperimentRegistry(os.getenv("PROMPT_EXPERIMENTS_FILE"))
 
 # Rate limiting infrastructure
 rate_limit_data = {
@@ -236,17 +204,144 @@ blocked_items_counter = {
     'last_updated': time.time()
 }
 
-# Enhanced multi-tier cache system for optimal performance
-api_cache = {
-    'responses': {},  # hash -> response
-    'max_size': 1000,  # Increased cache size
-    'max_age': 1800,   # Cache expires after 30 minutes (increased)
-    'hot_cache': {},   # Hot cache for frequently accessed items
-    'warm_cache': {},  # Warm cache for moderately accessed items
-    'cold_cache': {},  # Cold cache for rarely accessed items
-    'access_counts': {},  # Track access frequency
-    'last_cleanup': time.time()
+# Response cache: cache key -> analysis result (single LRU with TTL and size/byte limits).
+# This is the per-worker L1; RESPONSE_CACHE_BACKEND adds a store shared by all workers.
+# RESPONSE_CACHE_ADMISSION=tinylfu keeps one-off page loads from evicting hot feeds.
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+response_cache = ResponseCache(
+    max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+    max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "1800")),  # Cache expires after 30 minutes
+    admission=(TinyLFUAdmission(RESPONSE_CACHE_MAX_ENTRIES)
+               if os.getenv("RESPONSE_CACHE_ADMISSION", "tinylfu").lower() == "tinylfu" else None)
+)
+
+def create_response_cache_backend():
+    """
+    Shared (L2) response-cache backend from RESPONSE_CACHE_BACKEND: sqlite (default; one file for
+    every worker on the host, opened lazily per worker), redis, or memory (per-worker cache only)
+    """
+    backend = os.getenv("RESPONSE_CACHE_BACKEND", "sqlite").lower()
+    try:
+        if backend == "sqlite":
+            import tempfile
+            path = os.getenv("RESPONSE_CACHE_SQLITE_PATH",
+                             os.path.join(tempfile.gettempdir(), "topaz_response_cache.sqlite3"))
+            return SQLiteCacheBackend(path, max_entries=int(os.getenv("RESPONSE_CACHE_SHARED_MAX_ENTRIES", "20000")))
+        if backend == "redis":
+            return RedisCacheBackend.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    except Exception as e:
+        logger.warning(f"Shared response cache unavailable ({backend}), using per-worker cache only", error=str(e))
+    return None
+
+response_store = TieredCache(
+    response_cache,
+    create_response_cache_backend(),
+    l1_ttl=float(os.getenv("RESPONSE_CACHE_L1_TTL", "60"))
+)
+
+# Warm starts: the hottest response-cache entries are written to CACHE_SNAPSHOT_PATH on shutdown
+# and every CACHE_SNAPSHOT_INTERVAL seconds, and replayed in the background at startup within
+# CACHE_SNAPSHOT_LOAD_BUDGET_MS. Point the path at a mounted volume to survive deploys; "" disables.
+def create_cache_snapshotter():
+    import tempfile
+    path = os.getenv("CACHE_SNAPSHOT_PATH", os.path.join(tempfile.gettempdir(), "topaz_cache_snapshot.jsonl.gz"))
+    if not path:
+        return None
+    return CacheSnapshotter(
+        response_store,
+        path,
+        # Entries cached under a prompt that has since been edited are not restored
+        current_revision=lambda pattern: prompt_registry.current.revisions.get(pattern),
+        max_entries=int(os.getenv("CACHE_SNAPSHOT_MAX_ENTRIES", "500")),
+        load_budget=float(os.getenv("CACHE_SNAPSHOT_LOAD_BUDGET_MS", "2000")) / 1000.0
+    )
+
+cache_snapshotter = create_cache_snapshotter()
+CACHE_SNAPSHOT_INTERVAL = float(os.getenv("CACHE_SNAPSHOT_INTERVAL", "300"))
+
+# Per-source TTLs: model answers live RESPONSE_CACHE_TTL; fallback answers (keyword matching,
+# rule-based filtering, borrowed similar verdicts) are cached briefly and upgraded in the
+# background once a provider accepts calls again. When the provider failed, the fallback is
+# a negative entry: no retry for that key before RESPONSE_CACHE_NEGATIVE_TTL has passed.
+RESPONSE_SOURCE_TTLS = {
+    "model": response_cache.ttl,
+    "similar_cache": float(os.getenv("RESPONSE_CACHE_TTL_SIMILAR", "300")),
+    "rule_based": float(os.getenv("RESPONSE_CACHE_TTL_RULE_BASED", "300")),
+    "keyword": float(os.getenv("RESPONSE_CACHE_TTL_KEYWORD", "300")),
 }
+RESPONSE_CACHE_NEGATIVE_TTL = float(os.getenv("RESPONSE_CACHE_NEGATIVE_TTL", "30"))
+
+# Stale-while-revalidate: an expired response keeps being served for this many seconds while
+# one background task refreshes it (0 disables; a prompt entry may override it with
+# "stale_while_revalidate"). Refreshes share a small concurrency budget.
+RESPONSE_CACHE_STALE_TTL = float(os.getenv("RESPONSE_CACHE_STALE_TTL", "0"))
+revalidator = Revalidator(max_concurrency=int(os.getenv("RESPONSE_CACHE_REFRESH_CONCURRENCY", "2")))
+
+# Lookup outcomes by URL pattern/source and targeted invalidation for the admin cache endpoints.
+# A result whose analysis started more than RESPONSE_CACHE_MAX_COMPUTE_SECONDS ago is not cached
+# (invalidations are remembered that long to drop results computed before them).
+cache_inspector = CacheInspector(
+    response_store,
+    max_compute_seconds=float(os.getenv("RESPONSE_CACHE_MAX_COMPUTE_SECONDS", "300"))
+)
+# Admin endpoints (/admin/...) need X-Admin-Key; they are disabled while ADMIN_API_KEY is unset
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+
+# Per-child verdict cache: (child text hash, filter profile) -> hide/keep
+verdict_cache = VerdictCache(
+    max_entries=int(os.getenv("VERDICT_CACHE_MAX_ENTRIES", "50000")),
+    ttl=float(os.getenv("VERDICT_CACHE_TTL", str(response_cache.ttl)))
+)
+
+# Compiled filter profiles (expanded lists, rendered prompt parts, keyword matchers) by profile key
+filter_profiles = FilterProfileCache(max_entries=int(os.getenv("FILTER_PROFILE_CACHE_MAX_ENTRIES", "1024")))
+
+# Similar-child index for the AI failure path: model verdicts indexed by MinHash/LSH so a
+# timed-out request can borrow the verdicts of near-identical children seen before
+similarity_index = SimilarityIndex(
+    max_entries=int(os.getenv("SIMILAR_RESPONSE_MAX_ENTRIES", "20000")),
+    threshold=float(os.getenv("SIMILAR_RESPONSE_THRESHOLD", "0.6"))
+)
+# Fraction of the request's children that need a neighbour before the borrowed verdicts are used
+SIMILAR_RESPONSE_MIN_COVERAGE = float(os.getenv("SIMILAR_RESPONSE_MIN_COVERAGE", "0.5"))
+
+# Chunked fan-out for oversized grids: lift the 10-children cap and classify the grid
+# as several concurrent calls, each sized by an estimated token budget
+CHUNKED_ANALYSIS_ENABLED = os.getenv("CHUNKED_ANALYSIS_ENABLED", "false").lower() == "true"
+CHUNKED_ANALYSIS_MAX_CHILDREN_PER_GRID = int(os.getenv("CHUNKED_ANALYSIS_MAX_CHILDREN_PER_GRID", "100"))
+CHUNKED_ANALYSIS_TOKEN_BUDGET = int(os.getenv("CHUNKED_ANALYSIS_TOKEN_BUDGET", "1200"))
+CHUNKED_ANALYSIS_MAX_CHUNK_CHILDREN = int(os.getenv("CHUNKED_ANALYSIS_MAX_CHUNK_CHILDREN", "40"))
+chunk_semaphore = asyncio.Semaphore(int(os.getenv("CHUNKED_ANALYSIS_CONCURRENCY", "4")))
+
+# What the model is shown: each grid's children admitted by visibility order under an estimated
+# per-grid token budget (default: the old 10 children x 50 characters; per pattern via
+# "grid_token_budget" in prompts_simplified.json), texts lengthened with what is left
+grid_trimmer = GridTrimmer(
+    token_budget=int(os.getenv("GRID_TOKEN_BUDGET", str(BASELINE_GRID_TOKENS))),
+    max_children_per_grid=int(os.getenv("GRID_MAX_CHILDREN_PER_GRID", "50")),
+    min_child_tokens=int(os.getenv("GRID_MIN_CHILD_TOKENS", "13")),
+    max_child_tokens=int(os.getenv("GRID_MAX_CHILD_TOKENS", "48"))
+)
+# Chunked analysis can give each grid up to one full chunk
+CHUNKED_ANALYSIS_GRID_TOKEN_BUDGET = CHUNKED_ANALYSIS_TOKEN_BUDGET
+
+# Wire format for the grid sent to the model: "json" (indented dump) or "compact"
+# (one id<TAB>text line per child). A prompt entry may override it with "wire_format".
+LLM_WIRE_FORMAT = os.getenv("LLM_WIRE_FORMAT", "json").lower()
+wire_format_stats = WireFormatStats()
+
+# Provider prompt-cache usage (cached prompt tokens) per prompt pattern
+prompt_cache_stats = PromptCacheStats()
+
+# In-flight coalescing of identical analysis requests (keyed on the response cache key)
+analysis_singleflight = Singleflight()
+
+# Cross-request micro-batching: children from concurrent requests with the same filter
+# profile are held for a few milliseconds and classified in a single call
+MICRO_BATCH_ENABLED = os.getenv("MICRO_BATCH_ENABLED", "false").lower() == "true"
+MICRO_BATCH_WINDOW_MS = float(os.getenv("MICRO_BATCH_WINDOW_MS", "15"))
+MICRO_BATCH_MAX_CHILDREN = int(os.getenv("MICRO_BATCH_MAX_CHILDREN", "60"))
 
 def reset_rate_limit_if_needed():
     """Reset rate limit counters if an hour has passed"""
@@ -270,7 +365,46 @@ def track_ip_request(ip_address: str):
     #logger.info(f"📊 IP {ip_address} has made {request_count} requests this hour")
     return request_count
 
-app = FastAPI(title="Doom Blocker Backend", version="1.0.0")
+# Pooled per-provider HTTP clients for outbound LLM calls (one set per worker)
+llm_pool = LLMClientPool()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Globals referenced here are defined further down; they resolve at startup
+    logger.info("🚀 Doom Blocker Backend starting up...")
+    logger.info(f"📁 Current working directory: {os.getcwd()}")
+    logger.info(f"📄 Prompts loaded: {len(prompt_registry.current.data)} patterns")
+    logger.info(f"🔑 OpenAI configured: {OPENAI_HEADERS is not None}")
+    logger.info(f"🗄️ Supabase configured: {supabase is not None}")
+    await llm_pool.start_all()
+    logger.info("🔌 LLM client pools ready", pools=llm_pool.get_stats())
+    # Connection warm-up runs in the background with its own short timeout; startup does not wait
+    background_tasks = [asyncio.create_task(llm_pool.warm_up_all())]
+    if PROMPTS_WATCH_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(prompt_registry.watch(PROMPTS_WATCH_INTERVAL)))
+    if cache_snapshotter is not None:
+        # Warm the response cache in the background; startup does not wait for it
+        background_tasks.append(asyncio.create_task(cache_snapshotter.load()))
+        if CACHE_SNAPSHOT_INTERVAL > 0:
+            background_tasks.append(asyncio.create_task(cache_snapshotter.run_periodic(CACHE_SNAPSHOT_INTERVAL)))
+    logger.info("✅ Startup complete!")
+    yield
+    logger.info("🛑 Doom Blocker Backend shutting down...")
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await revalidator.shutdown()
+    # Refreshes run inside shielded singleflight tasks that outlive the cancelled refresh;
+    # stop those too before the LLM clients and the shared cache close
+    await analysis_singleflight.shutdown()
+    # Let batched classification calls finish while the LLM clients are still open
+    await micro_batcher.drain()
+    if cache_snapshotter is not None:
+        cache_snapshotter.save()
+        logger.info(f"📸 Cache snapshot written: {cache_snapshotter.last_written_entries} entries")
+    await llm_pool.close_all()
+
+app = FastAPI(title="Doom Blocker Backend", version="1.0.0", lifespan=lifespan)
 
 # Security: optional HTTPS redirect in production
 if ENV == "production" and os.getenv("ENABLE_HTTPS_REDIRECT", "true").lower() == "true":
@@ -353,148 +487,93 @@ def increment_blocked_counter(items_blocked: int):
     
     logger.info(f"Blocked items counter updated: {blocked_items_counter['count']} (+{items_blocked})")
 
-def get_cache_key(grid_structure, url, whitelist, blacklist):
-    """Generate a cache key for the request"""
-    import hashlib
-    # Create a hash of the request parameters
-    key_data = {
-        'url': url,
-        'whitelist': sorted(whitelist) if whitelist else [],
-        'blacklist': sorted(blacklist) if blacklist else [],
-        'grid_ids': [grid.get('id') for grid in grid_structure.get('grids', [])],
-        'total_children': sum(grid.get('totalChildren', 0) for grid in grid_structure.get('grids', []))
-    }
-    key_string = json.dumps(key_data, sort_keys=True)
-    return hashlib.md5(key_string.encode()).hexdigest()
+# What run_grid_analysis served: the response and its cache source ("model", "keyword", ...)
+AnalysisOutcome = namedtuple('AnalysisOutcome', ['data', 'source'])
 
-def get_cached_response(cache_key):
-    """Enhanced multi-tier cache lookup with intelligent tiering"""
-    current_time = time.time()
-    
-    # Check hot cache first (most frequently accessed)
-    if cache_key in api_cache['hot_cache']:
-        cached_data = api_cache['hot_cache'][cache_key]
-        if current_time - cached_data['timestamp'] < api_cache['max_age']:
-            api_cache['access_counts'][cache_key] = api_cache['access_counts'].get(cache_key, 0) + 1
-            logger.info(f"🔥 Hot cache hit for key: {cache_key[:8]}...")
-            return cached_data['response']
-        else:
-            del api_cache['hot_cache'][cache_key]
-    
-    # Check warm cache
-    if cache_key in api_cache['warm_cache']:
-        cached_data = api_cache['warm_cache'][cache_key]
-        if current_time - cached_data['timestamp'] < api_cache['max_age']:
-            api_cache['access_counts'][cache_key] = api_cache['access_counts'].get(cache_key, 0) + 1
-            # Promote to hot cache if accessed frequently
-            if api_cache['access_counts'][cache_key] > 5:
-                api_cache['hot_cache'][cache_key] = cached_data
-                del api_cache['warm_cache'][cache_key]
-            logger.info(f"🌡️ Warm cache hit for key: {cache_key[:8]}...")
-            return cached_data['response']
-        else:
-            del api_cache['warm_cache'][cache_key]
-    
-    # Check cold cache
-    if cache_key in api_cache['cold_cache']:
-        cached_data = api_cache['cold_cache'][cache_key]
-        if current_time - cached_data['timestamp'] < api_cache['max_age']:
-            api_cache['access_counts'][cache_key] = api_cache['access_counts'].get(cache_key, 0) + 1
-            # Promote to warm cache
-            api_cache['warm_cache'][cache_key] = cached_data
-            del api_cache['cold_cache'][cache_key]
-            logger.info(f"❄️ Cold cache hit for key: {cache_key[:8]}...")
-            return cached_data['response']
-        else:
-            del api_cache['cold_cache'][cache_key]
-    
-    # Check legacy cache
-    if cache_key in api_cache['responses']:
-        cached_data = api_cache['responses'][cache_key]
-        if current_time - cached_data['timestamp'] < api_cache['max_age']:
-            api_cache['access_counts'][cache_key] = api_cache['access_counts'].get(cache_key, 0) + 1
-            logger.info(f"🎯 Legacy cache hit for key: {cache_key[:8]}...")
-            return cached_data['response']
-        else:
-            del api_cache['responses'][cache_key]
-    
-    return None
+def get_cache_key(cleaned_grid, url, whitelist, blacklist, child_hashes=None, variant=None):
+    """
+    Generate a cache key for the request from the preprocessed child texts.
+    Pass child_hashes (from hash_grid_children) to reuse hashes already computed for the request.
+    variant (an experiment variant's key) keeps that variant's responses apart; the URL
+    pattern's prompt revision is always part of the key.
+    """
+    if child_hashes is None:
+        child_hashes = hash_grid_children(cleaned_grid)
+    return build_response_cache_key(url, whitelist, blacklist, child_hashes, variant=variant,
+                                    prompt_revision=get_prompt_revision_for_url(url))
 
-def cache_response(cache_key, response):
-    """Enhanced multi-tier cache storage with intelligent placement"""
-    current_time = time.time()
-    
-    # Clean up cache if needed
-    cleanup_cache_if_needed()
-    
-    # Determine cache tier based on access pattern
-    access_count = api_cache['access_counts'].get(cache_key, 0)
-    
-    cache_data = {
-        'response': response,
-        'timestamp': current_time,
-        'access_count': access_count,
-        'grid_signature': create_grid_signature(cleaned_grid) if 'cleaned_grid' in locals() else None
+async def get_cached_response(cache_key, pattern=None, allow_stale=False):
+    """
+    Look up a cached analysis result: CacheLookup(value, stale, metadata), value None on miss or expiry.
+    With allow_stale, an expired response still inside its grace window is returned as stale.
+    """
+    cached = await response_store.alookup(cache_key, allow_stale=allow_stale)
+    found = cached.value is not None
+    source = cached.metadata.get('source', 'model') if found else None
+    cache_inspector.record_lookup(pattern, found, cached.stale, source)
+    if found:
+        logger.info(f"{'🕰️ Stale' if cached.stale else '🎯'} Cache hit ({source}) for key: {cache_key[:8]}...")
+    return cached
+
+async def cache_response(cache_key, response, analysis_request, source="model", provider_failed=False,
+                         started_at=None):
+    """
+    Store an analysis result with its source's TTL, tagged with its URL pattern and filter profile.
+    Model answers get the pattern's stale grace window; a fallback produced because the
+    provider failed also records retry_after. A result whose analysis started (started_at)
+    before a matching invalidation is not stored.
+    """
+    url = analysis_request.currentUrl
+    ttl = RESPONSE_SOURCE_TTLS.get(source, RESPONSE_SOURCE_TTLS["keyword"])
+    stale_ttl = get_stale_ttl_for_url(url) if source == "model" else 0
+    metadata = {
+        'source': source,
+        'pattern': get_prompt_pattern_for_url(url),
+        'revision': get_prompt_revision_for_url(url),
+        'profile': get_verdict_profile(analysis_request),
     }
-    
-    # Place in appropriate tier
-    if access_count >= 10:
-        # Hot cache for frequently accessed items
-        api_cache['hot_cache'][cache_key] = cache_data
-        logger.info(f"🔥 Cached in hot cache for key: {cache_key[:8]}...")
-    elif access_count >= 3:
-        # Warm cache for moderately accessed items
-        api_cache['warm_cache'][cache_key] = cache_data
-        logger.info(f"🌡️ Cached in warm cache for key: {cache_key[:8]}...")
-    else:
-        # Cold cache for new items
-        api_cache['cold_cache'][cache_key] = cache_data
-        logger.info(f"❄️ Cached in cold cache for key: {cache_key[:8]}...")
-    
-    # Also maintain legacy cache for compatibility
-    api_cache['responses'][cache_key] = cache_data
-
-def cleanup_cache_if_needed():
-    """Intelligent cache cleanup with tier-aware eviction"""
-    current_time = time.time()
-    
-    # Clean up expired entries
-    for tier in ['hot_cache', 'warm_cache', 'cold_cache', 'responses']:
-        expired_keys = []
-        for key, data in api_cache[tier].items():
-            if current_time - data['timestamp'] > api_cache['max_age']:
-                expired_keys.append(key)
-        
-        for key in expired_keys:
-            del api_cache[tier][key]
-    
-    # Evict least recently used items if cache is too large
-    total_size = (len(api_cache['hot_cache']) + len(api_cache['warm_cache']) + 
-                  len(api_cache['cold_cache']) + len(api_cache['responses']))
-    
-    if total_size > api_cache['max_size']:
-        # Evict from cold cache first, then warm, then hot
-        evict_from_tier('cold_cache', 20)
-        if total_size > api_cache['max_size']:
-            evict_from_tier('warm_cache', 15)
-        if total_size > api_cache['max_size']:
-            evict_from_tier('hot_cache', 10)
-
-def evict_from_tier(tier, count):
-    """Evict least recently used items from a specific tier"""
-    if len(api_cache[tier]) <= count:
-        api_cache[tier].clear()
+    if started_at is not None and cache_inspector.should_drop_write(started_at, metadata):
+        logger.info(f"🧹 Not caching response for key {cache_key[:8]}...: invalidated while it was computed")
         return
-    
-    # Sort by timestamp and remove oldest
-    sorted_items = sorted(api_cache[tier].items(), 
-                         key=lambda x: x[1]['timestamp'])
-    
-    for i in range(min(count, len(sorted_items))):
-        key = sorted_items[i][0]
-        del api_cache[tier][key]
+    if provider_failed:
+        metadata['retry_after'] = time.time() + RESPONSE_CACHE_NEGATIVE_TTL
+    await response_store.aput(cache_key, response, ttl=ttl, stale_ttl=stale_ttl, **metadata)
+    logger.info(f"💾 Cached {source} response for key: {cache_key[:8]}... (ttl {ttl:.0f}s)")
+
+def record_served_outcome(analysis_request, source, cached=False):
+    """Experiment outcome for one served response, computed or from the response cache"""
+    experiments.record_outcome(get_experiment_assignment(analysis_request),
+                               fallback=source != "model", cached=cached)
+
+def response_source(fallback_used):
+    """Cache source tag for a fallback_used value (handle_ai_failure / streaming sources)"""
+    return {"cached_similar": "similar_cache", "rule_based": "rule_based", "keyword": "keyword"}.get(
+        fallback_used, "model")
+
+def llm_provider_available():
+    """True if a classification call made now would reach at least one provider"""
+    if not OPENAI_HEADERS:
+        return False
+    return any(p.breaker is None or p.breaker.allows_calls() for p in llm_router.providers)
+
+def needs_refresh(cached):
+    """A stale entry, or a fallback entry whose retry window has passed while a provider is available"""
+    if cached.stale:
+        return True
+    if cached.metadata.get('source', 'model') == 'model':
+        return False
+    return time.time() >= cached.metadata.get('retry_after', 0) and llm_provider_available()
+
+def schedule_cache_refresh(analysis_request, cleaned_grid, child_hashes, cache_key, correlation_id):
+    """Re-run the analysis for a stale or fallback cache entry in the background (one refresh per key)"""
+    started = revalidator.schedule(
+        cache_key, analysis_singleflight.do, cache_key, run_grid_analysis,
+        analysis_request, cleaned_grid, child_hashes, cache_key, correlation_id, time.time()
+    )
+    if started:
+        logger.info(f"♻️ Refreshing cached response in background: {cache_key[:8]}...", correlation_id=correlation_id)
 
-async def handle_ai_failure(error, cleaned_grid, analysis_request, correlation_id):
+async def handle_ai_failure(error, cleaned_grid, analysis_request, correlation_id, child_hashes=None):
     """Enhanced error handling with multiple fallback strategies"""
     error_type = type(error).__name__
     error_message = str(error)
@@ -523,33 +602,41 @@ async def handle_ai_failure(error, cleaned_grid, analysis_request, correlation_i
                 "temperature": 0.3
             }
             
-            async with httpx.AsyncClient(timeout=httpx.Timeout(15.0)) as client:
-                response = await client.post(OPENAI_URL, headers=OPENAI_HEADERS, json=fallback_payload)
-                if response.status_code == 200:
-                    result = response.json()
-                    ai_response = result['choices'][0]['message']['content'].strip()
-                    parsed_ids = parse_ai_response(ai_response)
-                    
-                    logger.info(f"Fallback model succeeded: {len(parsed_ids)} items", 
-                              correlation_id=correlation_id)
-                    
-                    return {
-                        "success": True,
-                        "data": parsed_ids,
-                        "fallback_used": "gpt-3.5-turbo",
-                        "total_children_to_remove": len(parsed_ids)
-                    }
+            async def make_fallback_request():
+                response = await llm_pool.get("openai").post(OPENAI_URL, json=fallback_payload, timeout=15.0)
+                if response.status_code != 200:
+                    raise Exception(f"OpenAI API error: {response.status_code} - {response.text}")
+                ai_response = response.json()['choices'][0]['message']['content'].strip()
+                # Parsed inside the breaker call so an unusable answer counts against the fallback model
+                hide_ids = parse_llm_hide_ids(ai_response, cleaned_grid)
+                if hide_ids is None:
+                    raise Exception("Fallback model returned an unparseable response")
+                return hide_ids
+
+            hide_ids = await circuit_breakers.get("openai", "gpt-3.5-turbo").call(make_fallback_request)
+            parsed_ids = convert_newline_format_to_json("\n".join(hide_ids))
+
+            logger.info(f"Fallback model succeeded: {len(hide_ids)} items", 
+                      correlation_id=correlation_id)
+
+            return {
+                "success": True,
+                "data": parsed_ids,
+                "fallback_used": "gpt-3.5-turbo",
+                "total_children_to_remove": len(hide_ids)
+            }
         except Exception as fallback_error:
             logger.warning(f"Fallback model also failed: {fallback_error}", 
                           correlation_id=correlation_id)
     
     # Strategy 2: Use cached similar responses
-    if "timeout" in error_message.lower() or "connection" in error_message.lower():
+    if ("timeout" in error_message.lower() or "connection" in error_message.lower()
+            or isinstance(error, (asyncio.TimeoutError, httpx.TransportError))):
         logger.info("Attempting to use cached similar responses", correlation_id=correlation_id)
         try:
             # Find similar cached responses
-            similar_response = find_similar_cached_response(cleaned_grid, analysis_request)
-            if similar_response:
+            similar_response = find_similar_cached_response(cleaned_grid, analysis_request, child_hashes)
+            if similar_response is not None:
                 logger.info("Found similar cached response", correlation_id=correlation_id)
                 return {
                     "success": True,
@@ -582,87 +669,49 @@ async def handle_ai_failure(error, cleaned_grid, analysis_request, correlation_i
     # If all fallbacks fail, return None to use final keyword matching
     return None
 
-def find_similar_cached_response(cleaned_grid, analysis_request):
-    """Find similar cached responses based on content similarity"""
-    # Simple similarity based on grid structure
-    grid_signature = create_grid_signature(cleaned_grid)
-    
-    for tier in ['hot_cache', 'warm_cache', 'cold_cache', 'responses']:
-        for key, cached_data in api_cache[tier].items():
-            if 'grid_signature' in cached_data:
-                similarity = calculate_grid_similarity(grid_signature, cached_data['grid_signature'])
-                if similarity > 0.8:  # 80% similarity threshold
-                    return cached_data['response'].get('data', [])
-    
-    return None
+def find_similar_cached_response(cleaned_grid, analysis_request, child_hashes=None):
+    """
+    Build a response from the nearest previously classified neighbour of each child
+    (same filter profile). Returns None when too few children have a close neighbour.
+    """
+    hide_ids, matched, total = similarity_index.lookup_grid(
+        cleaned_grid, get_verdict_profile(analysis_request), text_hashes=child_hashes
+    )
+    if not total or matched / total < SIMILAR_RESPONSE_MIN_COVERAGE:
+        return None
+    logger.info(f"🔎 Similar children found for {matched}/{total} children")
+    return convert_newline_format_to_json("\n".join(hide_ids))
 
-def create_grid_signature(cleaned_grid):
-    """Create a signature for grid structure comparison"""
-    signature = {
-        'total_grids': len(cleaned_grid.get('grids', [])),
-        'total_children': sum(grid.get('totalChildren', 0) for grid in cleaned_grid.get('grids', [])),
-        'avg_text_length': 0
-    }
-    
-    total_text_length = 0
-    text_count = 0
-    
-    for grid in cleaned_grid.get('grids', []):
-        for child in grid.get('children', []):
-            if child.get('text'):
-                total_text_length += len(child['text'])
-                text_count += 1
-    
-    if text_count > 0:
-        signature['avg_text_length'] = total_text_length / text_count
-    
-    return signature
+def fallback_hide_ids(fallback_data, llm_grid):
+    """Child IDs of llm_grid named by a fallback's result (grouped JSON or a plain list of IDs)"""
+    sanitized = sanitize_llm_response(json.dumps(fallback_data or []), llm_grid)
+    return sanitized.split('\n') if sanitized else []
 
-def calculate_grid_similarity(sig1, sig2):
-    """Calculate similarity between two grid signatures"""
-    if not sig1 or not sig2:
-        return 0
-    
-    # Simple similarity calculation
-    total_diff = 0
-    max_diff = 0
-    
-    for key in ['total_grids', 'total_children', 'avg_text_length']:
-        val1 = sig1.get(key, 0)
-        val2 = sig2.get(key, 0)
-        diff = abs(val1 - val2)
-        total_diff += diff
-        max_diff = max(max_diff, val1, val2)
-    
-    if max_diff == 0:
-        return 1.0
-    
-    similarity = 1 - (total_diff / (max_diff * 3))
-    return max(0, similarity)
+def record_model_verdicts(llm_grid, hide_ids, verdict_profile, child_hashes=None):
+    """Remember the model's verdicts for the children it was shown (verdict cache + similarity index)"""
+    verdict_cache.store_grid_verdicts(llm_grid, hide_ids, verdict_profile, text_hashes=child_hashes)
+    similarity_index.add_grid(llm_grid, hide_ids, verdict_profile, text_hashes=child_hashes)
 
 def apply_rule_based_filtering(cleaned_grid, analysis_request):
     """Apply rule-based filtering as fallback"""
-    blacklist = analysis_request.blacklist
-    whitelist = analysis_request.whitelist
+    profile = get_filter_profile(analysis_request)
     
     items_to_hide = []
     
     for grid in cleaned_grid.get('grids', []):
         for child in grid.get('children', []):
-            child_text = child.get('text', '').lower()
+            child_text = child.get('text', '')
             child_id = child.get('id')
             
             if not child_id:
                 continue
             
             # Check whitelist first (higher priority)
-            whitelist_match = any(term.lower() in child_text for term in whitelist)
-            if whitelist_match:
+            if profile.whitelist_matcher.matches(child_text):
                 continue  # Keep this item
             
             # Check blacklist
-            blacklist_match = any(term.lower() in child_text for term in blacklist)
-            if blacklist_match:
+            if profile.blacklist_matcher.matches(child_text):
                 items_to_hide.append(child_id)
     
     return items_to_hide
@@ -772,17 +821,50 @@ else:
         "Authorization": f"Bearer {OPENAI_API_KEY}",
         "Content-Type": "application/json"
     }
+    # Pooled HTTP/2 client, opened and warmed up in the lifespan
+    llm_pool.register("openai", "https://api.openai.com", OPENAI_HEADERS, warmup_path="/v1/models")
     logger.info("OpenAI client initialized successfully")
 
-# Add startup event for debugging (after variables are defined)
-@app.on_event("startup")
-async def startup_event():
-    logger.info("🚀 Doom Blocker Backend starting up...")
-    logger.info(f"📁 Current working directory: {os.getcwd()}")
-    logger.info(f"📄 Prompts loaded: {len(prompts_data)} patterns")
-    logger.info(f"🔑 OpenAI configured: {OPENAI_HEADERS is not None}")
-    logger.info(f"🗄️ Supabase configured: {supabase is not None}")
-    logger.info("✅ Startup complete!")
+# Classification providers, raced in LLM_PROVIDERS order (primary first). With more than
+# one provider a hedged request goes to the next one when the primary runs slow.
+llm_providers = {}
+if OPENAI_HEADERS:
+    llm_providers["openai"] = OpenAICompatibleProvider(
+        "openai", "gpt-4o-mini", llm_pool.get("openai"), breaker=openai_circuit_breaker
+    )
+
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+if GROQ_API_KEY:
+    GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
+    llm_pool.register("groq", "https://api.groq.com", {
+        "Authorization": f"Bearer {GROQ_API_KEY}",
+        "Content-Type": "application/json"
+    }, warmup_path="/openai/v1/models")
+    llm_providers["groq"] = OpenAICompatibleProvider(
+        "groq", GROQ_MODEL, llm_pool.get("groq"), path="/openai/v1/chat/completions",
+        breaker=circuit_breakers.get("groq", GROQ_MODEL)
+    )
+    logger.info("Groq client initialized successfully")
+
+if os.getenv("LLM_MOCK_PROVIDER", "false").lower() == "true":
+    # Local stand-in for load tests: hides literal blacklist matches after a fixed delay
+    llm_providers["mock"] = MockProvider(
+        responder=lambda payload, context: "\n".join(
+            child_id
+            for entry in fallback_keyword_matching(context["grid"], context["blacklist"])
+            for ids in entry.values() for child_id in ids
+        ),
+        delay=float(os.getenv("LLM_MOCK_DELAY_MS", "800")) / 1000.0
+    )
+
+llm_router = HedgedRouter(
+    [llm_providers[name.strip()] for name in os.getenv("LLM_PROVIDERS", "openai").split(",")
+     if name.strip() in llm_providers],
+    percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "90")),
+    min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "300")) / 1000.0,
+    max_delay=float(os.getenv("LLM_HEDGE_MAX_DELAY_MS", "4000")) / 1000.0,
+    default_delay=float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_MS", "1500")) / 1000.0,
+)
 
 # Helper: get client IP honoring proxies
 def get_client_ip(request: Request) -> str:
@@ -800,6 +882,11 @@ class GridAnalysisRequest(BaseModel):
     whitelist: list[str] = []
     blacklist: list[str] = []
     visitorId: str
+    # Compiled filter profile, resolved once per request by get_filter_profile
+    _filter_profile: Optional[FilterProfile] = PrivateAttr(default=None)
+    # Prompt experiment variant, resolved once per request by get_experiment_assignment
+    _experiment: Optional[Assignment] = PrivateAttr(default=None)
+    _experiment_resolved: bool = PrivateAttr(default=False)
     
     @validator('currentUrl')
     def validate_url(cls, v):
@@ -912,66 +999,68 @@ class UserMetricsRequest(BaseModel):
 #         raise HTTPException(status_code=401, detail="Not authenticated")
 #     return user
 
-def get_prompt_for_url(url: str, whitelist: list[str] = None, blacklist: list[str] = None) -> str:
-    """Get the appropriate prompt based on URL regex matching"""
-    # Detect YouTube search URL and extract search query
-    youtube_search_match = re.match(r"https?://(www\.)?youtube\.com/results\?(.+)", url)
-    search_query = None
-    if youtube_search_match:
-        # Extract the search_query parameter from the URL
-        from urllib.parse import parse_qs, urlparse
-        qs = parse_qs(urlparse(url).query)
-        search_query = qs.get("search_query", [None])[0]
-
-    for pattern, config in prompts_data.items():
-        if re.match(pattern, url):
-            prompt = config["prompt"]
-
-            # Replace blacklist and whitelist tags
-            if blacklist and len(blacklist) > 0:
-                blacklist_items = "\n".join(["- %s" % item for item in blacklist])
-                prompt = prompt.replace("<BLACKLIST>", "<BLACKLIST>\n%s" % blacklist_items)
-            else:
-                prompt = prompt.replace("<BLACKLIST>", "")
+def extract_search_query(url: str) -> Optional[str]:
+    """Extract the search query from a YouTube search URL, if any"""
+    return prompt_registry.current.router.route(url).search_query
 
-            if whitelist and len(whitelist) > 0:
-                whitelist_items = "\n".join(["- %s" % item for item in whitelist])
-                prompt = prompt.replace("<WHITELIST>", "<WHITELIST>\n%s" % whitelist_items)
-            else:
-                prompt = prompt.replace("<WHITELIST>", "")
+def get_prompt_pattern_for_url(url: str) -> str:
+    """Get the prompt pattern get_prompt_for_url would use for this URL"""
+    return prompt_registry.current.router.route(url).pattern
 
-            # If YouTube search, add the search query to the prompt
-            if search_query:
-                prompt += f"\n\nUSER_SEARCH_QUERY: {search_query}\nOnly keep videos and results relevant to this search query."
+def get_prompt_revision_for_url(url: str) -> Optional[str]:
+    """Content hash of the prompt entry currently serving the URL's pattern (None for no entry)"""
+    return prompt_registry.current.revisions.get(get_prompt_pattern_for_url(url))
 
+def get_wire_format_for_pattern(pattern: str) -> str:
+    """Wire format for a prompt pattern: the prompt entry's "wire_format", else LLM_WIRE_FORMAT"""
+    wire_format = prompt_registry.current.data.get(pattern, {}).get("wire_format", LLM_WIRE_FORMAT)
+    return wire_format if wire_format in WIRE_FORMATS else "json"
 
+def get_stale_ttl_for_url(url: str) -> float:
+    """Stale grace window (seconds) for a URL: the prompt entry's "stale_while_revalidate", else RESPONSE_CACHE_STALE_TTL"""
+    stale_ttl = prompt_registry.current.data.get(get_prompt_pattern_for_url(url), {}).get("stale_while_revalidate", RESPONSE_CACHE_STALE_TTL)
+    try:
+        return max(0.0, float(stale_ttl))
+    except (TypeError, ValueError):
+        return RESPONSE_CACHE_STALE_TTL
+
+def get_prompt_template_for_url(url: str) -> PromptTemplate:
+    """Compiled prompt template for the URL's pattern (first pattern if none matches)"""
+    templates = prompt_registry.current.templates
+    template = templates.get(get_prompt_pattern_for_url(url))
+    if template is None:
+        # Default fallback (shouldn't happen with proper config)
+        logger.warning("No matching pattern found for URL: %s" % url)
+        template = next(iter(templates.values()))
+    return template
 
-            return prompt
+def get_prompt_for_url(url: str, whitelist: list[str] = None, blacklist: list[str] = None) -> str:
+    """Get the appropriate prompt based on URL regex matching"""
+    prompt = get_prompt_template_for_url(url).render(whitelist, blacklist)
 
-    # Default fallback (shouldn't happen with proper config)
-    logger.warning("No matching pattern found for URL: %s" % url)
-    base_prompt = list(prompts_data.values())[0]["prompt"]
+    # If YouTube search, add the search query to the prompt
+    search_query = extract_search_query(url)
+    if search_query:
+        prompt += f"\n\nUSER_SEARCH_QUERY: {search_query}\nOnly keep videos and results relevant to this search query."
 
-    # Apply same replacement logic for fallback
-    if blacklist and len(blacklist) > 0:
-        blacklist_items = "\n".join(["- %s" % item for item in blacklist])
-        base_prompt = base_prompt.replace("<BLACKLIST>", "<BLACKLIST>\n%s" % blacklist_items)
-    else:
-        base_prompt = base_prompt.replace("<BLACKLIST>", "")
+    return prompt
 
-    if whitelist and len(whitelist) > 0:
-        whitelist_items = "\n".join(["- %s" % item for item in whitelist])
-        base_prompt = base_prompt.replace("<WHITELIST>", "<WHITELIST>\n%s" % whitelist_items)
-    else:
-        base_prompt = base_prompt.replace("<WHITELIST>", "")
+def get_prompt_parts_for_url(url: str, whitelist: list[str] = None, blacklist: list[str] = None,
+                             template: Optional[PromptTemplate] = None) -> tuple[str, str]:
+    """
+    Same prompt as get_prompt_for_url, split into (static prefix, per-request part).
+    The prefix only depends on the URL pattern, so providers can cache it across requests.
+    template overrides the URL's own prompt (experiment variants).
+    """
+    template = template or get_prompt_template_for_url(url)
+    variable_prompt = template.render_variable(whitelist, blacklist)
 
-    # If YouTube search, add the search query to the fallback prompt
+    search_query = extract_search_query(url)
     if search_query:
-        base_prompt += f"\n\nUSER_SEARCH_QUERY: {search_query}\nOnly keep videos and results relevant to this search query."
+        variable_prompt = (f"USER_SEARCH_QUERY: {search_query}\nOnly keep videos and results relevant "
+                           f"to this search query.\n\n{variable_prompt}")
 
-
-
-    return base_prompt
+    return template.static, variable_prompt
 
 # WebSocket endpoint
 @app.websocket("/ws")
@@ -1029,7 +1118,8 @@ async def root():
             "blocked_contents": "/api/blocked-contents",
             "blocked_items": "/api/blocked-items",
             "report_blocked_items": "/api/report-blocked-items",
-            "ai_analysis": "/fetch_distracting_chunks"
+            "ai_analysis": "/fetch_distracting_chunks",
+            "ai_analysis_stream": "/fetch_distracting_chunks/stream"
         }
     }
 
@@ -1088,6 +1178,101 @@ async def health_check():
     status_code = 200 if health_status["status"] == "healthy" else 503
     return JSONResponse(content=health_status, status_code=status_code)
 
+def require_admin(request: Request):
+    """Dependency for /admin endpoints: X-Admin-Key must match ADMIN_API_KEY"""
+    if not ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Admin API disabled")
+    if not secrets.compare_digest(request.headers.get("X-Admin-Key", ""), ADMIN_API_KEY):
+        logger.warning("Invalid admin key attempt", ip=get_client_ip(request))
+        raise HTTPException(status_code=401, detail="Invalid admin key")
+
+class CacheInvalidationRequest(BaseModel):
+    pattern: Optional[str] = None
+    profile: Optional[str] = None
+
+@app.get("/admin/cache", dependencies=[Depends(require_admin)])
+async def admin_cache_report(top: int = 20):
+    """Response-cache memory, hit/miss/stale breakdowns, key ages and hottest keys for this worker"""
+    report = cache_inspector.report(top_n=max(0, min(top, 500)))
+    report["verdict_cache"] = verdict_cache.get_stats()
+    report["similarity_index"] = similarity_index.get_stats()
+    return report
+
+@app.get("/admin/stats", dependencies=[Depends(require_admin)])
+async def admin_stats():
+    """Runtime internals of this worker: breakers, providers, pools, caches, prompts and batching"""
+    return {
+        "circuit_breakers": circuit_breakers.get_metrics(),
+        # Outbound connection pool stats (idle/active connections, handshakes avoided)
+        "http_pools": llm_pool.get_stats(),
+        "llm_providers": llm_router.get_stats(),
+        "prompt_cache": prompt_cache_stats.get_stats(),
+        "wire_format": {"default": LLM_WIRE_FORMAT, "patterns": wire_format_stats.get_stats()},
+        "response_cache": response_store.get_stats(),
+        "cache_snapshot": cache_snapshotter.get_stats() if cache_snapshotter is not None else None,
+        "response_cache_ttls": {**RESPONSE_SOURCE_TTLS, "negative": RESPONSE_CACHE_NEGATIVE_TTL},
+        "stale_while_revalidate": {"default_grace_seconds": RESPONSE_CACHE_STALE_TTL, **revalidator.get_stats()},
+        "verdict_cache": verdict_cache.get_stats(),
+        "filter_profiles": filter_profiles.get_stats(),
+        "grid_trimming": grid_trimmer.get_stats(),
+        "prompts": prompt_registry.get_stats(),
+        "prompt_router": prompt_registry.current.router.get_stats(),
+        "similarity_index": similarity_index.get_stats(),
+        "request_coalescing": analysis_singleflight.get_stats(),
+        "micro_batching": {"enabled": MICRO_BATCH_ENABLED, **micro_batcher.get_stats()},
+    }
+
+@app.post("/admin/cache/invalidate", dependencies=[Depends(require_admin)])
+async def admin_cache_invalidate(invalidation: CacheInvalidationRequest):
+    """Drop cached responses for a URL pattern and/or filter profile (profile also clears per-child verdicts)"""
+    if invalidation.pattern is None and invalidation.profile is None:
+        raise HTTPException(status_code=400, detail="pattern or profile is required")
+    removed = await cache_inspector.invalidate(pattern=invalidation.pattern, profile=invalidation.profile)
+    if invalidation.profile is not None:
+        removed["verdicts"] = verdict_cache.invalidate_profile(invalidation.profile)
+        removed["similar_children"] = similarity_index.invalidate_profile(invalidation.profile)
+    logger.info("🧹 Cache invalidated", pattern=invalidation.pattern, profile=invalidation.profile, **removed)
+    return {"success": True, "removed": removed}
+
+async def invalidate_prompt_dependents(affected_patterns: set[str]) -> dict:
+    """
+    After a prompt reload: drop cached responses, compiled filter profiles and their verdicts
+    for the affected patterns only. Verdicts of profiles no longer in memory are unreachable
+    anyway (the profile key includes the prompt revision) and age out.
+    """
+    stale_profiles = [profile.key for profile in filter_profiles.profiles.values()
+                      if profile.pattern in affected_patterns]
+    removed = {"responses_l1": 0, "responses_l2": 0, "verdicts": 0, "similar_children": 0}
+    for profile_key in stale_profiles:
+        removed["verdicts"] += verdict_cache.invalidate_profile(profile_key)
+        removed["similar_children"] += similarity_index.invalidate_profile(profile_key)
+    removed["filter_profiles"] = filter_profiles.invalidate(lambda profile: profile.pattern in affected_patterns)
+    for pattern in affected_patterns:
+        counts = await cache_inspector.invalidate(pattern=pattern)
+        removed["responses_l1"] += counts["l1"]
+        removed["responses_l2"] += counts["l2"]
+    logger.info("🧹 Prompt-dependent caches invalidated", patterns=sorted(affected_patterns), **removed)
+    return removed
+
+@app.post("/admin/prompts/reload", dependencies=[Depends(require_admin)])
+async def admin_prompts_reload():
+    """Re-read the prompt file now (this worker; the others pick it up on their next file check)"""
+    result = await prompt_registry.reload()
+    if result.get("error"):
+        raise HTTPException(status_code=422, detail=f"Prompt file rejected: {result['error']}")
+    return {"success": True, **result}
+
+@app.get("/admin/experiments", dependencies=[Depends(require_admin)])
+async def admin_experiments_summary():
+    """Per-variant tokens, model latency, hide rate and fallback rate for this worker's traffic"""
+    return {"scope": "worker", "experiments": experiments.summary()}
+
+@app.post("/admin/experiments/reset", dependencies=[Depends(require_admin)])
+async def admin_experiments_reset():
+    """Zero this worker's experiment counters (e.g. after changing a variant)"""
+    experiments.reset()
+    return {"success": True}
+
 # REST endpoint to get current counter (optional)
 @app.get("/api/blocked-count")
 async def get_blocked_count():
@@ -1742,17 +1927,8 @@ async def analytics_frontend(request: Request):
 
     return HTMLResponse(content=html_content)
 
-@app.options("/fetch_distracting_chunks")
-async def options_fetch_distracting_chunks():
-    """Handle CORS preflight for AI analysis endpoint"""
-    return Response(status_code=200)
-
-@app.post("/fetch_distracting_chunks")
-async def fetch_distracting_chunks(analysis_request: GridAnalysisRequest, request: Request):
-    # Get correlation ID from request state
-    correlation_id = getattr(request.state, 'correlation_id', str(uuid.uuid4()))
-    
-    # Track the request by IP address
+def enforce_analysis_rate_limit(analysis_request: GridAnalysisRequest, request: Request, correlation_id: str):
+    """Track the request by IP address and reject it once the hourly limit is exceeded"""
     client_ip = get_client_ip(request)
     request_count = track_ip_request(client_ip)
     
@@ -1777,6 +1953,17 @@ async def fetch_distracting_chunks(analysis_request: GridAnalysisRequest, reques
             detail="RATE_LIMIT_EXCEEDED"
         )
 
+@app.options("/fetch_distracting_chunks")
+async def options_fetch_distracting_chunks():
+    """Handle CORS preflight for AI analysis endpoint"""
+    return Response(status_code=200)
+
+@app.post("/fetch_distracting_chunks")
+async def fetch_distracting_chunks(analysis_request: GridAnalysisRequest, request: Request):
+    # Get correlation ID from request state
+    correlation_id = getattr(request.state, 'correlation_id', str(uuid.uuid4()))
+    enforce_analysis_rate_limit(analysis_request, request, correlation_id)
+
     start_time = time.time()
 
     # Log grid structure details
@@ -1784,91 +1971,50 @@ async def fetch_distracting_chunks(analysis_request: GridAnalysisRequest, reques
     total_grids = grid_structure.get('totalGrids', 0)
     total_children = sum(grid.get('totalChildren', 0) for grid in grid_structure.get('grids', []))
 
+    # Preprocess first: the cache key is built from the cleaned child texts,
+    # hashed once here and reused by the verdict cache
+    try:
+        cleaned_grid, child_hashes = prepare_cleaned_grid(analysis_request, correlation_id,
+                                                          chunked=CHUNKED_ANALYSIS_ENABLED)
+    except Exception as e:
+        logger.error("Request failed during preprocessing", correlation_id=correlation_id, error=str(e))
+        raise HTTPException(status_code=500, detail="Internal server error")
+
     # Check cache first
-    cache_key = get_cache_key(grid_structure, analysis_request.currentUrl, 
-                             analysis_request.whitelist, analysis_request.blacklist)
-    cached_response = get_cached_response(cache_key)
+    cache_key = get_cache_key(cleaned_grid, analysis_request.currentUrl,
+                              analysis_request.whitelist, analysis_request.blacklist, child_hashes,
+                              variant=get_experiment_variant_key(analysis_request))
+    allow_stale = get_stale_ttl_for_url(analysis_request.currentUrl) > 0
+    cached = await get_cached_response(cache_key, get_prompt_pattern_for_url(analysis_request.currentUrl),
+                                       allow_stale=allow_stale)
     
-    if cached_response is not None:
+    if cached.value is not None:
+        if needs_refresh(cached):
+            schedule_cache_refresh(analysis_request, cleaned_grid, child_hashes, cache_key, correlation_id)
         logger.info(f"⚡ Returning cached response - Total time: {time.time() - start_time:.3f}s")
-        return cached_response
+        record_served_outcome(analysis_request, cached.metadata.get('source', 'model'), cached=True)
+        return cached.value
 
-    try:
-        prompt_start = time.time()
-
-        # Expand whitelist/blacklist with simple semantic variants and synonyms for better recall
-        def _generate_variants(term: str) -> list[str]:
-            t = (term or '').strip().lower()
-            if not t:
-                return []
-            variants = {t}
-            # Basic morphological tweaks
-            if len(t) > 2:
-                variants.add(f"{t}s")
-            if t.endswith('y') and len(t) > 3:
-                variants.add(t[:-1] + 'ies')
-            if not t.endswith('ing') and len(t) > 3:
-                variants.add(t + 'ing')
-            if not t.endswith('ed') and len(t) > 3:
-                variants.add(t + 'ed')
-            if not t.endswith('er') and len(t) > 3:
-                variants.add(t + 'er')
-            if not t.endswith('est') and len(t) > 3:
-                variants.add(t + 'est')
-            # Simple obfuscation variants
-            variants.add(t.replace(' ', ''))
-            variants.add(t.replace('-', ' '))
-            variants.add(t.replace(' ', '-'))
-            return list(variants)
-
-        _SYNONYMS: dict[str, list[str]] = {
-            'clickbait': ['bait', 'sensational', "you won't believe", 'shocking', 'overhyped', 'insane', 'crazy', 'gone wrong'],
-            'drama': ['beef', 'tea', 'exposed', 'callout', 'feud'],
-            'gossip': ['rumor', 'rumour', 'tea', 'leak', 'leaked'],
-            'reaction': ['reacts', 'reacting', 'reaction video'],
-            'prank': ['pranks', 'pranking'],
-            'conspiracy': ['theory', 'theories', 'conspiracies'],
-            'shorts': ['short', 'reel', 'reels', 'short video', 'yt shorts'],
-            'mixes': ['mix', 'playlist mix'],
-            'music': ['song', 'track', 'audio', 'lyrics', 'official video', 'mv'],
-            'compilation': ['compilations', 'best of', 'highlights', 'fails']
-        }
+    # Coalesce identical in-flight requests: followers await the leader's analysis
+    outcome = await analysis_singleflight.do(
+        cache_key, run_grid_analysis, analysis_request, cleaned_grid, child_hashes,
+        cache_key, correlation_id, start_time
+    )
+    record_served_outcome(analysis_request, outcome.source)
+    return outcome.data
 
-        def _expand_terms(terms: list[str] | None) -> list[str]:
-            expanded: list[str] = []
-            seen = set()
-            for term in (terms or []):
-                for v in _generate_variants(term):
-                    if v not in seen:
-                        seen.add(v)
-                        expanded.append(v)
-                base = (term or '').strip().lower()
-                for syn in _SYNONYMS.get(base, []):
-                    for sv in _generate_variants(syn):
-                        if sv not in seen:
-                            seen.add(sv)
-                            expanded.append(sv)
-            # If expansion produced nothing, return original terms
-            return expanded if expanded else (terms or [])
-
-        expanded_whitelist = _expand_terms(analysis_request.whitelist)
-        expanded_blacklist = _expand_terms(analysis_request.blacklist)
-
-        base_system_instruction = get_prompt_for_url(analysis_request.currentUrl, expanded_whitelist, expanded_blacklist)
-        logger.info(f"📋 Base system instruction loaded ({time.time() - prompt_start:.3f}s)")
-
-        # Enhanced content preprocessing before sending to LLM
-        from content_preprocessing import ContentPreprocessor
-        preprocessor = ContentPreprocessor()
-        preprocessed_grid = preprocessor.preprocess_grid_structure(grid_structure, analysis_request.currentUrl)
-        cleaned_grid = clean_grid_structure_for_llm(preprocessed_grid)
 
+async def run_grid_analysis(analysis_request: GridAnalysisRequest, cleaned_grid: dict,
+                            child_hashes: dict, cache_key: str, correlation_id: str,
+                            start_time: float) -> AnalysisOutcome:
+    """Run the full analysis for a request that missed the response cache"""
+    try:
         # Check if OpenAI API is configured; if not, use fallback keyword matching instead of failing
         if not OPENAI_HEADERS:
             logger.error("OpenAI API not configured",
                         correlation_id=correlation_id,
                         error="OPENAI_API_KEY missing")
-            result = fallback_keyword_matching(cleaned_grid, analysis_request.blacklist)
+            result = fallback_keyword_matching(cleaned_grid, get_filter_profile(analysis_request).blacklist_matcher)
             total_children_to_remove = len(result)
             total_duration = time.time() - start_time
             logger.info("Using keyword fallback due to missing OpenAI key",
@@ -1876,129 +2022,86 @@ async def fetch_distracting_chunks(analysis_request: GridAnalysisRequest, reques
                         duration=total_duration,
                         items_found=total_children_to_remove)
             # Cache the response for future similar requests
-            cache_response(cache_key, result)
-            return result
+            await cache_response(cache_key, result, analysis_request, source="keyword", started_at=start_time)
+            return AnalysisOutcome(result, "keyword")
 
-        # Process entire grid structure in one API call
-        api_start = time.time()
+        # Reuse per-child verdicts; only children never seen under this profile go to the model
+        verdict_profile = get_verdict_profile(analysis_request)
+        cached_hide_ids, llm_grid, cached_children = verdict_cache.partition_grid(
+            cleaned_grid, verdict_profile, text_hashes=child_hashes
+        )
 
-        # Build strong system prompt with explicit schema and valid IDs to avoid hallucinations
-        def get_valid_child_ids(cleaned):
-            ids = []
-            for grid in cleaned.get('grids', []):
-                for child in grid.get('children', []):
-                    cid = child.get('id')
-                    if cid:
-                        ids.append(cid)
-            return ids
-
-        def build_system_prompt(base_prompt: str, cleaned: dict) -> str:
-            valid_ids = get_valid_child_ids(cleaned)
-            ids_block = "\n".join(valid_ids)
-            
-            # Enhanced prompt with better context and decision reasoning
-            enhanced_rules = (
-                "\n\n🧠 ENHANCED ANALYSIS FRAMEWORK:\n"
-                "1. **Content Analysis Depth:**\n"
-                "   - Primary: Title, description, metadata\n"
-                "   - Secondary: View counts, upload dates, badges\n"
-                "   - Context: Platform indicators, quality signals\n\n"
-                "2. **Semantic Understanding:**\n"
-                "   - Intent Recognition: Educational vs entertainment\n"
-                "   - Context Awareness: Tutorial vs reaction vs compilation\n"
-                "   - Quality Indicators: Clickbait patterns, sensational language\n"
-                "   - Cultural Context: References, memes, trending topics\n\n"
-                "3. **Advanced Pattern Detection:**\n"
-                "   - Obfuscation Detection: Leetspeak, spacing tricks, emoji substitution\n"
-                "   - Multilingual Support: Content in different languages\n"
-                "   - Euphemism Recognition: Indirect references to blacklisted topics\n"
-                "   - Temporal Relevance: Outdated vs evergreen content\n\n"
-                "   - Synonym Awareness: Treat synonyms/paraphrases of blacklist terms as matches\n\n"
-                "4. **DECISION MATRIX:**\n"
-                "   | Whitelist Match | Blacklist Match | Decision | Reasoning |\n"
-                "   |----------------|-----------------|----------|----------|\n"
-                "   | Strong | Any | KEEP | Whitelist priority |\n"
-                "   | Weak | Strong | HIDE | Clear blacklist violation |\n"
-                "   | None | Strong | HIDE | Obvious filtering target |\n"
-                "   | None | Weak | HIDE | Conservative approach |\n"
-                "   | Weak | Weak | HIDE | Default to filtering |\n\n"
-                "5. **QUALITY THRESHOLDS:**\n"
-                "   - High Confidence: >80% semantic match to blacklist\n"
-                "   - Medium Confidence: 50-80% match, consider context\n"
-                "   - Low Confidence: <50% match, prefer keeping unless clear whitelist\n\n"
-                "STRICT OUTPUT RULES:\n"
-                "- Output ONLY a newline-separated list of child IDs to hide (e.g., g1c0, g1c5).\n"
-                "- Do NOT include any explanations, JSON, code fences, or extra text.\n"
-                "- If nothing should be hidden, return an empty string.\n"
-                "- You MUST only return IDs from the VALID_CHILD_IDS list below. Never invent IDs.\n"
-                "- Prefer to hide content matching blacklist terms and unrelated to whitelist intent.\n"
-                "- Consider confidence levels and context when making decisions.\n"
-                "\nVALID_CHILD_IDS:\n" + ids_block + "\n"
-            )
-            return f"{base_prompt}{enhanced_rules}"
+        if not llm_grid['grids']:
+            result = convert_newline_format_to_json("\n".join(order_child_ids(cleaned_grid, cached_hide_ids)))
+            logger.info(f"⚡ All {cached_children} children answered from verdict cache - Total time: {time.time() - start_time:.3f}s")
+            await cache_response(cache_key, result, analysis_request, started_at=start_time)
+            return AnalysisOutcome(result, "model")
+
+        if cached_children:
+            logger.info(f"🧩 Verdict cache covered {cached_children} children, sending the rest to the model",
+                        correlation_id=correlation_id)
+
+        # Oversized grids: classify as concurrent chunk calls instead of one big call
+        if CHUNKED_ANALYSIS_ENABLED and estimate_grid_tokens(llm_grid) > CHUNKED_ANALYSIS_TOKEN_BUDGET:
+            api_start = time.time()
+            model_hide_ids = await run_chunked_analysis(analysis_request, llm_grid, verdict_profile,
+                                                        child_hashes, correlation_id)
+            api_duration = time.time() - api_start
+            hide_ids = order_child_ids(cleaned_grid, cached_hide_ids + model_hide_ids)
+            result = convert_newline_format_to_json("\n".join(hide_ids))
+            total_duration = time.time() - start_time
+            logger.info(f"✅ Chunked request completed - {len(hide_ids)} children to remove - Total time: {total_duration:.3f}s")
+            logger.info(f"⏱️  Breakdown: API={api_duration:.3f}s, Other={total_duration-api_duration:.3f}s")
+            await cache_response(cache_key, result, analysis_request, started_at=start_time)
+            return AnalysisOutcome(result, "model")
 
-        system_instruction = build_system_prompt(base_system_instruction, cleaned_grid)
-        content = json.dumps(cleaned_grid, indent=2)
-        
-        # DEBUG: Log what we're sending to the AI
-        if logger.isEnabledFor(logging.DEBUG):
-            logger.debug(f"Sending to AI - URL only")
-            logger.debug(f"Grid structure has {len(cleaned_grid.get('grids', []))} grids")
-            logger.debug(f"Total children: {sum(grid.get('totalChildren', 0) for grid in cleaned_grid.get('grids', []))}")
-
-
-        payload = {
-            "model": "gpt-4o-mini",  # Faster model for lower latency
-            "messages": [
-                {
-                    "role": "system",
-                    "content": system_instruction
-                },
-                {
-                    "role": "user",
-                    "content": content
-                }
-            ],
-            "max_tokens": 512,  # Increased for better analysis
-            "temperature": 0.3,  # Lower for more deterministic results
-            "top_p": 0.9,  # Add top_p for better token selection
-            "frequency_penalty": 0.1,  # Reduce repetition
-            "presence_penalty": 0.1  # Encourage diverse responses
-        }
+        # Process the remaining grid structure in one API call
+        api_start = time.time()
+
+        payload = build_analysis_payload(analysis_request, llm_grid)
 
-        # Use circuit breaker for OpenAI API call
-        async def make_openai_request():
-            timeout = httpx.Timeout(30.0, connect=10.0, read=25.0, write=10.0)
-            async with httpx.AsyncClient(timeout=timeout) as client:
-                response = await client.post(OPENAI_URL, headers=OPENAI_HEADERS, json=payload)
-                if response.status_code != 200:
-                    raise Exception(f"OpenAI API error: {response.status_code} - {response.text}")
-                return response
-        
         try:
-            response = await openai_circuit_breaker.call(make_openai_request)
+            if MICRO_BATCH_ENABLED:
+                # Share one classification call with concurrent requests on the same filter profile
+                batch_hide_ids = await micro_batcher.submit(verdict_profile, llm_grid, analysis_request)
+                # None: the batch answer could not be parsed, so this request falls back too
+                response_content = "\n".join(batch_hide_ids) if batch_hide_ids is not None else None
+            else:
+                response_content = await classify_grid(payload, llm_grid, analysis_request)
         except Exception as e:
             logger.error("OpenAI API call failed", 
                         correlation_id=correlation_id,
                         error=str(e),
                         circuit_breaker_state=openai_circuit_breaker.state)
             
-            # Enhanced fallback with multiple strategies
+            # Enhanced fallback with multiple strategies, on the children the verdict cache did not answer
             fallback_result = await handle_ai_failure(
                 e, 
-                cleaned_grid, 
+                llm_grid, 
                 analysis_request, 
-                correlation_id
+                correlation_id,
+                child_hashes
             )
             
             if fallback_result:
-                return fallback_result
+                fallback_ids = fallback_hide_ids(fallback_result.get("data"), llm_grid)
+                hide_ids = order_child_ids(cleaned_grid, cached_hide_ids + fallback_ids)
+                fallback_result = {**fallback_result,
+                                   "data": convert_newline_format_to_json("\n".join(hide_ids)),
+                                   "total_children_to_remove": len(hide_ids)}
+                # Short-lived negative entry: identical requests stop retrying the failing provider
+                source = response_source(fallback_result.get("fallback_used"))
+                await cache_response(cache_key, fallback_result, analysis_request,
+                                     source=source, provider_failed=True, started_at=start_time)
+                return AnalysisOutcome(fallback_result, source)
             
             # Final fallback to keyword matching
             logger.info("Using final fallback: keyword matching", 
                        correlation_id=correlation_id)
-            result = fallback_keyword_matching(cleaned_grid, analysis_request.blacklist)
-            total_children_to_remove = len(result)
+            keyword_result = fallback_keyword_matching(llm_grid, get_filter_profile(analysis_request).blacklist_matcher)
+            hide_ids = order_child_ids(cleaned_grid, cached_hide_ids + fallback_hide_ids(keyword_result, llm_grid))
+            result = convert_newline_format_to_json("\n".join(hide_ids))
+            total_children_to_remove = len(hide_ids)
             
             total_duration = time.time() - start_time
             logger.info("Fallback completed", 
@@ -2006,54 +2109,36 @@ async def fetch_distracting_chunks(analysis_request: GridAnalysisRequest, reques
                         duration=total_duration,
                         items_found=total_children_to_remove)
             
-            return result
+            await cache_response(cache_key, result, analysis_request, source="keyword", provider_failed=True,
+                                 started_at=start_time)
+            return AnalysisOutcome(result, "keyword")
         # If the OpenAI request succeeded, proceed to parse the response
 
-        api_result = response.json()
-        response_content = api_result['choices'][0]['message']['content'].strip()
-
         api_duration = time.time() - api_start
-        logger.info(f"✅ OpenAI API call completed ({api_duration:.3f}s)")
+        logger.info(f"✅ LLM API call completed ({api_duration:.3f}s)")
         
-        if logger.isEnabledFor(logging.DEBUG):
+        if logger.isEnabledFor(logging.DEBUG) and response_content is not None:
             logger.debug(f"AI response length: {len(response_content)} chars")
 
         # Parse and sanitize the result
         parse_start = time.time()
 
-        def sanitize_llm_response(text: str, cleaned: dict) -> str:
-            """Extract only valid child IDs present in the cleaned grid from arbitrary model text."""
-            try:
-                # Collect valid IDs set
-                valid = set()
-                for grid in cleaned.get('grids', []):
-                    for child in grid.get('children', []):
-                        cid = child.get('id')
-                        if cid:
-                            valid.add(cid)
-                # Regex to find tokens like g12c3 etc.
-                ids = re.findall(r"g\d+c\d+", text or "")
-                # Filter to only valid ids and deduplicate preserving order
-                seen = set()
-                filtered = []
-                for cid in ids:
-                    if cid in valid and cid not in seen:
-                        filtered.append(cid)
-                        seen.add(cid)
-                return "\n".join(filtered)
-            except Exception:
-                return ""
-
-        # Sanitize first, then convert
-        sanitized = sanitize_llm_response(response_content, cleaned_grid)
-        if sanitized and sanitized.strip():
-            result = convert_newline_format_to_json(sanitized)
-            total_children_to_remove = len([child for child in sanitized.split('\n') if child.strip()])
+        # Sanitize first, then convert; an empty answer means every child shown is kept
+        model_hide_ids = parse_llm_hide_ids(response_content, llm_grid) if response_content is not None else None
+        source = "model"
+        if model_hide_ids is not None:
+            record_model_verdicts(llm_grid, model_hide_ids, verdict_profile, child_hashes)
+            hide_ids = order_child_ids(cleaned_grid, cached_hide_ids + model_hide_ids)
+            result = convert_newline_format_to_json("\n".join(hide_ids))
+            total_children_to_remove = len(hide_ids)
         else:
-            # FALLBACK: If AI returns empty, try simple keyword matching
-            logger.warning("🤖 AI returned empty response, trying fallback keyword matching")
-            result = fallback_keyword_matching(cleaned_grid, analysis_request.blacklist)
-            total_children_to_remove = len(result)
+            # FALLBACK: If the AI answer cannot be parsed, try simple keyword matching
+            logger.warning("🤖 AI returned an unparseable response, trying fallback keyword matching")
+            fallback_result = fallback_keyword_matching(llm_grid, get_filter_profile(analysis_request).blacklist_matcher)
+            hide_ids = order_child_ids(cleaned_grid, cached_hide_ids + fallback_hide_ids(fallback_result, llm_grid))
+            result = convert_newline_format_to_json("\n".join(hide_ids))
+            total_children_to_remove = len(hide_ids)
+            source = "keyword"
             logger.info(f"🔄 Fallback found {total_children_to_remove} items to remove")
 
         parse_duration = time.time() - parse_start
@@ -2067,9 +2152,9 @@ async def fetch_distracting_chunks(analysis_request: GridAnalysisRequest, reques
         # increment_blocked_counter(total_children_to_remove)
 
         # Cache the response for future requests
-        cache_response(cache_key, result)
+        await cache_response(cache_key, result, analysis_request, source=source, started_at=start_time)
 
-        return result
+        return AnalysisOutcome(result, source)
 
     except Exception as e:
         error_duration = time.time() - start_time
@@ -2077,10 +2162,600 @@ async def fetch_distracting_chunks(analysis_request: GridAnalysisRequest, reques
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
-def split_grid_into_chunks(grid_structure, chunk_size):
+@app.options("/fetch_distracting_chunks/stream")
+async def options_fetch_distracting_chunks_stream():
+    """Handle CORS preflight for streaming AI analysis endpoint"""
+    return Response(status_code=200)
+
+@app.post("/fetch_distracting_chunks/stream")
+async def fetch_distracting_chunks_stream(analysis_request: GridAnalysisRequest, request: Request):
+    """
+    Streaming variant of /fetch_distracting_chunks (NDJSON).
+
+    Emits one {"type": "hide", "data": [{gridId: [childIds]}]} line per hide decision as soon
+    as it is known (verdict cache first, then model tokens as they arrive), followed by a final
+    {"type": "done", "data": <full result>} line in the same shape as the non-streaming response.
+    """
+    correlation_id = getattr(request.state, 'correlation_id', str(uuid.uuid4()))
+    enforce_analysis_rate_limit(analysis_request, request, correlation_id)
+
+    return StreamingResponse(
+        stream_grid_analysis(analysis_request, correlation_id, time.time()),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _ndjson_event(event_type: str, **fields) -> str:
+    return json.dumps({"type": event_type, **fields}) + "\n"
+
+async def stream_grid_analysis(analysis_request: GridAnalysisRequest, correlation_id: str, start_time: float):
+    """Async generator behind the streaming endpoint"""
+    try:
+        cleaned_grid, child_hashes = prepare_cleaned_grid(analysis_request, correlation_id)
+    except Exception as e:
+        logger.error("Streaming request failed during preprocessing", correlation_id=correlation_id, error=str(e))
+        yield _ndjson_event("error", error="Internal server error")
+        return
+
+    cache_key = get_cache_key(cleaned_grid, analysis_request.currentUrl,
+                              analysis_request.whitelist, analysis_request.blacklist, child_hashes,
+                              variant=get_experiment_variant_key(analysis_request))
+    allow_stale = get_stale_ttl_for_url(analysis_request.currentUrl) > 0
+    cached = await get_cached_response(cache_key, get_prompt_pattern_for_url(analysis_request.currentUrl),
+                                       allow_stale=allow_stale)
+    cached_response = cached.value
+    if cached_response is not None:
+        if needs_refresh(cached):
+            schedule_cache_refresh(analysis_request, cleaned_grid, child_hashes, cache_key, correlation_id)
+        record_served_outcome(analysis_request, cached.metadata.get('source', 'model'), cached=True)
+        yield _ndjson_event("hide", data=cached_response, source="cache")
+        yield _ndjson_event("done", data=cached_response, source="cache",
+                            duration=round(time.time() - start_time, 3))
+        return
+
+    if not OPENAI_HEADERS:
+        result = fallback_keyword_matching(cleaned_grid, get_filter_profile(analysis_request).blacklist_matcher)
+        await cache_response(cache_key, result, analysis_request, source="keyword", started_at=start_time)
+        record_served_outcome(analysis_request, "keyword")
+        if result:
+            yield _ndjson_event("hide", data=result, source="keyword")
+        yield _ndjson_event("done", data=result, source="keyword",
+                            duration=round(time.time() - start_time, 3))
+        return
+
+    verdict_profile = get_verdict_profile(analysis_request)
+    cached_hide_ids, llm_grid, cached_children = verdict_cache.partition_grid(
+        cleaned_grid, verdict_profile, text_hashes=child_hashes
+    )
+    emitted: list[str] = []
+
+    # Flush everything the verdict cache already knows before touching the model
+    if cached_hide_ids:
+        emitted.extend(cached_hide_ids)
+        yield _ndjson_event("hide", data=convert_newline_format_to_json("\n".join(cached_hide_ids)), source="cache")
+
+    source = "cache"
+    stream_error = None
+    model_hide_ids: list[str] = []
+    if llm_grid['grids']:
+        source = "model"
+        payload = build_analysis_payload(analysis_request, llm_grid, stream=True)
+        parser = IncrementalIdParser(get_valid_child_ids(llm_grid))
+        queue: asyncio.Queue = asyncio.Queue()
+        stream_text: list[str] = []
+
+        async def consume_stream():
+            async for delta in llm_pool.get("openai").stream_chat(OPENAI_URL, json=payload):
+                stream_text.append(delta)
+                for child_id in parser.feed(delta):
+                    queue.put_nowait(child_id)
+            for child_id in parser.flush():
+                queue.put_nowait(child_id)
+
+        api_start = time.time()
+        first_id_at = None
+        stream_task = asyncio.create_task(openai_circuit_breaker.call(consume_stream))
+        stream_task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while True:
+                child_id = await queue.get()
+                if child_id is None:
+                    break
+                if first_id_at is None:
+                    first_id_at = time.time() - api_start
+                model_hide_ids.append(child_id)
+                emitted.append(child_id)
+                yield _ndjson_event("hide", data=convert_newline_format_to_json(child_id), source="model")
+        finally:
+            # Client disconnected mid-stream: stop reading from the provider
+            if not stream_task.done():
+                stream_task.cancel()
+
+        stream_error = stream_task.exception() if not stream_task.cancelled() else None
+        if not stream_task.cancelled():
+            record_experiment_call(analysis_request, payload, llm_grid, time.time() - api_start,
+                                   None if stream_error is not None else "\n".join(model_hide_ids))
+        # An empty answer is a verdict too (keep everything); only unparseable text falls back
+        if stream_error is None and (model_hide_ids or
+                                     parse_llm_hide_ids("".join(stream_text), llm_grid) is not None):
+            record_model_verdicts(llm_grid, model_hide_ids, verdict_profile, child_hashes)
+            first_hide = f"{first_id_at:.3f}s" if first_id_at is not None else "none"
+            logger.info(f"✅ Streamed {len(model_hide_ids)} model verdicts (first hide after "
+                        f"{first_hide}, stream {time.time() - api_start:.3f}s)",
+                        correlation_id=correlation_id)
+        else:
+            if stream_error is not None:
+                logger.error("OpenAI streaming call failed",
+                             correlation_id=correlation_id,
+                             error=str(stream_error),
+                             circuit_breaker_state=openai_circuit_breaker.state)
+                fallback_result = await handle_ai_failure(stream_error, llm_grid, analysis_request, correlation_id,
+                                                         child_hashes)
+                fallback_ids = fallback_hide_ids(fallback_result.get('data'), llm_grid) if fallback_result else []
+                source = fallback_result.get("fallback_used", "fallback") if fallback_result else "keyword"
+            else:
+                logger.warning("🤖 AI returned an unparseable stream, trying fallback keyword matching",
+                               correlation_id=correlation_id)
+                fallback_ids = []
+                source = "keyword"
+            if not any(fallback_ids):
+                keyword_result = fallback_keyword_matching(llm_grid, get_filter_profile(analysis_request).blacklist_matcher)
+                fallback_ids = fallback_hide_ids(keyword_result, llm_grid)
+            new_ids = [cid for cid in fallback_ids if cid and cid not in emitted]
+            if new_ids:
+                emitted.extend(new_ids)
+                yield _ndjson_event("hide", data=convert_newline_format_to_json("\n".join(new_ids)), source=source)
+
+    result = convert_newline_format_to_json("\n".join(order_child_ids(cleaned_grid, emitted)))
+    if source in ("model", "cache"):
+        await cache_response(cache_key, result, analysis_request, started_at=start_time)
+    elif stream_error is not None:
+        await cache_response(cache_key, result, analysis_request,
+                             source=response_source(source), provider_failed=True, started_at=start_time)
+    record_served_outcome(analysis_request, "model" if source == "cache" else response_source(source))
+    yield _ndjson_event("done", data=result, source=source,
+                        total_children_to_remove=len(emitted),
+                        duration=round(time.time() - start_time, 3))
+
+async def run_chunked_analysis(analysis_request: GridAnalysisRequest, llm_grid: dict,
+                               verdict_profile: str, child_hashes: dict, correlation_id: str) -> list[str]:
+    """
+    Classify an oversized grid as concurrent chunk calls and merge the results in chunk order.
+    A failed chunk falls back to keyword matching on its own children only.
+    """
+    chunks = split_grid_into_chunks(llm_grid, CHUNKED_ANALYSIS_MAX_CHUNK_CHILDREN,
+                                    token_budget=CHUNKED_ANALYSIS_TOKEN_BUDGET)
+    logger.info(f"🧱 Splitting grid into {len(chunks)} chunks", correlation_id=correlation_id)
+
+    def keyword_chunk_result(chunk):
+        keyword_result = fallback_keyword_matching(chunk, get_filter_profile(analysis_request).blacklist_matcher)
+        return {'success': True, 'data': sanitize_llm_response(json.dumps(keyword_result), chunk),
+                'fallback_used': 'keyword'}
+
+    async def analyze_chunk(index: int, chunk: dict) -> dict:
+        async with chunk_semaphore:
+            payload = build_analysis_payload(analysis_request, chunk)
+
+            try:
+                response_content = await classify_grid(payload, chunk, analysis_request)
+            except Exception as e:
+                logger.warning(f"Chunk {index} failed, using keyword fallback for its children",
+                               correlation_id=correlation_id, error=str(e))
+                return keyword_chunk_result(chunk)
+
+            chunk_hide_ids = parse_llm_hide_ids(response_content, chunk)
+            if chunk_hide_ids is None:
+                return keyword_chunk_result(chunk)
+            record_model_verdicts(chunk, chunk_hide_ids, verdict_profile, child_hashes)
+            return {'success': True, 'data': "\n".join(chunk_hide_ids)}
+
+    chunk_results = await asyncio.gather(*(analyze_chunk(i, chunk) for i, chunk in enumerate(chunks)))
+    fallback_chunks = sum(1 for r in chunk_results if r.get('fallback_used'))
+    if fallback_chunks:
+        logger.warning(f"{fallback_chunks}/{len(chunks)} chunks used keyword fallback", correlation_id=correlation_id)
+
+    combined = combine_chunk_results(chunk_results)
+    return [child_id for entry in combined.get('data', []) for ids in entry.values() for child_id in ids]
+
+async def classify_grid(payload: dict, llm_grid: dict, analysis_request: GridAnalysisRequest) -> str:
+    """
+    Send a classification payload through the provider router. An answer naming IDs outside
+    the grid counts as unusable, so a hedged provider's answer can still win; an empty answer
+    (nothing to hide) is valid.
+    """
+    context = {"grid": llm_grid, "blacklist": get_filter_profile(analysis_request).blacklist_matcher}
+    call_start = time.time()
+    try:
+        text, provider_name = await llm_router.complete(
+            payload,
+            context=context,
+            validate=lambda candidate: is_well_formed_llm_response(candidate, llm_grid)
+        )
+    except Exception:
+        record_experiment_call(analysis_request, payload, llm_grid, time.time() - call_start)
+        raise
+    record_experiment_call(analysis_request, payload, llm_grid, time.time() - call_start,
+                           text, context.get("usage", {}).get(provider_name))
+    prompt_cache_stats.record(
+        get_prompt_pattern_for_url(analysis_request.currentUrl),
+        context.get("usage", {}).get(provider_name)
+    )
+    if provider_name != "openai":
+        logger.info(f"🏁 Classification answered by {provider_name}")
+    return text
+
+async def dispatch_micro_batch(analysis_request: GridAnalysisRequest, batch_grid: dict) -> str:
+    """Classify a merged micro-batch in one call; any request in the batch supplies the prompt"""
+    payload = build_analysis_payload(analysis_request, batch_grid)
+    return await classify_grid(payload, batch_grid, analysis_request)
+
+def parse_micro_batch(text: str, batch_grid: dict) -> Optional[list[str]]:
+    """Batch IDs to hide from a micro-batch answer, None if it cannot be parsed"""
+    return parse_llm_hide_ids(text, batch_grid)
+
+micro_batcher = MicroBatcher(
+    dispatch_micro_batch,
+    window_ms=MICRO_BATCH_WINDOW_MS,
+    max_batch_children=MICRO_BATCH_MAX_CHILDREN,
+    parse=parse_micro_batch
+)
+
+def get_grid_token_budget_for_url(url: str) -> int:
+    """Per-grid token budget for a URL: the prompt entry's "grid_token_budget", else GRID_TOKEN_BUDGET"""
+    budget = prompt_registry.current.data.get(get_prompt_pattern_for_url(url), {}).get("grid_token_budget")
+    try:
+        return int(budget) if budget else grid_trimmer.token_budget
+    except (TypeError, ValueError):
+        return grid_trimmer.token_budget
+
+def prepare_cleaned_grid(analysis_request: GridAnalysisRequest, correlation_id: Optional[str] = None,
+                         chunked: bool = False) -> tuple[dict, dict]:
+    """
+    Preprocess and trim the request's grid structure into what the LLM is shown.
+    Returns (cleaned grid, child ID -> text hash). Hashes are taken from the untrimmed
+    preprocessed text, so a different token budget does not change cache or verdict keys.
+    """
+    # Enhanced content preprocessing before sending to LLM
+    from content_preprocessing import ContentPreprocessor
+    preprocessor = ContentPreprocessor()
+    preprocessed_grid = preprocessor.preprocess_grid_structure(analysis_request.gridStructure, analysis_request.currentUrl)
+    token_budget = get_grid_token_budget_for_url(analysis_request.currentUrl)
+    if chunked:
+        # Chunked analysis splits the grid across calls, so it can take a larger share
+        token_budget = max(token_budget, CHUNKED_ANALYSIS_GRID_TOKEN_BUDGET)
+    cleaned_grid, usage = grid_trimmer.trim(
+        preprocessed_grid,
+        token_budget=token_budget,
+        max_children_per_grid=CHUNKED_ANALYSIS_MAX_CHILDREN_PER_GRID if chunked else None
+    )
+    logger.info(f"✂️ Grid trimmed to ~{usage['tokens_used']} tokens over {usage['grids']} grids "
+                f"({usage['token_budget_per_grid']}/grid; {usage['children_kept']} children kept, "
+                f"{usage['children_dropped']} dropped, "
+                f"{usage['children_truncated']} truncated)", correlation_id=correlation_id)
+    untrimmed_hashes = hash_grid_children(preprocessed_grid)
+    child_hashes = {child['id']: untrimmed_hashes[child['id']]
+                    for grid in cleaned_grid['grids'] for child in grid['children'] if child.get('id')}
+    return cleaned_grid, child_hashes
+
+def build_filter_profile(profile_key: str, url: str, whitelist: list[str], blacklist: list[str],
+                         prompt_pattern: str, search_query: Optional[str], variant=None) -> FilterProfile:
+    """Expand the canonical lists and render the prompt parts for one filter profile"""
+    expanded_whitelist = expand_terms(whitelist)
+    expanded_blacklist = expand_terms(blacklist)
+    template = variant.template_for_url(url) if variant is not None else None
+    static_prompt, variable_prompt = get_prompt_parts_for_url(url, expanded_whitelist, expanded_blacklist,
+                                                              template=template)
+    wire_format = get_wire_format_for_pattern(prompt_pattern)
+    if variant is not None and variant.wire_format:
+        wire_format = variant.wire_format
+    return FilterProfile(
+        key=profile_key,
+        pattern=prompt_pattern,
+        search_query=search_query,
+        whitelist=whitelist,
+        blacklist=blacklist,
+        expanded_whitelist=expanded_whitelist,
+        expanded_blacklist=expanded_blacklist,
+        static_prompt=static_prompt,
+        variable_prompt=variable_prompt,
+        wire_format=wire_format,
+    )
+
+def get_filter_profile(analysis_request: GridAnalysisRequest) -> FilterProfile:
+    """
+    Compiled filter profile for the request's lists, URL prompt pattern and search query.
+    Built once per profile key and shared across requests; the request keeps a reference.
+    """
+    profile = analysis_request._filter_profile
+    if profile is None:
+        url = analysis_request.currentUrl
+        whitelist = canonical_terms(analysis_request.whitelist)
+        blacklist = canonical_terms(analysis_request.blacklist)
+        prompt_pattern = get_prompt_pattern_for_url(url)
+        search_query = extract_search_query(url)
+        prompt_revision = prompt_registry.current.revisions.get(prompt_pattern)
+        assignment = get_experiment_assignment(analysis_request)
+        variant = None
+        if assignment is not None and assignment.key is not None:
+            # Variants get their own profile, so verdicts never cross between prompts
+            variant = experiments.variant(assignment)
+            prompt_revision = f"{prompt_revision}:{assignment.key}"
+        profile_key = build_profile_key(whitelist, blacklist, prompt_pattern, search_query, prompt_revision)
+        profile = filter_profiles.get_or_build(
+            profile_key,
+            lambda: build_filter_profile(profile_key, url, whitelist, blacklist, prompt_pattern, search_query,
+                                         variant)
+        )
+        analysis_request._filter_profile = profile
+    return profile
+
+def get_experiment_assignment(analysis_request: GridAnalysisRequest) -> Optional[Assignment]:
+    """The request's experiment variant (by visitorId) for its URL pattern, or None"""
+    if not analysis_request._experiment_resolved:
+        if experiments.experiments:
+            analysis_request._experiment = experiments.assign(
+                get_prompt_pattern_for_url(analysis_request.currentUrl), analysis_request.visitorId
+            )
+        analysis_request._experiment_resolved = True
+    return analysis_request._experiment
+
+def get_experiment_variant_key(analysis_request: GridAnalysisRequest) -> Optional[str]:
+    """Cache-partition key of the request's variant (None for control and unassigned traffic)"""
+    assignment = get_experiment_assignment(analysis_request)
+    return assignment.key if assignment is not None else None
+
+def record_experiment_call(analysis_request: GridAnalysisRequest, payload: dict, llm_grid: dict,
+                           latency: float, text: Optional[str] = None, usage: Optional[dict] = None):
+    """Telemetry for one classification call (text None = the call failed); tokens are estimated without usage"""
+    assignment = get_experiment_assignment(analysis_request)
+    if assignment is None:
+        return
+    if text is None:
+        experiments.record_call(assignment, latency, 0, 0, 0, 0, error=True)
+        return
+    usage = usage or {}
+    input_tokens = usage.get("prompt_tokens") or sum(
+        estimate_tokens(message.get("content", "")) for message in payload.get("messages", []))
+    output_tokens = usage.get("completion_tokens") or estimate_tokens(text)
+    hidden = sanitize_llm_response(text, llm_grid)
+    experiments.record_call(assignment, latency, input_tokens, output_tokens,
+                            len(get_valid_child_ids(llm_grid)), len(hidden.split("\n")) if hidden else 0)
+
+def get_verdict_profile(analysis_request: GridAnalysisRequest) -> str:
+    """Verdict-cache profile key for the request's lists and URL prompt pattern"""
+    return get_filter_profile(analysis_request).key
+
+def build_analysis_payload(analysis_request: GridAnalysisRequest, llm_grid: dict, stream: bool = False) -> dict:
+    """Build the chat completion payload for the children that need the model"""
+    prompt_start = time.time()
+    profile = get_filter_profile(analysis_request)
+    static_prompt, variable_prompt = profile.static_prompt, profile.variable_prompt
+    logger.info(f"📋 Base system instruction loaded ({time.time() - prompt_start:.3f}s)")
+
+    prompt_pattern = profile.pattern
+    wire_format = profile.wire_format
+    system_instruction, content = build_prompt_messages(static_prompt, variable_prompt, llm_grid, wire_format)
+
+    # Estimated input tokens, and what the JSON format would have cost for the same grid
+    tokens_sent = estimate_tokens(system_instruction) + estimate_tokens(content)
+    tokens_saved = 0
+    if wire_format != "json":
+        json_tokens = sum(estimate_tokens(part) for part in
+                          build_prompt_messages(static_prompt, variable_prompt, llm_grid, "json"))
+        tokens_saved = max(0, json_tokens - tokens_sent)
+    wire_format_stats.record(prompt_pattern, wire_format, tokens_sent, tokens_saved)
+    logger.info(f"🗜️ Payload ~{tokens_sent} input tokens ({wire_format} format, ~{tokens_saved} saved)")
+
+    # DEBUG: Log what we're sending to the AI
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Sending to AI - URL only")
+        logger.debug(f"Grid structure has {len(llm_grid.get('grids', []))} grids")
+        logger.debug(f"Total children: {sum(grid.get('totalChildren', 0) for grid in llm_grid.get('grids', []))}")
+
+
+    payload = {
+        "model": "gpt-4o-mini",  # Faster model for lower latency
+        "messages": [
+            {
+                "role": "system",
+                "content": system_instruction
+            },
+            {
+                "role": "user",
+                "content": content
+            }
+        ],
+        "max_tokens": 512,  # Increased for better analysis
+        "temperature": 0.3,  # Lower for more deterministic results
+        "top_p": 0.9,  # Add top_p for better token selection
+        "frequency_penalty": 0.1,  # Reduce repetition
+        "presence_penalty": 0.1  # Encourage diverse responses
+    }
+    if stream:
+        payload["stream"] = True
+    return payload
+
+# Build strong system prompt with explicit schema and valid IDs to avoid hallucinations
+def get_valid_child_ids(cleaned):
+    ids = []
+    for grid in cleaned.get('grids', []):
+        for child in grid.get('children', []):
+            cid = child.get('id')
+            if cid:
+                ids.append(cid)
+    return ids
+
+def build_prompt_messages(static_prompt: str, variable_prompt: str, cleaned: dict,
+                          wire_format: str = "json") -> tuple[str, str]:
+    """
+    (system, user) message contents. The system message is static per pattern and wire
+    format; lists, search query, valid IDs and the grid all go in the user message.
+    """
+    system_instruction = build_system_instruction(static_prompt, wire_format)
+    ids_section = ""
+    if wire_format != "compact":
+        # Every compact input line already starts with its ID, so they are only listed for JSON
+        ids_section = "VALID_CHILD_IDS:\n" + "\n".join(get_valid_child_ids(cleaned)) + "\n\n"
+    user_content = f"{ids_section}{variable_prompt}\n{serialize_grid(cleaned, wire_format)}"
+    return system_instruction, user_content
+
+@lru_cache(maxsize=256)
+def build_system_instruction(static_prompt: str, wire_format: str = "json") -> str:
+    """Pattern prefix + rules block; identical for every request on a pattern, so built once"""
+    return f"{static_prompt.rstrip()}{build_prompt_rules(wire_format)}"
+
+@lru_cache(maxsize=None)
+def build_prompt_rules(wire_format: str = "json") -> str:
+    if wire_format == "compact":
+        input_format = "\nINPUT FORMAT: one child per line as <child id><TAB><text>; ' | ' separates text lines.\n"
+        id_rule = "- You MUST only return IDs that start an input line. Never invent IDs.\n"
+    else:
+        input_format = ""
+        id_rule = "- You MUST only return IDs from the VALID_CHILD_IDS list below. Never invent IDs.\n"
+
+    # Enhanced prompt with better context and decision reasoning
+    enhanced_rules = (
+        "\n\n🧠 ENHANCED ANALYSIS FRAMEWORK:\n"
+        "1. **Content Analysis Depth:**\n"
+        "   - Primary: Title, description, metadata\n"
+        "   - Secondary: View counts, upload dates, badges\n"
+        "   - Context: Platform indicators, quality signals\n\n"
+        "2. **Semantic Understanding:**\n"
+        "   - Intent Recognition: Educational vs entertainment\n"
+        "   - Context Awareness: Tutorial vs reaction vs compilation\n"
+        "   - Quality Indicators: Clickbait patterns, sensational language\n"
+        "   - Cultural Context: References, memes, trending topics\n\n"
+        "3. **Advanced Pattern Detection:**\n"
+        "   - Obfuscation Detection: Leetspeak, spacing tricks, emoji substitution\n"
+        "   - Multilingual Support: Content in different languages\n"
+        "   - Euphemism Recognition: Indirect references to blacklisted topics\n"
+        "   - Temporal Relevance: Outdated vs evergreen content\n\n"
+        "   - Synonym Awareness: Treat synonyms/paraphrases of blacklist terms as matches\n\n"
+        "4. **DECISION MATRIX:**\n"
+        "   | Whitelist Match | Blacklist Match | Decision | Reasoning |\n"
+        "   |----------------|-----------------|----------|----------|\n"
+        "   | Strong | Any | KEEP | Whitelist priority |\n"
+        "   | Weak | Strong | HIDE | Clear blacklist violation |\n"
+        "   | None | Strong | HIDE | Obvious filtering target |\n"
+        "   | None | Weak | HIDE | Conservative approach |\n"
+        "   | Weak | Weak | HIDE | Default to filtering |\n\n"
+        "5. **QUALITY THRESHOLDS:**\n"
+        "   - High Confidence: >80% semantic match to blacklist\n"
+        "   - Medium Confidence: 50-80% match, consider context\n"
+        "   - Low Confidence: <50% match, prefer keeping unless clear whitelist\n\n"
+        "STRICT OUTPUT RULES:\n"
+        "- Output ONLY a newline-separated list of child IDs to hide (e.g., g1c0, g1c5).\n"
+        "- Do NOT include any explanations, JSON, code fences, or extra text.\n"
+        "- If nothing should be hidden, return an empty string.\n"
+        + id_rule +
+        "- Prefer to hide content matching blacklist terms and unrelated to whitelist intent.\n"
+        "- Consider confidence levels and context when making decisions.\n"
+        + input_format
+    )
+    return enhanced_rules
+
+def sanitize_llm_response(text: str, cleaned: dict) -> str:
+    """Extract only valid child IDs present in the cleaned grid from arbitrary model text."""
+    try:
+        # Collect valid IDs set
+        valid = set()
+        for grid in cleaned.get('grids', []):
+            for child in grid.get('children', []):
+                cid = child.get('id')
+                if cid:
+                    valid.add(cid)
+        # Regex to find tokens like g12c3 etc.
+        ids = re.findall(r"g\d+c\d+", text or "")
+        # Filter to only valid ids and deduplicate preserving order
+        seen = set()
+        filtered = []
+        for cid in ids:
+            if cid in valid and cid not in seen:
+                filtered.append(cid)
+                seen.add(cid)
+        return "\n".join(filtered)
+    except Exception:
+        return ""
+
+# What is left of a "nothing to hide" answer once quotes, brackets and code fences are stripped
+EMPTY_ANSWER_STRIP = " \t\r\n`'\".,:;[]{}()"
+EMPTY_ANSWERS = {"", "json", "none", "null", "nothing"}
+
+def parse_llm_hide_ids(text: str, cleaned: dict) -> Optional[list[str]]:
+    """
+    Hide IDs from a model answer: the valid child IDs it names, [] for an empty answer
+    (nothing to hide), or None when it cannot be parsed (only unknown IDs, or prose).
+    """
+    sanitized = sanitize_llm_response(text, cleaned)
+    if sanitized:
+        return sanitized.split('\n')
+    if re.search(r"g\d+c\d+", text or ""):
+        return None
+    return [] if (text or "").strip(EMPTY_ANSWER_STRIP).lower() in EMPTY_ANSWERS else None
+
+def is_well_formed_llm_response(text: str, cleaned: dict) -> bool:
+    """True unless the answer names a child ID that is not in the grid (an empty answer is fine)"""
+    valid = set(get_valid_child_ids(cleaned))
+    return all(child_id in valid for child_id in re.findall(r"g\d+c\d+", text or ""))
+
+
+class IncrementalIdParser:
+    """
+    Incremental version of sanitize_llm_response for streamed model output.
+
+    Feed it text deltas as they arrive; it returns each valid child ID as soon as the ID is
+    complete (i.e. followed by a non-digit), de-duplicated and in order of appearance.
+    """
+    ID_PATTERN = re.compile(r"g\d+c\d+")
+    PARTIAL_TAIL = re.compile(r"g\d*(c\d*)?$")
+
+    def __init__(self, valid_ids):
+        self.valid = set(valid_ids)
+        self.seen = set()
+        self.buffer = ""
+
+    def _accept(self, child_id: str) -> bool:
+        if child_id in self.valid and child_id not in self.seen:
+            self.seen.add(child_id)
+            return True
+        return False
+
+    def feed(self, text: str) -> list[str]:
+        self.buffer += text or ""
+        found = []
+        consumed = 0
+        for match in self.ID_PATTERN.finditer(self.buffer):
+            if match.end() == len(self.buffer):
+                # More digits may still arrive in the next delta
+                break
+            consumed = match.end()
+            if self._accept(match.group()):
+                found.append(match.group())
+        rest = self.buffer[consumed:]
+        tail = self.PARTIAL_TAIL.search(rest)
+        self.buffer = tail.group() if tail else ""
+        return found
+
+    def flush(self) -> list[str]:
+        found = [cid for cid in self.ID_PATTERN.findall(self.buffer) if self._accept(cid)]
+        self.buffer = ""
+        return found
+
+def estimate_child_tokens(child):
+    """Rough token cost of one child in the LLM payload (~4 chars/token plus JSON overhead)"""
+    return len(child.get('text', '') or '') // 4 + 8
+
+def estimate_grid_tokens(grid_structure):
+    """Rough token cost of a cleaned grid structure's children"""
+    return sum(estimate_child_tokens(child)
+               for grid in grid_structure.get('grids', [])
+               for child in grid.get('children', []))
+
+def split_grid_into_chunks(grid_structure, chunk_size, token_budget=None):
     """
     Split grid structure into chunks for batched API requests
-    Splits by total children count across all grids
+    Splits by total children count across all grids, and by estimated
+    tokens per chunk when a token_budget is given
     """
     # Handle invalid input
     if not grid_structure or not grid_structure.get('grids') or not isinstance(grid_structure.get('grids'), list):
@@ -2094,18 +2769,33 @@ def split_grid_into_chunks(grid_structure, chunk_size):
                 all_children_with_grid_info.append({
                     'child': child,
                     'gridId': grid['id'],
-                    'gridText': grid['gridText']
+                    'gridText': grid.get('gridText', '')
                 })
 
-    # If total children <= chunk size, return original structure
-    if len(all_children_with_grid_info) <= chunk_size:
+    # If total children <= chunk size (and within budget), return original structure
+    if len(all_children_with_grid_info) <= chunk_size and (
+            token_budget is None or estimate_grid_tokens(grid_structure) <= token_budget):
         return [grid_structure]
 
+    # Group children into consecutive runs bounded by count and token budget
+    children_chunks = []
+    current = []
+    current_tokens = 0
+    for item in all_children_with_grid_info:
+        item_tokens = estimate_child_tokens(item['child'])
+        over_budget = token_budget is not None and current and current_tokens + item_tokens > token_budget
+        if len(current) >= chunk_size or over_budget:
+            children_chunks.append(current)
+            current = []
+            current_tokens = 0
+        current.append(item)
+        current_tokens += item_tokens
+    if current:
+        children_chunks.append(current)
+
     # Split children into chunks
     chunks = []
-    for i in range(0, len(all_children_with_grid_info), chunk_size):
-        children_chunk = all_children_with_grid_info[i:i + chunk_size]
-
+    for children_chunk in children_chunks:
         # Group children by their parent grid
         grid_map = {}
         for item in children_chunk:
@@ -2116,6 +2806,8 @@ def split_grid_into_chunks(grid_structure, chunk_size):
                     'children': []
                 }
             grid_map[item['gridId']]['children'].append(item['child'])
+        for chunk_grid in grid_map.values():
+            chunk_grid['totalChildren'] = len(chunk_grid['children'])
 
         # Convert map to array and create chunk with proper structure
         chunk_grids = list(grid_map.values())
@@ -2129,76 +2821,25 @@ def split_grid_into_chunks(grid_structure, chunk_size):
     return chunks
 
 
-def clean_grid_structure_for_llm(grid_structure):
-    """
-    Optimize grid structure for LLM by removing unnecessary data and limiting content
-    """
-    cleaned_structure = {
-        'totalGrids': grid_structure.get('totalGrids', 0),
-        'grids': []
-    }
-
-    if 'grids' in grid_structure:
-        for grid in grid_structure['grids']:
-            # Limit to essential data only
-            cleaned_grid = {
-                'id': grid.get('id'),
-                'totalChildren': grid.get('totalChildren', 0),
-                'children': []
-            }
-            
-            # Add grid text if available (truncated for performance)
-            if 'gridText' in grid:
-                grid_text = grid['gridText']
-                # Truncate grid text to prevent huge payloads
-                if len(grid_text) > 500:
-                    grid_text = grid_text[:500] + "..."
-                cleaned_grid['gridText'] = grid_text
-
-            # Process children with size limits - PRIORITIZE VISIBLE CONTENT
-            if 'children' in grid:
-                children = grid['children']
-                # Limit to only the first 10 children (most visible) for faster processing
-                max_children = 10  # Further reduced for speed
-                if len(children) > max_children:
-                    children = children[:max_children]
-                
-                for child in children:
-                    cleaned_child = {
-                        'id': child.get('id'),
-                        'text': child.get('text', '')
-                    }
-                    # Truncate child text to prevent huge payloads
-                    if len(cleaned_child['text']) > 50:  # Further reduced to 50 chars
-                        cleaned_child['text'] = cleaned_child['text'][:50] + "..."
-                    cleaned_grid['children'].append(cleaned_child)
-
-            cleaned_structure['grids'].append(cleaned_grid)
-
-    return cleaned_structure
-
 def fallback_keyword_matching(cleaned_grid, blacklist):
     """
-    Fallback keyword matching when AI returns empty response
+    Fallback keyword matching when AI returns empty response.
+    blacklist is a list of terms or a filter profile's compiled KeywordMatcher.
     """
-    if not blacklist or not cleaned_grid.get('grids'):
+    matcher = blacklist if isinstance(blacklist, KeywordMatcher) else KeywordMatcher(blacklist)
+    if not matcher or not cleaned_grid.get('grids'):
         return []
     
     result = []
-    blacklist_lower = [keyword.lower() for keyword in blacklist]
-    
     for grid in cleaned_grid.get('grids', []):
         for child in grid.get('children', []):
-            child_text = child.get('text', '').lower()
             child_id = child.get('id')
             
             # Check if any blacklist keyword is in the child text
-            for keyword in blacklist_lower:
-                if keyword in child_text:
-                    # Convert to the format expected by the frontend
-                    grid_id = child_id.split('c')[0] if 'c' in child_id else grid.get('id', 'g1')
-                    result.append({grid_id: [child_id]})
-                    break  # Only add once per child
+            if child_id and matcher.matches(child.get('text', '')):
+                # Convert to the format expected by the frontend
+                grid_id = child_id.split('c')[0] if 'c' in child_id else grid.get('id', 'g1')
+                result.append({grid_id: [child_id]})
     
     return result
 
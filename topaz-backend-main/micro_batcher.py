@@ -0,0 +1,164 @@
+"""
+Cross-request micro-batching of LLM classification calls
+Children from concurrent requests that share a filter profile are collected for a
+few milliseconds and classified in one call, then the verdicts are routed back
+"""
+
+import re
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+_ID_PATTERN = re.compile(r"g\d+c\d+")
+_CHILD_SUFFIX = re.compile(r"c(\d+)$")
+
+
+class _PendingBatch:
+    def __init__(self, context: Any):
+        self.context = context
+        self.items: List[Tuple[Dict, asyncio.Future]] = []
+        self.children = 0
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class MicroBatcher:
+    """
+    dispatch(context, batch_grid) -> raw model text is called once per batch. The batch grid
+    renumbers every (request, grid) pair to its own gN so IDs stay in the gXcY form the prompt
+    and parser expect while remaining unique across requests.
+
+    parse(text, batch_grid) turns the answer into batch IDs to hide, or None when it cannot be
+    parsed; every waiter then gets None instead of an empty "hide nothing" list. Without parse,
+    every batch ID found in the text is hidden.
+    """
+
+    def __init__(self, dispatch: Callable[[Any, Dict], Awaitable[str]],
+                 window_ms: float = 15.0, max_batch_children: int = 60,
+                 parse: Optional[Callable[[str, Dict], Optional[List[str]]]] = None):
+        self.dispatch = dispatch
+        self.parse = parse
+        self.window = window_ms / 1000.0
+        self.max_batch_children = max_batch_children
+        self.pending: Dict[str, _PendingBatch] = {}
+        # Dispatched batches still running; drained on shutdown
+        self.running: Set[asyncio.Task] = set()
+        # Metrics for monitoring
+        self.batches_dispatched = 0
+        self.requests_batched = 0
+        self.children_batched = 0
+        self.batch_failures = 0
+        self.unparseable_batches = 0
+
+    async def submit(self, profile_key: str, llm_grid: Dict, context: Any) -> Optional[List[str]]:
+        """
+        Queue a request's children and wait for its hide IDs (in the request's own ID space),
+        None if the batch answer could not be parsed
+        """
+        child_count = sum(len(grid.get('children', [])) for grid in llm_grid.get('grids', []))
+        batch = self.pending.get(profile_key)
+        if batch is not None and batch.children + child_count > self.max_batch_children:
+            self._flush(profile_key)
+            batch = None
+        if batch is None:
+            batch = _PendingBatch(context)
+            self.pending[profile_key] = batch
+            batch.timer = asyncio.get_running_loop().call_later(self.window, self._flush, profile_key)
+
+        future = asyncio.get_running_loop().create_future()
+        batch.items.append((llm_grid, future))
+        batch.children += child_count
+        if batch.children >= self.max_batch_children:
+            self._flush(profile_key)
+
+        # Each request has its own future: a waiter going away cancels only its own result
+        return await future
+
+    def _flush(self, profile_key: str):
+        batch = self.pending.pop(profile_key, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self.running.add(task)
+        task.add_done_callback(self.running.discard)
+
+    async def drain(self):
+        """Dispatch the pending batches now and wait for every running batch (application shutdown)"""
+        for profile_key in list(self.pending):
+            self._flush(profile_key)
+        while self.running:
+            await asyncio.gather(*list(self.running), return_exceptions=True)
+
+    @staticmethod
+    def build_batch_grid(items: List[Tuple[Dict, asyncio.Future]]) -> Tuple[Dict, Dict[str, Tuple[int, str]]]:
+        """Merge the requests' grids into one grid with namespaced IDs"""
+        id_map: Dict[str, Tuple[int, str]] = {}
+        grids = []
+        next_grid = 1
+        for request_index, (llm_grid, _) in enumerate(items):
+            for grid in llm_grid.get('grids', []):
+                grid_id = f"g{next_grid}"
+                next_grid += 1
+                children = []
+                for position, child in enumerate(grid.get('children', [])):
+                    original_id = child.get('id')
+                    if not original_id:
+                        continue
+                    suffix = _CHILD_SUFFIX.search(original_id)
+                    child_id = f"{grid_id}c{suffix.group(1) if suffix else position}"
+                    id_map[child_id] = (request_index, original_id)
+                    children.append({**child, 'id': child_id})
+                batch_grid = {k: v for k, v in grid.items() if k != 'children'}
+                batch_grid.update({'id': grid_id, 'children': children, 'totalChildren': len(children)})
+                grids.append(batch_grid)
+        return {'totalGrids': len(grids), 'grids': grids}, id_map
+
+    async def _run(self, batch: _PendingBatch):
+        self.batches_dispatched += 1
+        self.requests_batched += len(batch.items)
+        self.children_batched += batch.children
+        batch_grid, id_map = self.build_batch_grid(batch.items)
+        try:
+            text = await self.dispatch(batch.context, batch_grid)
+        except Exception as e:
+            self.batch_failures += 1
+            for _, future in batch.items:
+                # Skip waiters that went away (cancelled) or were already answered
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        hidden = self.parse(text, batch_grid) if self.parse else _ID_PATTERN.findall(text or "")
+        if hidden is None:
+            self.unparseable_batches += 1
+            for _, future in batch.items:
+                if not future.done():
+                    future.set_result(None)
+            return
+
+        per_request: List[List[str]] = [[] for _ in batch.items]
+        seen = set()
+        for batch_id in hidden:
+            if batch_id in id_map and batch_id not in seen:
+                seen.add(batch_id)
+                request_index, original_id = id_map[batch_id]
+                per_request[request_index].append(original_id)
+        for (_, future), hide_ids in zip(batch.items, per_request):
+            if not future.done():
+                future.set_result(hide_ids)
+
+    def get_stats(self) -> Dict[str, Any]:
+        batches = self.batches_dispatched
+        return {
+            'window_ms': round(self.window * 1000, 2),
+            'max_batch_children': self.max_batch_children,
+            'pending_batches': len(self.pending),
+            'running_batches': len(self.running),
+            'batches_dispatched': batches,
+            'requests_batched': self.requests_batched,
+            'children_batched': self.children_batched,
+            'batch_failures': self.batch_failures,
+            'unparseable_batches': self.unparseable_batches,
+            'requests_per_call': round(self.requests_batched / batches, 2) if batches else 0,
+            'children_per_call': round(self.children_batched / batches, 2) if batches else 0,
+        }
@@ -0,0 +1,109 @@
+"""
+Prompt layout for provider-side prompt caching
+Providers cache the longest repeated prefix of a request, so the per-pattern
+instructions go first and anything that changes per request (lists, search query,
+child IDs, grid) goes last
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+PLACEHOLDERS = ("<WHITELIST>", "<BLACKLIST>")
+_PLACEHOLDER_SPLIT = re.compile("(" + "|".join(re.escape(tag) for tag in PLACEHOLDERS) + ")")
+
+
+def split_prompt_template(prompt: str) -> Tuple[str, str]:
+    """
+    Split a pattern prompt into (static prefix, variable template).
+
+    The cut is at the start of the paragraph containing the first list placeholder,
+    so section headers such as "WHITELIST (keep):" stay next to the filled lists.
+    """
+    positions = [prompt.find(tag) for tag in PLACEHOLDERS if tag in prompt]
+    if not positions:
+        return prompt, ""
+    first = min(positions)
+    cut = prompt.rfind("\n\n", 0, first)
+    cut = 0 if cut == -1 else cut + 2
+    return prompt[:cut], prompt[cut:]
+
+
+def render_list(tag: str, items: Optional[List[str]]) -> str:
+    """What a placeholder becomes: the tag followed by one "- item" line per item, or nothing"""
+    if not items:
+        return ""
+    return tag + "\n" + "\n".join("- %s" % item for item in items)
+
+
+class PromptTemplate:
+    """
+    A pattern prompt split once at load: the static prefix, and the variable part (and the
+    whole prompt) as immutable segments alternating literal text and placeholder tags,
+    so rendering is a single join
+    """
+    __slots__ = ('static', 'variable_segments', 'segments')
+
+    def __init__(self, prompt: str):
+        static, variable = split_prompt_template(prompt)
+        self.static = static
+        self.variable_segments = tuple(_PLACEHOLDER_SPLIT.split(variable))
+        self.segments = tuple(_PLACEHOLDER_SPLIT.split(prompt))
+
+    @staticmethod
+    def _join(segments: Tuple[str, ...], whitelist: Optional[List[str]], blacklist: Optional[List[str]]) -> str:
+        if len(segments) == 1:
+            return segments[0]
+        lists = {"<WHITELIST>": render_list("<WHITELIST>", whitelist),
+                 "<BLACKLIST>": render_list("<BLACKLIST>", blacklist)}
+        parts = list(segments)
+        # Odd positions hold the placeholder tags captured by the split
+        for index in range(1, len(parts), 2):
+            parts[index] = lists[parts[index]]
+        return "".join(parts)
+
+    def render(self, whitelist: Optional[List[str]] = None, blacklist: Optional[List[str]] = None) -> str:
+        """The whole prompt with its lists filled in"""
+        return self._join(self.segments, whitelist, blacklist)
+
+    def render_variable(self, whitelist: Optional[List[str]] = None, blacklist: Optional[List[str]] = None) -> str:
+        """The per-request part of the prompt with its lists filled in"""
+        return self._join(self.variable_segments, whitelist, blacklist)
+
+
+def compile_prompt_templates(prompts: Dict[str, Dict[str, Any]]) -> Dict[str, PromptTemplate]:
+    """pattern -> PromptTemplate for every entry of prompts_simplified.json"""
+    return {pattern: PromptTemplate(entry["prompt"]) for pattern, entry in prompts.items()}
+
+
+class PromptCacheStats:
+    """Prompt tokens vs. provider-cached prompt tokens, per prompt pattern"""
+
+    def __init__(self):
+        self.patterns: Dict[str, Dict[str, int]] = {}
+
+    def record(self, pattern: str, usage: Optional[Dict[str, Any]]):
+        if not usage:
+            return
+        prompt_tokens = usage.get('prompt_tokens') or 0
+        cached_tokens = (usage.get('prompt_tokens_details') or {}).get('cached_tokens') or 0
+        stats = self.patterns.setdefault(pattern, {
+            'requests': 0,
+            'cache_hits': 0,
+            'prompt_tokens': 0,
+            'cached_tokens': 0,
+        })
+        stats['requests'] += 1
+        stats['prompt_tokens'] += prompt_tokens
+        stats['cached_tokens'] += cached_tokens
+        if cached_tokens:
+            stats['cache_hits'] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        result = {}
+        for pattern, stats in self.patterns.items():
+            result[pattern] = {
+                **stats,
+                'hit_rate_percent': round(stats['cache_hits'] / stats['requests'] * 100, 2) if stats['requests'] else 0,
+                'cached_token_percent': round(stats['cached_tokens'] / stats['prompt_tokens'] * 100, 2) if stats['prompt_tokens'] else 0,
+            }
+        return result
@@ -0,0 +1,165 @@
+"""
+Hot-reloadable prompt registry
+The prompt file is read, validated and compiled (router + templates) off the request path,
+then swapped in as one immutable PromptSet. The patterns whose matched URLs or prompt
+entry changed are handed to a callback so dependent caches can be invalidated selectively.
+"""
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import inspect
+import logging
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from prompt_layout import PromptTemplate, compile_prompt_templates
+from prompt_router import DEFAULT_PATTERN, PromptRouter
+
+logger = logging.getLogger(__name__)
+
+
+def entry_revision(entry: Dict[str, Any]) -> str:
+    """Short content hash of one prompt entry (prompt text and per-pattern settings)"""
+    encoded = json.dumps(entry, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.blake2b(encoded, digest_size=6).hexdigest()
+
+
+def validate_prompts(data: Any):
+    """Raise ValueError unless data is a non-empty {pattern: {"prompt": str, ...}} mapping"""
+    if not isinstance(data, dict) or not data:
+        raise ValueError("prompt file must be a non-empty JSON object")
+    for pattern, entry in data.items():
+        if not isinstance(entry, dict) or not isinstance(entry.get("prompt"), str) or not entry["prompt"].strip():
+            raise ValueError(f"pattern {pattern!r} needs a non-empty \"prompt\" string")
+
+
+class PromptSet:
+    """One immutable generation of prompts: raw entries, compiled router and templates"""
+    __slots__ = ('data', 'router', 'templates', 'revisions', 'version', 'loaded_at')
+
+    def __init__(self, data: Dict[str, Dict[str, Any]], memo_size: int = 4096):
+        self.data = data
+        # Compiling every pattern here doubles as regex validation
+        self.router = PromptRouter(data, memo_size=memo_size)
+        self.templates: Dict[str, PromptTemplate] = compile_prompt_templates(data)
+        self.revisions: Dict[str, str] = {pattern: entry_revision(entry) for pattern, entry in data.items()}
+        self.version = hashlib.blake2b(
+            json.dumps(list(self.revisions.items())).encode('utf-8'), digest_size=6
+        ).hexdigest() if data else "empty"
+        self.loaded_at = time.time()
+
+
+def affected_patterns(old: PromptSet, new: PromptSet) -> Set[str]:
+    """
+    Patterns whose prompt or matched URLs may differ between two sets: changed or removed
+    entries, and any pattern preceded by a different set of patterns (first match wins, so
+    an added, removed or moved pattern can take URLs from the ones after it). The default
+    route is affected whenever the pattern list itself changes.
+    """
+    affected = {pattern for pattern in old.data if pattern not in new.data}
+    old_order = list(old.data)
+    new_order = list(new.data)
+    for index, pattern in enumerate(new_order):
+        if old.revisions.get(pattern) != new.revisions[pattern]:
+            affected.add(pattern)
+            continue
+        old_index = old_order.index(pattern)
+        if set(old_order[:old_index]) != set(new_order[:index]):
+            affected.add(pattern)
+    if old_order != new_order:
+        affected.add(DEFAULT_PATTERN)
+    return affected
+
+
+class PromptRegistry:
+    def __init__(self, path: str, memo_size: int = 4096,
+                 on_change: Optional[Callable[[Set[str]], Any]] = None):
+        self.path = path
+        self.memo_size = memo_size
+        self.on_change = on_change
+        self.current = PromptSet({}, memo_size=memo_size)
+        self._mtime: Optional[float] = None
+        self._lock = asyncio.Lock()
+        # Metrics for monitoring
+        self.reloads = 0
+        self.reload_errors = 0
+        self.last_error: Optional[str] = None
+        self.last_affected: List[str] = []
+
+    def _stat(self) -> Optional[float]:
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def _build(self) -> PromptSet:
+        """Read, validate and compile the prompt file (blocking)"""
+        # Recorded before parsing so the watcher does not retry a rejected file until it changes again
+        self._mtime = self._stat()
+        with open(self.path, 'r') as f:
+            data = json.load(f)
+        validate_prompts(data)
+        return PromptSet(data, memo_size=self.memo_size)
+
+    def load(self):
+        """Initial synchronous load; an unreadable file leaves an empty prompt set"""
+        try:
+            self.current = self._build()
+            logger.info(f"Prompts loaded successfully ({len(self.current.data)} patterns, version {self.current.version})")
+        except FileNotFoundError:
+            logger.error(f"Prompts file not found at {self.path}")
+        except Exception as e:
+            logger.error(f"Error loading prompts: {e}")
+
+    async def reload(self) -> Dict[str, Any]:
+        """
+        Compile the file in a worker thread and swap it in if it differs from the current set.
+        An invalid file is rejected and the current prompts stay in service.
+        """
+        async with self._lock:
+            try:
+                new_set = await asyncio.to_thread(self._build)
+            except Exception as e:
+                self.reload_errors += 1
+                self.last_error = str(e)
+                logger.error(f"Prompt reload rejected, keeping version {self.current.version}: {e}")
+                return {'reloaded': False, 'version': self.current.version, 'error': str(e)}
+
+            old_set = self.current
+            if new_set.version == old_set.version:
+                return {'reloaded': False, 'version': old_set.version, 'affected_patterns': []}
+
+            affected = affected_patterns(old_set, new_set)
+            self.current = new_set
+            self.reloads += 1
+            self.last_error = None
+            self.last_affected = sorted(affected)
+            logger.info(f"Prompts reloaded: version {old_set.version} -> {new_set.version}, "
+                        f"{len(affected)} affected patterns")
+            invalidated = self.on_change(affected) if self.on_change and affected else None
+            if inspect.isawaitable(invalidated):
+                invalidated = await invalidated
+            return {'reloaded': True, 'version': new_set.version, 'previous_version': old_set.version,
+                    'affected_patterns': self.last_affected, 'invalidated': invalidated}
+
+    async def watch(self, interval: float):
+        """Poll the file's mtime every interval seconds and reload when it changes, until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            mtime = self._stat()
+            if mtime is not None and mtime != self._mtime:
+                await self.reload()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'path': self.path,
+            'version': self.current.version,
+            'patterns': len(self.current.data),
+            'loaded_at': self.current.loaded_at,
+            'reloads': self.reloads,
+            'reload_errors': self.reload_errors,
+            'last_error': self.last_error,
+            'last_affected_patterns': self.last_affected,
+        }
@@ -0,0 +1,145 @@
+"""
+URL router for prompt selection
+The prompts_simplified.json patterns are compiled once and indexed by the hostname they
+are written for, so a URL is only tested against its own site's patterns (plus any pattern
+whose host could not be read off the regex). URLs are routed by what the patterns read
+(scheme, host, path and the query parameters they name), which is also the LRU memo key,
+so tracking parameters and fragments do not fill the memo. As a consequence a pattern
+anchored with $ also matches its URL with extra parameters or a fragment, and a lookalike
+host such as x.com.evil.com is not routed to another site's pattern.
+"""
+
+import re
+from collections import OrderedDict, namedtuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+DEFAULT_PATTERN = "default"
+
+# Route for one URL: the first matching prompt pattern and the search query, if any
+Route = namedtuple('Route', ['pattern', 'search_query'])
+
+# Leading "^(https?://)?(www\.)?" followed by a literal host or a group of literal hosts
+_HOST_PREFIX = re.compile(
+    r'^\^(?:\(https\?://\)\?|https\?://)(?:\(www\\\.\)\?)?'
+    r'(?:\((?P<alts>[a-z0-9.\\|-]+)\)|(?P<host>(?:[a-z0-9-]+\\\.)+[a-z]{2,}))'
+)
+_LITERAL_HOST = re.compile(r'^(?:[a-z0-9-]+\\\.)+[a-z]{2,}$')
+# "name=" inside a pattern: a query parameter the pattern reads
+_QUERY_PARAM = re.compile(r'([A-Za-z0-9_.-]+)=')
+
+# Search result pages: host -> (path, query parameter holding the user's search)
+SEARCH_QUERY_PARAMS: Dict[str, Tuple[str, str]] = {
+    'youtube.com': ('/results', 'search_query'),
+}
+
+
+def pattern_hosts(pattern: str) -> Optional[List[str]]:
+    """Hostnames (without www.) a pattern is written for, or None if it is not host-specific"""
+    match = _HOST_PREFIX.match(pattern)
+    if not match:
+        return None
+    literals = match.group('alts').split('|') if match.group('alts') else [match.group('host')]
+    if not all(_LITERAL_HOST.match(literal) for literal in literals):
+        return None
+    return [literal.replace('\\.', '.') for literal in literals]
+
+
+def pattern_query_params(pattern: str) -> List[str]:
+    """Query parameter names a pattern tests for (written as name=)"""
+    return _QUERY_PARAM.findall(pattern)
+
+
+def normalize_host(host: Optional[str]) -> str:
+    host = (host or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+class PromptRouter:
+    def __init__(self, patterns: Iterable[str], memo_size: int = 4096):
+        self.memo_size = memo_size
+        self.memo: "OrderedDict[str, Route]" = OrderedDict()
+        # (order, pattern, compiled) - order keeps prompts_simplified.json's first-match semantics
+        self.compiled: List[Tuple[int, str, re.Pattern]] = [
+            (order, pattern, re.compile(pattern)) for order, pattern in enumerate(patterns)
+        ]
+        self.wildcard: List[Tuple[int, str, re.Pattern]] = []
+        by_host: Dict[str, List[Tuple[int, str, re.Pattern]]] = {}
+        for entry in self.compiled:
+            hosts = pattern_hosts(entry[1])
+            if hosts is None:
+                self.wildcard.append(entry)
+                continue
+            for host in hosts:
+                by_host.setdefault(host, []).append(entry)
+        # Host-specific candidates merged with the wildcard patterns, still in file order
+        self.by_host: Dict[str, List[Tuple[int, str, re.Pattern]]] = {
+            host: sorted(entries + self.wildcard, key=lambda entry: entry[0])
+            for host, entries in by_host.items()
+        }
+        # Query parameters routing depends on; every other parameter is dropped before matching
+        self.query_params = frozenset(
+            [name for _, pattern, _ in self.compiled for name in pattern_query_params(pattern)]
+            + [param for _, param in SEARCH_QUERY_PARAMS.values()]
+        )
+        # Metrics for monitoring
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.regex_evaluations = 0
+
+    def routing_url(self, url: str) -> str:
+        """The URL reduced to what routing reads: scheme, host, path and the query parameters patterns name"""
+        parts = urlsplit(url if '://' in url else f'//{url}')
+        query = '&'.join(pair for pair in parts.query.split('&')
+                         if pair.split('=', 1)[0] in self.query_params) if parts.query else ''
+        scheme = f'{parts.scheme}://' if parts.scheme else ''
+        return f"{scheme}{parts.netloc}{parts.path}{'?' + query if query else ''}"
+
+    def route(self, url: str) -> Route:
+        """First matching pattern (DEFAULT_PATTERN if none) and search query for a URL"""
+        key = self.routing_url(url)
+        route = self.memo.get(key)
+        if route is not None:
+            self.memo.move_to_end(key)
+            self.hits += 1
+            return route
+        self.misses += 1
+        route = self._resolve(key)
+        self.memo[key] = route
+        if len(self.memo) > self.memo_size:
+            self.memo.popitem(last=False)
+            self.evictions += 1
+        return route
+
+    def _resolve(self, url: str) -> Route:
+        """Route for a URL already reduced by routing_url"""
+        parts = urlsplit(url if '://' in url else f'//{url}')
+        host = normalize_host(parts.hostname)
+        pattern = DEFAULT_PATTERN
+        for _, candidate, compiled in self.by_host.get(host, self.wildcard):
+            self.regex_evaluations += 1
+            if compiled.match(url):
+                pattern = candidate
+                break
+        search_query = None
+        search = SEARCH_QUERY_PARAMS.get(host)
+        if search and parts.path == search[0] and parts.query:
+            search_query = parse_qs(parts.query).get(search[1], [None])[0]
+        return Route(pattern, search_query)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'patterns': len(self.compiled),
+            'hosts': len(self.by_host),
+            'wildcard_patterns': len(self.wildcard),
+            'query_params': sorted(self.query_params),
+            'memo_entries': len(self.memo),
+            'memo_size': self.memo_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate_percent': round(self.hits / lookups * 100, 2) if lookups else 0,
+            'evictions': self.evictions,
+            'regex_evaluations': self.regex_evaluations,
+        }
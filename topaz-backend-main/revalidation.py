@@ -0,0 +1,71 @@
+"""
+Background revalidation for stale-while-revalidate
+A stale cache hit is answered immediately and schedules one refresh per key; refreshes
+share a global concurrency budget and are dropped (not queued) when it is spent, so a
+burst of stale hits can never pile work up in front of interactive requests
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class Revalidator:
+    def __init__(self, max_concurrency: int = 2):
+        self.max_concurrency = max_concurrency
+        self.in_flight: Dict[str, asyncio.Task] = {}
+        # Metrics for monitoring
+        self.scheduled = 0
+        self.deduplicated = 0
+        self.over_budget = 0
+        self.completed = 0
+        self.failed = 0
+
+    def schedule(self, key: str, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> bool:
+        """
+        Start func(*args, **kwargs) in the background unless key is already refreshing or
+        the budget is spent. Returns True if a refresh was started.
+        """
+        if key in self.in_flight:
+            self.deduplicated += 1
+            return False
+        if len(self.in_flight) >= self.max_concurrency:
+            self.over_budget += 1
+            return False
+        self.scheduled += 1
+        task = asyncio.create_task(func(*args, **kwargs))
+        self.in_flight[key] = task
+        task.add_done_callback(lambda t, k=key: self._on_done(k, t))
+        return True
+
+    def _on_done(self, key: str, task: asyncio.Task):
+        if self.in_flight.get(key) is task:
+            del self.in_flight[key]
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            self.failed += 1
+            logger.warning(f"Background refresh failed for {key[:8]}...: {error!r}")
+        else:
+            self.completed += 1
+
+    async def shutdown(self):
+        """Cancel refreshes still running (application shutdown)"""
+        tasks = list(self.in_flight.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'in_flight': len(self.in_flight),
+            'max_concurrency': self.max_concurrency,
+            'scheduled': self.scheduled,
+            'deduplicated': self.deduplicated,
+            'over_budget': self.over_budget,
+            'completed': self.completed,
+            'failed': self.failed,
+        }
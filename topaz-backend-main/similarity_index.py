@@ -0,0 +1,228 @@
+"""
+Similar-child index for the AI failure path
+MinHash signatures over character shingles of each child's normalized text, bucketed
+with LSH bands per filter profile. Model verdicts are added as they are produced, so
+when the provider is unreachable each child of the current request can borrow the
+verdict of its nearest previously classified neighbour.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from cache_keys import hash_child_text, normalize_child_text
+
+_HASH_MASK = (1 << 64) - 1
+_EMPTY_BIN = 1 << 64
+
+
+def _shingle_hashes(text: str, size: int) -> List[int]:
+    """
+    64-bit hashes of the distinct character shingles of a normalized text.
+    Uses the interpreter's string hash (SipHash): fast, but seeded per process, so
+    signatures are only comparable within one worker - which is all the index needs.
+    """
+    if len(text) <= size:
+        shingles = {text}
+    else:
+        shingles = {text[i:i + size] for i in range(len(text) - size + 1)}
+    return [hash(s) & _HASH_MASK for s in shingles]
+
+
+class SimilarRecord:
+    __slots__ = ('signature', 'hide', 'stored_at')
+
+    def __init__(self, signature: Tuple[int, ...], hide: bool, stored_at: float):
+        self.signature = signature
+        self.hide = hide
+        self.stored_at = stored_at
+
+
+class SimilarityIndex:
+    """
+    MinHash/LSH index of (child text, filter profile) -> hide verdict.
+
+    Signatures use one-permutation hashing: each shingle is hashed once and the hash
+    picks one of num_perm bins, keeping the minimum per bin; empty bins borrow from the
+    next non-empty bin (rotation densification), so a signature costs one hash per
+    shingle instead of num_perm.
+
+    num_perm = bands * rows; two texts share a bucket with high probability once their
+    shingle Jaccard similarity is above roughly (1 / bands) ** (1 / rows), and candidates
+    are then accepted only if their estimated similarity reaches threshold (only the
+    max_candidates sharing the most bands are scored). Records are
+    kept in LRU order and capped at max_entries.
+    """
+
+    def __init__(self, max_entries: int = 20000, bands: int = 8, rows: int = 4,
+                 threshold: float = 0.6, shingle_size: int = 4, max_candidates: int = 16):
+        self.max_entries = max_entries
+        self.bands = bands
+        self.rows = rows
+        self.num_perm = bands * rows
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.max_candidates = max_candidates
+        self.records: "OrderedDict[Tuple[str, str], SimilarRecord]" = OrderedDict()
+        self.buckets: Dict[Tuple[str, int, Tuple[int, ...]], set] = {}
+        # Metrics for monitoring
+        self.adds = 0
+        self.evictions = 0
+        self.lookups = 0
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.lookup_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def signature(self, text: str) -> Tuple[int, ...]:
+        k = self.num_perm
+        bins = [_EMPTY_BIN] * k
+        for h in _shingle_hashes(normalize_child_text(text), self.shingle_size):
+            index, value = h % k, h // k
+            if value < bins[index]:
+                bins[index] = value
+        # Densify: an empty bin takes the next non-empty bin's value, offset by the distance
+        # so two texts only agree on it when they agree on the source bin
+        signature = list(bins)
+        for index in range(k):
+            if bins[index] == _EMPTY_BIN:
+                for distance in range(1, k):
+                    source = bins[(index + distance) % k]
+                    if source != _EMPTY_BIN:
+                        signature[index] = source + distance * _EMPTY_BIN
+                        break
+        return tuple(signature)
+
+    def _band_keys(self, profile_key: str, signature: Tuple[int, ...]):
+        rows = self.rows
+        for band in range(self.bands):
+            yield (profile_key, band, signature[band * rows:(band + 1) * rows])
+
+    def _similarity(self, sig1: Tuple[int, ...], sig2: Tuple[int, ...]) -> float:
+        return sum(1 for x, y in zip(sig1, sig2) if x == y) / self.num_perm
+
+    def add(self, text: str, profile_key: str, hide: bool, text_hash: Optional[str] = None):
+        key = (text_hash or hash_child_text(text), profile_key)
+        record = self.records.get(key)
+        if record is not None:
+            record.hide = hide
+            record.stored_at = time.time()
+            self.records.move_to_end(key)
+            return
+        record = SimilarRecord(self.signature(text), hide, time.time())
+        self.records[key] = record
+        for band_key in self._band_keys(profile_key, record.signature):
+            self.buckets.setdefault(band_key, set()).add(key)
+        self.adds += 1
+        while len(self.records) > self.max_entries:
+            self._evict_oldest()
+
+    def _evict_oldest(self):
+        key, record = self.records.popitem(last=False)
+        for band_key in self._band_keys(key[1], record.signature):
+            bucket = self.buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[band_key]
+        self.evictions += 1
+
+    def invalidate_profile(self, profile_key: str) -> int:
+        """Drop every record indexed under a filter profile"""
+        keys = [key for key in self.records if key[1] == profile_key]
+        for key in keys:
+            record = self.records.pop(key)
+            for band_key in self._band_keys(profile_key, record.signature):
+                bucket = self.buckets.get(band_key)
+                if bucket is not None:
+                    bucket.discard(key)
+                    if not bucket:
+                        del self.buckets[band_key]
+        return len(keys)
+
+    def nearest(self, text: str, profile_key: str,
+                text_hash: Optional[str] = None) -> Optional[Tuple[bool, float]]:
+        """(hide verdict, estimated similarity) of the closest indexed child, or None below threshold"""
+        record = self.records.get((text_hash or hash_child_text(text), profile_key))
+        if record is not None:
+            self.exact_hits += 1
+            return record.hide, 1.0
+
+        signature = self.signature(text)
+        band_matches: Dict[Tuple[str, str], int] = {}
+        for band_key in self._band_keys(profile_key, signature):
+            for key in self.buckets.get(band_key, ()):
+                band_matches[key] = band_matches.get(key, 0) + 1
+        # Only score the candidates sharing the most bands (near-duplicates pile into the same buckets)
+        candidates = sorted(band_matches, key=band_matches.get, reverse=True)[:self.max_candidates]
+
+        best: Optional[Tuple[bool, float]] = None
+        for key in candidates:
+            similarity = self._similarity(signature, self.records[key].signature)
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (self.records[key].hide, similarity)
+        if best is None:
+            self.misses += 1
+        else:
+            self.similar_hits += 1
+        return best
+
+    def add_grid(self, cleaned_grid: Dict, hide_ids: List[str], profile_key: str,
+                 text_hashes: Optional[Dict[str, str]] = None):
+        """Index a verdict for every child the model was shown"""
+        hide_set = set(hide_ids)
+        text_hashes = text_hashes or {}
+        for grid in cleaned_grid.get('grids', []):
+            for child in grid.get('children', []):
+                child_id = child.get('id')
+                if child_id:
+                    self.add(child.get('text', ''), profile_key, child_id in hide_set,
+                             text_hash=text_hashes.get(child_id))
+
+    def lookup_grid(self, cleaned_grid: Dict, profile_key: str,
+                    text_hashes: Optional[Dict[str, str]] = None) -> Tuple[List[str], int, int]:
+        """
+        Borrow verdicts for the current request's children from their nearest neighbours.
+
+        Returns (hide IDs in grid order, children with a neighbour, children looked up)
+        """
+        start = time.perf_counter()
+        text_hashes = text_hashes or {}
+        hide_ids = []
+        matched = 0
+        total = 0
+        for grid in cleaned_grid.get('grids', []):
+            for child in grid.get('children', []):
+                child_id = child.get('id')
+                if not child_id:
+                    continue
+                total += 1
+                found = self.nearest(child.get('text', ''), profile_key, text_hash=text_hashes.get(child_id))
+                if found is None:
+                    continue
+                matched += 1
+                if found[0]:
+                    hide_ids.append(child_id)
+        self.lookups += 1
+        self.lookup_seconds += time.perf_counter() - start
+        return hide_ids, matched, total
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'entries': len(self.records),
+            'max_entries': self.max_entries,
+            'buckets': len(self.buckets),
+            'bands': self.bands,
+            'rows': self.rows,
+            'threshold': self.threshold,
+            'adds': self.adds,
+            'evictions': self.evictions,
+            'lookups': self.lookups,
+            'exact_hits': self.exact_hits,
+            'similar_hits': self.similar_hits,
+            'misses': self.misses,
+            'avg_lookup_ms': round(self.lookup_seconds / self.lookups * 1000, 3) if self.lookups else 0,
+        }
@@ -0,0 +1,66 @@
+"""
+Singleflight coalescing of identical in-flight work
+The first caller for a key starts the work; concurrent callers with the same key
+await the same task instead of repeating it
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class Singleflight:
+    def __init__(self):
+        self.in_flight: Dict[str, asyncio.Task] = {}
+        # Metrics for monitoring
+        self.leaders = 0
+        self.collapsed = 0
+        self.errors = 0
+        self.abandoned_waiters = 0
+
+    async def do(self, key: str, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        Run func(*args, **kwargs) once per key at a time and share its result.
+
+        The work runs in its own task and every caller (leader included) awaits it
+        through asyncio.shield, so a cancelled/disconnected caller only stops waiting;
+        the work keeps running for the remaining followers.
+        """
+        task = self.in_flight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.create_task(func(*args, **kwargs))
+            self.in_flight[key] = task
+            task.add_done_callback(lambda t, k=key: self._on_done(k, t))
+        else:
+            self.collapsed += 1
+
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done():
+                self.abandoned_waiters += 1
+            raise
+
+    async def shutdown(self):
+        """Cancel the work still in flight, which waiters cannot cancel (application shutdown)"""
+        tasks = list(self.in_flight.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _on_done(self, key: str, task: asyncio.Task):
+        if self.in_flight.get(key) is task:
+            del self.in_flight[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.leaders + self.collapsed
+        return {
+            'in_flight': len(self.in_flight),
+            'leaders': self.leaders,
+            'collapsed_calls': self.collapsed,
+            'collapse_rate_percent': round(self.collapsed / total * 100, 2) if total else 0,
+            'errors': self.errors,
+            'abandoned_waiters': self.abandoned_waiters,
+        }
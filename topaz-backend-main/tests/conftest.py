@@ -0,0 +1,14 @@
+import os
+import sys
+
+# main reads its configuration at import time: no network, no shared cache, no snapshots
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("LLM_POOL_WARM_UP", "false")
+os.environ.setdefault("RESPONSE_CACHE_BACKEND", "memory")
+os.environ.setdefault("CACHE_SNAPSHOT_PATH", "")
+os.environ.setdefault("PROMPTS_WATCH_INTERVAL", "0")
+os.environ.setdefault("ADMIN_API_KEY", "test-admin-key")
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
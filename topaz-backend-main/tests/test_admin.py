@@ -0,0 +1,26 @@
+from fastapi.testclient import TestClient
+
+import main
+
+ADMIN = {"X-Admin-Key": "test-admin-key"}
+
+
+def test_health_is_a_liveness_check_without_internals():
+    response = TestClient(main.app).get("/health")
+
+    body = response.json()
+    assert set(body) == {"status", "timestamp", "correlation_id", "services", "circuit_breakers"}
+    assert set(body["circuit_breakers"]) == {"openai"}
+
+
+def test_admin_stats_requires_the_admin_key():
+    client = TestClient(main.app)
+
+    assert client.get("/admin/stats").status_code == 401
+    assert client.get("/admin/stats", headers={"X-Admin-Key": "wrong"}).status_code == 401
+
+    response = client.get("/admin/stats", headers=ADMIN)
+    assert response.status_code == 200
+    body = response.json()
+    for section in ("circuit_breakers", "llm_providers", "response_cache", "prompts", "micro_batching"):
+        assert section in body
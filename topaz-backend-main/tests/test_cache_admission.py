@@ -0,0 +1,44 @@
+import random
+
+from cache_admission import TinyLFUAdmission
+from cache_engine import ResponseCache
+
+
+def full_cache(admission, size=4):
+    cache = ResponseCache(max_entries=size, admission=admission)
+    for i in range(size):
+        cache.get(f"old{i}")
+        cache.put(f"old{i}", i)
+    return cache
+
+
+def test_more_frequent_candidate_is_always_admitted():
+    admission = TinyLFUAdmission(capacity=4, tie_probability=0.0)
+    for _ in range(3):
+        admission.record("hot")
+    admission.record("cold")
+
+    assert admission.admit("hot", "cold")
+    assert not admission.admit("cold", "hot")
+
+
+def test_first_seen_key_can_enter_a_full_cache_on_a_tie():
+    admission = TinyLFUAdmission(capacity=4, rng=random.Random(1))
+    cache = full_cache(admission)
+
+    admitted = 0
+    for i in range(50):
+        cache.get(f"new{i}")
+        admitted += cache.put(f"new{i}", i) is not None
+
+    assert 0 < admitted < 50
+    assert admission.tie_admissions > 0
+
+
+def test_ties_are_rejected_without_tie_probability():
+    admission = TinyLFUAdmission(capacity=4, tie_probability=0.0)
+    cache = full_cache(admission)
+
+    cache.get("new")
+    assert cache.put("new", 1) is None
+    assert admission.rejected == 1
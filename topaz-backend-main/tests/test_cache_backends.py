@@ -0,0 +1,74 @@
+import sqlite3
+import threading
+
+import pytest
+
+from cache_backends import SQLiteCacheBackend, TieredCache
+from cache_engine import ResponseCache
+
+
+@pytest.fixture
+def sqlite_store(tmp_path):
+    return TieredCache(ResponseCache(), SQLiteCacheBackend(str(tmp_path / "cache.sqlite3")), l1_ttl=60)
+
+
+@pytest.mark.asyncio
+async def test_backend_calls_run_off_the_event_loop(sqlite_store):
+    loop_thread = threading.get_ident()
+    backend_threads = []
+    backend_get = sqlite_store.backend.get
+
+    def recording_get(key):
+        backend_threads.append(threading.get_ident())
+        return backend_get(key)
+
+    sqlite_store.backend.get = recording_get
+    await sqlite_store.aput("k1", [{"g1": ["g1c0"]}], ttl=60, pattern="youtube", profile="p1")
+    sqlite_store.l1.clear()
+
+    cached = await sqlite_store.alookup("k1")
+    assert cached.value == [{"g1": ["g1c0"]}]
+    assert cached.metadata["pattern"] == "youtube"
+    assert backend_threads and loop_thread not in backend_threads
+
+
+@pytest.mark.asyncio
+async def test_invalidation_by_indexed_columns(sqlite_store):
+    await sqlite_store.aput("k1", [], ttl=60, pattern="youtube", profile="p1")
+    await sqlite_store.aput("k2", [], ttl=60, pattern="youtube", profile="p2")
+    await sqlite_store.aput("k3", [], ttl=60, pattern="reddit", profile="p1")
+
+    assert await sqlite_store.adelete_matching({"pattern": "youtube", "profile": "p1"}) == 1
+    assert await sqlite_store.adelete_matching({"profile": "p1"}) == 1
+    assert sqlite_store.backend.get("k2") is not None
+    assert sqlite_store.backend.get("k1") is None and sqlite_store.backend.get("k3") is None
+
+
+def test_old_schema_is_migrated(tmp_path):
+    path = str(tmp_path / "old.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE response_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                 " stored_at REAL NOT NULL, expires_at REAL NOT NULL, metadata TEXT)")
+    conn.execute("INSERT INTO response_cache VALUES ('old', '[]', 0, 9e99, '{\"pattern\": \"youtube\"}')")
+    conn.commit()
+    conn.close()
+
+    backend = SQLiteCacheBackend(path)
+    assert backend.get("old") is None
+    backend.put("new", [], expires_at=9e99, metadata={"pattern": "youtube"})
+    assert backend.delete_matching({"pattern": "youtube"}) == 1
+
+
+def test_sqlite_file_is_opened_per_process_on_first_use(tmp_path, monkeypatch):
+    path = tmp_path / "lazy.sqlite3"
+    backend = SQLiteCacheBackend(str(path))
+    assert not path.exists()
+
+    backend.put("k1", [], expires_at=9e99)
+    parent_conn = backend.conn
+    assert path.exists()
+
+    # A forked worker sees a different pid and opens its own connection to the same file
+    monkeypatch.setattr("cache_backends.os.getpid", lambda: -1)
+    assert backend.get("k1") is not None
+    assert backend.conn is not parent_conn
@@ -0,0 +1,32 @@
+import pytest
+
+from cache_keys import build_response_cache_key, hash_child_text, hash_grid_children, normalize_child_text
+
+
+def key_for(*texts):
+    grid = {"grids": [{"id": "g1", "children": [{"id": f"g1c{i}", "text": t} for i, t in enumerate(texts)]}]}
+    return build_response_cache_key("https://www.youtube.com/", [], ["drama"], hash_grid_children(grid))
+
+
+def test_key_is_stable_when_only_the_view_count_changes():
+    before = key_for("Building a treehouse in one weekend 1.2M views 3 days ago 12:07", "Cats")
+    after = key_for("Building a treehouse in one weekend 1.3M views 4 days ago 12:07", "Cats")
+    assert before == after
+
+
+def test_key_changes_with_the_title():
+    assert key_for("Building a treehouse 1.2M views") != key_for("Building a doghouse 1.2M views")
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("  Big   NEWS today ", "big news today"),
+    ("Review 3,401 likes 57 comments", "review"),
+    ("Streamed 5 hours ago", "streamed"),
+    ("Top 10 gadgets of 2024", "top 10 gadgets of 2024"),
+])
+def test_normalize_child_text(text, expected):
+    assert normalize_child_text(text) == expected
+
+
+def test_hash_ignores_case_and_whitespace():
+    assert hash_child_text("Hello  World") == hash_child_text("hello world")
@@ -0,0 +1,66 @@
+import pytest
+
+from cache_backends import TieredCache
+from cache_engine import ResponseCache
+from cache_keys import build_response_cache_key
+from cache_snapshot import CacheSnapshotter
+
+
+def test_prompt_revision_changes_the_response_key():
+    args = ("https://www.youtube.com/", ["music"], ["drama"], {"g1c0": "abc"})
+    assert build_response_cache_key(*args) != build_response_cache_key(*args, prompt_revision="r1")
+    assert (build_response_cache_key(*args, prompt_revision="r1")
+            != build_response_cache_key(*args, prompt_revision="r2"))
+
+
+@pytest.mark.asyncio
+async def test_restore_skips_entries_from_an_outdated_prompt(tmp_path):
+    path = str(tmp_path / "snapshot.jsonl.gz")
+    source = TieredCache(ResponseCache())
+    source.put("current", [{"g1": ["g1c0"]}], ttl=600, pattern="youtube", revision="r2")
+    source.put("outdated", [{"g1": ["g1c1"]}], ttl=600, pattern="youtube", revision="r1")
+    CacheSnapshotter(source, path).save()
+
+    target = TieredCache(ResponseCache())
+    snapshotter = CacheSnapshotter(target, path, current_revision={"youtube": "r2"}.get)
+    await snapshotter.load()
+
+    assert target.get("current") == [{"g1": ["g1c0"]}]
+    assert target.get("outdated") is None
+    assert snapshotter.loaded_entries == 1
+    assert snapshotter.skipped_outdated == 1
+
+
+@pytest.mark.asyncio
+async def test_workers_saving_to_one_path_merge_their_entries(tmp_path):
+    path = str(tmp_path / "snapshot.jsonl.gz")
+    first_worker = TieredCache(ResponseCache())
+    first_worker.put("only-first", [], ttl=600)
+    first_worker.put("shared", ["cold"], ttl=600)
+    second_worker = TieredCache(ResponseCache())
+    second_worker.put("only-second", [], ttl=600)
+    second_worker.put("shared", ["hot"], ttl=600)
+    for _ in range(3):
+        second_worker.get("shared")
+
+    CacheSnapshotter(first_worker, path).save()
+    second = CacheSnapshotter(second_worker, path)
+    second.save()
+
+    target = TieredCache(ResponseCache())
+    await CacheSnapshotter(target, path).load()
+
+    assert target.get("only-first") == [] and target.get("only-second") == []
+    assert target.get("shared") == ["hot"]
+    assert second.last_written_entries == 3
+    assert second.last_merged_entries == 1
+
+
+def test_merge_drops_expired_entries_and_keeps_the_hottest(tmp_path):
+    snapshotter = CacheSnapshotter(TieredCache(ResponseCache()), str(tmp_path / "s.gz"), max_entries=2)
+    item = lambda key, hits, stale_until: {"k": key, "v": [], "e": stale_until, "s": stale_until, "h": hits, "m": {}}
+
+    merged = snapshotter.merge([item("a", 1, 200), item("b", 5, 200)],
+                               [item("c", 9, 50), item("d", 3, 200), item("a", 0, 200)], now=100)
+
+    assert [entry["k"] for entry in merged] == ["b", "d"]
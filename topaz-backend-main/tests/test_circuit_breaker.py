@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from circuit_breaker import AsyncCircuitBreaker, CircuitBreakerOpenError
+
+
+async def fail():
+    raise ConnectionError("provider down")
+
+
+async def succeed(delay=0.0):
+    await asyncio.sleep(delay)
+    return "ok"
+
+
+async def open_breaker(**overrides):
+    options = dict(min_calls=2, failure_rate_threshold=50.0, reset_timeout=0.05)
+    options.update(overrides)
+    breaker = AsyncCircuitBreaker(name="test", **options)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            await breaker.call(fail)
+    assert breaker.state == 'OPEN'
+    return breaker
+
+
+@pytest.mark.asyncio
+async def test_open_breaker_rejects_without_calling():
+    breaker = await open_breaker(reset_timeout=60)
+    calls = []
+
+    async def tracked():
+        calls.append(1)
+
+    with pytest.raises(CircuitBreakerOpenError):
+        await breaker.call(tracked)
+    assert calls == []
+    assert not breaker.allows_calls()
+    assert breaker.total_rejections == 1
+
+
+@pytest.mark.asyncio
+async def test_half_open_admits_one_probe_and_its_success_closes():
+    breaker = await open_breaker()
+    await asyncio.sleep(0.06)
+    assert breaker.allows_calls()
+
+    probe = asyncio.create_task(breaker.call(succeed, 0.05))
+    await asyncio.sleep(0)
+    assert breaker.state == 'HALF_OPEN'
+    assert not breaker.allows_calls()
+    with pytest.raises(CircuitBreakerOpenError):
+        await breaker.call(succeed)
+
+    assert await probe == "ok"
+    assert breaker.state == 'CLOSED'
+    assert await breaker.call(succeed) == "ok"
+
+
+@pytest.mark.asyncio
+async def test_failed_probe_reopens_the_breaker():
+    breaker = await open_breaker()
+    await asyncio.sleep(0.06)
+
+    with pytest.raises(ConnectionError):
+        await breaker.call(fail)
+
+    assert breaker.state == 'OPEN'
+    with pytest.raises(CircuitBreakerOpenError):
+        await breaker.call(succeed)
+    assert breaker.state_changes['OPEN'] == 2
+
+
+@pytest.mark.asyncio
+async def test_slow_probe_counts_as_failure():
+    breaker = await open_breaker(slow_call_seconds=0.02)
+    await asyncio.sleep(0.06)
+
+    assert await breaker.call(succeed, 0.03) == "ok"
+
+    assert breaker.state == 'OPEN'
+
+
+@pytest.mark.asyncio
+async def test_cancelled_probe_frees_the_slot():
+    breaker = await open_breaker()
+    await asyncio.sleep(0.06)
+
+    probe = asyncio.create_task(breaker.call(succeed, 1))
+    await asyncio.sleep(0)
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+
+    assert breaker.state == 'HALF_OPEN'
+    assert breaker.half_open_in_flight == 0
+    assert await breaker.call(succeed) == "ok"
+    assert breaker.state == 'CLOSED'
@@ -0,0 +1,65 @@
+from grid_budget import BASELINE_CHILDREN_PER_GRID, GridTrimmer, TokenCounter
+
+
+def page(grid_count, children_per_grid, text="Some long feed item title that keeps going for a while {}"):
+    return {
+        "totalGrids": grid_count,
+        "grids": [{
+            "id": f"g{g}",
+            "gridText": "ignored",
+            "totalChildren": children_per_grid,
+            "children": [{"id": f"g{g}c{c}", "text": text.format(f"{g}-{c}") * 3}
+                         for c in range(children_per_grid)],
+        } for g in range(1, grid_count + 1)],
+    }
+
+
+def test_every_grid_of_a_five_grid_page_is_represented():
+    trimmer = GridTrimmer(counter=TokenCounter("chars/4"))
+    cleaned, usage = trimmer.trim(page(5, 30))
+
+    assert usage["grids"] == 5
+    for grid in cleaned["grids"]:
+        # Baseline-equivalent: at least the 10 most visible children of every grid, in order
+        ids = [child["id"] for child in grid["children"]]
+        assert len(ids) >= BASELINE_CHILDREN_PER_GRID
+        assert ids == [f"{grid['id']}c{c}" for c in range(len(ids))]
+        assert "gridText" not in grid
+
+
+def test_budget_is_per_grid():
+    trimmer = GridTrimmer(counter=TokenCounter("chars/4"))
+    _, one_grid = trimmer.trim(page(1, 30))
+    _, five_grids = trimmer.trim(page(5, 30))
+
+    assert five_grids["tokens_used"] == 5 * one_grid["tokens_used"]
+    assert one_grid["tokens_used"] <= trimmer.token_budget
+
+
+def test_repeated_texts_get_no_extra_budget():
+    trimmer = GridTrimmer(token_budget=400, counter=TokenCounter("chars/4"))
+    repeated = page(2, 1, text="The same long trending headline repeated on both grids {}")
+    for grid in repeated["grids"]:
+        grid["children"][0]["text"] = "The same long trending headline repeated on both grids " * 3
+    cleaned, _ = trimmer.trim(repeated)
+
+    first, second = (grid["children"][0]["text"] for grid in cleaned["grids"])
+    assert len(second) < len(first)
+    assert second.endswith("...")
+
+
+def test_leftover_budget_goes_to_the_most_informative_text_first():
+    trimmer = GridTrimmer(token_budget=62, counter=TokenCounter("chars/4"))
+    grid = {"totalGrids": 1, "grids": [{"id": "g1", "totalChildren": 3, "children": [
+        {"id": "g1c0", "text": "Celebrity gossip roundup weekly"},
+        {"id": "g1c1", "text": "Celebrity gossip roundup weekly celebrity gossip roundup weekly celebrity gossip"},
+        {"id": "g1c2", "text": "Restoring a rusty cast iron skillet with salt, potatoes and patience today"},
+    ]}]}
+    cleaned, usage = trimmer.trim(grid)
+
+    texts = {child["id"]: child["text"] for child in cleaned["grids"][0]["children"]}
+    head = trimmer.min_child_tokens * 4 + len("...")
+    # The mostly repeated text keeps its head; the leftover lengthens the novel one after it
+    assert len(texts["g1c1"]) <= head
+    assert len(texts["g1c2"]) > head
+    assert usage["tokens_used"] <= 62
@@ -0,0 +1,71 @@
+import pytest
+
+from llm_providers import HedgedRouter, MockProvider
+
+
+def answering(name, delay=0.0, fail=False, text=None):
+    return MockProvider(name=name, responder=lambda payload, context: text if text is not None else name,
+                        delay=delay, fail=fail)
+
+
+def router(*providers):
+    return HedgedRouter(list(providers), min_delay=0.02, default_delay=0.05)
+
+
+@pytest.mark.asyncio
+async def test_fast_primary_is_never_hedged():
+    primary, backup = answering("primary"), answering("backup")
+    hedged = router(primary, backup)
+
+    assert await hedged.complete({}) == ("primary", "primary")
+    assert backup.calls == 0
+    assert hedged.hedges_sent == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged_and_cancelled_when_backup_wins():
+    primary, backup = answering("primary", delay=1.0), answering("backup")
+    hedged = router(primary, backup)
+
+    assert await hedged.complete({}) == ("backup", "backup")
+    assert hedged.hedges_sent == 1
+    assert hedged.hedge_wins == 1
+    assert primary.cancelled == 1
+
+
+@pytest.mark.asyncio
+async def test_primary_answer_after_the_hedge_still_wins():
+    primary, backup = answering("primary", delay=0.08), answering("backup", delay=1.0)
+    hedged = router(primary, backup)
+
+    assert await hedged.complete({}) == ("primary", "primary")
+    assert hedged.hedges_sent == 1
+    assert backup.cancelled == 1
+
+
+@pytest.mark.asyncio
+async def test_failure_fails_over_without_waiting_for_the_hedge_delay():
+    primary, backup = answering("primary", fail=True), answering("backup")
+    hedged = HedgedRouter([primary, backup], default_delay=5.0)
+
+    assert await hedged.complete({}) == ("backup", "backup")
+    assert hedged.hedges_sent == 0
+    assert primary.errors == 1
+
+
+@pytest.mark.asyncio
+async def test_valid_empty_answer_is_not_hedged():
+    primary, backup = answering("primary", text=""), answering("backup")
+    hedged = router(primary, backup)
+
+    assert await hedged.complete({}, validate=lambda text: True) == ("", "primary")
+    assert backup.calls == 0
+
+
+@pytest.mark.asyncio
+async def test_invalid_answer_fails_over_and_is_kept_as_last_resort():
+    primary, backup = answering("primary", text="garbage"), answering("backup", text="also garbage")
+    hedged = router(primary, backup)
+
+    assert await hedged.complete({}, validate=lambda text: False) == ("garbage", "primary")
+    assert backup.calls == 1
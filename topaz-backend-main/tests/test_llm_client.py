@@ -0,0 +1,65 @@
+import asyncio
+import time
+
+import pytest
+
+from llm_client import PoolConfig, ProviderClient
+
+
+async def serve(respond: bool):
+    """Local HTTP/1.1 keep-alive server; with respond=False it accepts and never answers"""
+    async def handle(reader, writer):
+        try:
+            while True:
+                request = await reader.readuntil(b"\r\n\r\n")
+                if not respond:
+                    await asyncio.sleep(3600)
+                length = 0
+                for line in request.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":")[1])
+                if length:
+                    await reader.readexactly(length)
+                body = b"" if request.startswith(b"HEAD") else b"{}"
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\nContent-Type: application/json\r\n\r\n" + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+
+
+@pytest.mark.asyncio
+async def test_warm_up_connection_is_not_counted_as_an_avoided_handshake():
+    server, url = await serve(respond=True)
+    client = ProviderClient("test", url, {}, PoolConfig(http2=False))
+    try:
+        await client.warm_up()
+        stats = client.get_stats()
+        assert stats["warmed_up"] and stats["warmup_connections"] == 1
+        assert stats["total_requests"] == 0 and stats["handshakes_avoided"] == 0
+
+        await client.post("/v1/chat/completions", json={})
+        stats = client.get_stats()
+        assert stats["total_requests"] == 1 and stats["connections_opened"] == 0
+        assert stats["handshakes_avoided"] == 1
+    finally:
+        await client.close()
+        server.close()
+
+
+@pytest.mark.asyncio
+async def test_warm_up_gives_up_after_its_own_timeout():
+    server, url = await serve(respond=False)
+    client = ProviderClient("test", url, {}, PoolConfig(http2=False, read_timeout=30, warm_up_timeout=0.2))
+    try:
+        start = time.monotonic()
+        await client.warm_up()
+        assert time.monotonic() - start < 2
+        assert not client.warmed_up
+    finally:
+        await client.close()
+        server.close()
@@ -0,0 +1,122 @@
+import asyncio
+import time
+
+import pytest
+
+from micro_batcher import MicroBatcher
+
+
+def one_grid(*texts):
+    children = [{"id": f"g1c{i}", "text": text} for i, text in enumerate(texts)]
+    return {"totalGrids": 1, "grids": [{"id": "g1", "children": children, "totalChildren": len(children)}]}
+
+
+def hide_matching(word):
+    """dispatch that hides every batch child whose text contains word"""
+    calls = []
+
+    async def dispatch(context, batch_grid):
+        calls.append((time.monotonic(), batch_grid))
+        await asyncio.sleep(0.01)
+        return "\n".join(child["id"] for grid in batch_grid["grids"] for child in grid["children"]
+                         if word in child["text"])
+    return dispatch, calls
+
+
+@pytest.mark.asyncio
+async def test_batch_flushes_after_the_window():
+    dispatch, calls = hide_matching("drama")
+    batcher = MicroBatcher(dispatch, window_ms=50, max_batch_children=100)
+
+    start = time.monotonic()
+    results = await asyncio.gather(
+        batcher.submit("profile", one_grid("drama one", "cats"), None),
+        batcher.submit("profile", one_grid("dogs", "drama two"), None),
+    )
+
+    assert results == [["g1c0"], ["g1c1"]]
+    assert len(calls) == 1
+    assert calls[0][0] - start >= 0.045
+    assert batcher.requests_batched == 2
+
+
+@pytest.mark.asyncio
+async def test_full_batch_flushes_without_waiting_for_the_window():
+    dispatch, calls = hide_matching("drama")
+    batcher = MicroBatcher(dispatch, window_ms=5000, max_batch_children=2)
+
+    start = time.monotonic()
+    results = await asyncio.gather(
+        batcher.submit("profile", one_grid("drama"), None),
+        batcher.submit("profile", one_grid("cats"), None),
+    )
+
+    assert results == [["g1c0"], []]
+    assert calls[0][0] - start < 1
+    assert not batcher.running
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_affect_the_rest_of_the_batch():
+    dispatch, calls = hide_matching("drama")
+    batcher = MicroBatcher(dispatch, window_ms=20, max_batch_children=100)
+
+    leaving = asyncio.create_task(batcher.submit("profile", one_grid("drama gone"), None))
+    staying = asyncio.create_task(batcher.submit("profile", one_grid("drama stays"), None))
+    await asyncio.sleep(0)
+    leaving.cancel()
+
+    assert await staying == ["g1c0"]
+    assert leaving.cancelled()
+    await batcher.drain()
+    assert batcher.batch_failures == 0
+
+
+@pytest.mark.asyncio
+async def test_dispatch_failure_reaches_every_waiter():
+    async def failing_dispatch(context, batch_grid):
+        raise RuntimeError("provider down")
+
+    batcher = MicroBatcher(failing_dispatch, window_ms=10, max_batch_children=100)
+    results = await asyncio.gather(
+        batcher.submit("profile", one_grid("a"), None),
+        batcher.submit("profile", one_grid("b"), None),
+        return_exceptions=True,
+    )
+
+    assert [type(result) for result in results] == [RuntimeError, RuntimeError]
+    assert batcher.batch_failures == 1
+
+
+@pytest.mark.asyncio
+async def test_drain_dispatches_pending_batches_and_waits_for_them():
+    dispatch, calls = hide_matching("drama")
+    batcher = MicroBatcher(dispatch, window_ms=5000, max_batch_children=100)
+
+    waiter = asyncio.create_task(batcher.submit("profile", one_grid("drama"), None))
+    await asyncio.sleep(0)
+    await batcher.drain()
+
+    assert len(calls) == 1
+    assert not batcher.pending and not batcher.running
+    assert await waiter == ["g1c0"]
+
+
+@pytest.mark.asyncio
+async def test_unparseable_batch_answer_resolves_every_waiter_with_none():
+    async def prose_dispatch(context, batch_grid):
+        return "I cannot classify these items, g9c9 maybe."
+
+    def parse(text, batch_grid):
+        valid = {child["id"] for grid in batch_grid["grids"] for child in grid["children"]}
+        found = [child_id for child_id in text.split() if child_id in valid]
+        return found or None
+
+    batcher = MicroBatcher(prose_dispatch, window_ms=10, max_batch_children=100, parse=parse)
+    results = await asyncio.gather(
+        batcher.submit("profile", one_grid("drama"), None),
+        batcher.submit("profile", one_grid("cats"), None),
+    )
+
+    assert results == [None, None]
+    assert batcher.unparseable_batches == 1
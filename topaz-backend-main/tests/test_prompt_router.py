@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from prompt_router import DEFAULT_PATTERN, PromptRouter
+
+YOUTUBE_HOME = r'^(https?://)?(www\.)?youtube\.com/?$'
+YOUTUBE_SEARCH = r'^(https?://)?(www\.)?youtube\.com/results\?.*search_query=.*$'
+
+
+@pytest.fixture
+def router():
+    with open("prompts_simplified.json") as f:
+        return PromptRouter(json.load(f))
+
+
+def test_tracking_params_share_one_memo_entry(router):
+    first = router.route("https://www.youtube.com/results?search_query=cats&utm_source=newsletter")
+    second = router.route("https://www.youtube.com/results?search_query=cats&si=abc123#t=10")
+
+    assert first == second == (YOUTUBE_SEARCH, "cats")
+    assert len(router.memo) == 1
+    assert router.hits == 1 and router.misses == 1
+
+
+def test_params_the_patterns_read_are_kept(router):
+    assert router.query_params == {"search_query"}
+    assert router.route("https://www.youtube.com/results?search_query=cats").search_query == "cats"
+    assert router.route("https://www.youtube.com/results?search_query=dogs").search_query == "dogs"
+    assert router.route("https://www.youtube.com/results?sp=EgIQAQ").pattern == DEFAULT_PATTERN
+    assert len(router.memo) == 3
+
+
+@pytest.mark.parametrize("url, pattern", [
+    ("https://www.youtube.com/", YOUTUBE_HOME),
+    ("youtube.com", YOUTUBE_HOME),
+    ("https://www.youtube.com/?utm_source=share", YOUTUBE_HOME),
+    ("https://x.com/home", r'^(https?://)?(www\.)?(twitter\.com|x\.com).*$'),
+    ("https://www.linkedin.com/feed/?trk=nav", r'^(https?://)?(www\.)?(linkedin\.com)/feed(/.*)?$'),
+    ("https://example.com/?q=news", DEFAULT_PATTERN),
+])
+def test_routes(router, url, pattern):
+    assert router.route(url).pattern == pattern
+
+
+# Routing reads only the scheme, host, path and the query parameters patterns name; these
+# pin down what that means for URLs the raw patterns would have treated differently
+@pytest.mark.parametrize("url, pattern", [
+    # Unnamed parameters and fragments are dropped, so these are the home page
+    ("https://www.youtube.com/?app=desktop", YOUTUBE_HOME),
+    ("https://www.youtube.com/#x", YOUTUBE_HOME),
+    ("youtube.com/?app=desktop&feature=share#top", YOUTUBE_HOME),
+    # The search parameter is kept, whatever comes around it
+    ("https://www.youtube.com/results?app=desktop&search_query=cats#x", YOUTUBE_SEARCH),
+    # Lookalike hosts only get their own site's patterns, not a prefix match on another site's
+    ("https://x.com.evil.com/home", DEFAULT_PATTERN),
+    ("https://twitter.com.example.org/", DEFAULT_PATTERN),
+    ("https://youtube.com.evil.com/", DEFAULT_PATTERN),
+])
+def test_routing_reads_the_reduced_url(router, url, pattern):
+    assert router.route(url).pattern == pattern
+
+
+def test_reduced_url_is_the_memo_key(router):
+    router.route("https://www.youtube.com/?app=desktop")
+    router.route("https://www.youtube.com/#x")
+
+    assert list(router.memo) == ["https://www.youtube.com/"]
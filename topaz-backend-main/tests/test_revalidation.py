@@ -0,0 +1,137 @@
+import asyncio
+import time
+
+import pytest
+
+import main
+from llm_providers import HedgedRouter, MockProvider
+from revalidation import Revalidator
+
+
+async def sleeper(delay=0.05, error=None):
+    await asyncio.sleep(delay)
+    if error is not None:
+        raise error
+    return "fresh"
+
+
+@pytest.mark.asyncio
+async def test_one_refresh_per_key_while_in_flight():
+    revalidator = Revalidator(max_concurrency=4)
+
+    assert revalidator.schedule("key", sleeper)
+    assert not revalidator.schedule("key", sleeper)
+    await asyncio.gather(*revalidator.in_flight.values())
+
+    assert (revalidator.scheduled, revalidator.deduplicated, revalidator.completed) == (1, 1, 1)
+    assert revalidator.schedule("key", sleeper)
+    await revalidator.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_refreshes_over_budget_are_dropped_not_queued():
+    revalidator = Revalidator(max_concurrency=2)
+
+    started = [revalidator.schedule(f"key{i}", sleeper) for i in range(4)]
+
+    assert started == [True, True, False, False]
+    assert revalidator.over_budget == 2
+    await revalidator.shutdown()
+    assert revalidator.in_flight == {}
+
+
+@pytest.mark.asyncio
+async def test_failed_refresh_is_counted_and_frees_the_key():
+    revalidator = Revalidator()
+
+    revalidator.schedule("key", sleeper, 0, RuntimeError("provider down"))
+    await asyncio.gather(*revalidator.in_flight.values(), return_exceptions=True)
+
+    assert revalidator.failed == 1
+    assert "key" not in revalidator.in_flight
+
+
+@pytest.mark.asyncio
+async def test_refresh_finishing_after_an_invalidation_does_not_recache(monkeypatch):
+    provider = MockProvider(responder=lambda payload, context: "", delay=0.1)
+    monkeypatch.setattr(main, "llm_router", HedgedRouter([provider]))
+    main.response_store.l1.clear()
+    main.verdict_cache.entries.clear()
+
+    texts = ["A long video about celebrity drama tonight", "Learning to knit a scarf for beginners"]
+    analysis_request = main.GridAnalysisRequest(
+        gridStructure={"totalGrids": 1, "grids": [{
+            "id": "g1", "totalChildren": 2,
+            "children": [{"id": f"g1c{i}", "text": text} for i, text in enumerate(texts)],
+        }]},
+        currentUrl="https://www.youtube.com/", whitelist=[], blacklist=["race test"], visitorId="race",
+    )
+    cleaned_grid, child_hashes = main.prepare_cleaned_grid(analysis_request)
+    cache_key = main.get_cache_key(cleaned_grid, analysis_request.currentUrl, analysis_request.whitelist,
+                                   analysis_request.blacklist, child_hashes)
+    pattern = main.get_prompt_pattern_for_url(analysis_request.currentUrl)
+
+    main.schedule_cache_refresh(analysis_request, cleaned_grid, child_hashes, cache_key, "race")
+    main.schedule_cache_refresh(analysis_request, cleaned_grid, child_hashes, cache_key, "race")
+    assert list(main.revalidator.in_flight) == [cache_key]
+
+    # The pattern is invalidated while the refresh is still waiting on the model
+    await asyncio.sleep(0.03)
+    await main.cache_inspector.invalidate(pattern=pattern)
+    await asyncio.gather(*main.revalidator.in_flight.values())
+
+    assert provider.calls == 1
+    cached = await main.response_store.alookup(cache_key)
+    assert cached.value is None
+
+    # A refresh started after the invalidation caches normally
+    time.sleep(0.01)
+    main.schedule_cache_refresh(analysis_request, cleaned_grid, child_hashes, cache_key, "race")
+    await asyncio.gather(*main.revalidator.in_flight.values())
+    cached = await main.response_store.alookup(cache_key)
+    assert cached.value == []
+
+
+@pytest.mark.asyncio
+async def test_shutdown_stops_the_analysis_behind_a_refresh(monkeypatch):
+    provider = MockProvider(responder=lambda payload, context: "", delay=5)
+    monkeypatch.setattr(main, "llm_router", HedgedRouter([provider]))
+    main.verdict_cache.entries.clear()
+    analysis_request = main.GridAnalysisRequest(
+        gridStructure={"totalGrids": 1, "grids": [{
+            "id": "g1", "totalChildren": 1,
+            "children": [{"id": "g1c0", "text": "A slow refresh that is still running at shutdown"}],
+        }]},
+        currentUrl="https://www.youtube.com/", whitelist=[], blacklist=["shutdown test"], visitorId="shutdown",
+    )
+    cleaned_grid, child_hashes = main.prepare_cleaned_grid(analysis_request)
+    cache_key = main.get_cache_key(cleaned_grid, analysis_request.currentUrl, analysis_request.whitelist,
+                                   analysis_request.blacklist, child_hashes)
+
+    main.schedule_cache_refresh(analysis_request, cleaned_grid, child_hashes, cache_key, "shutdown")
+    await asyncio.sleep(0.05)
+    assert provider.calls == 1
+
+    await main.revalidator.shutdown()
+    await main.analysis_singleflight.shutdown()
+
+    assert provider.cancelled == 1
+    assert main.analysis_singleflight.in_flight == {}
+
+
+@pytest.mark.asyncio
+async def test_old_invalidations_are_forgotten_and_old_results_not_cached(monkeypatch):
+    inspector = main.CacheInspector(main.response_store, max_compute_seconds=60)
+    now = time.time()
+    for i in range(5):
+        await inspector.invalidate(pattern=f"pattern-{i}")
+    assert len(inspector.invalidated_at) == 5
+
+    monkeypatch.setattr("cache_introspection.time.time", lambda: now + 120)
+    await inspector.invalidate(pattern="fresh")
+
+    assert list(inspector.invalidated_at) == [frozenset({("pattern", "fresh")})]
+    assert not inspector.should_drop_write(now + 100, {"pattern": "pattern-1"})
+    assert inspector.should_drop_write(now + 100, {"pattern": "fresh"})
+    # Started before anything still remembered: cannot tell, so not cached
+    assert inspector.should_drop_write(now, {"pattern": "other"})
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from singleflight import Singleflight
+
+
+def counting(result="done", delay=0.05, error=None):
+    """coroutine function that records each start and returns result after delay"""
+    starts = []
+
+    async def work(tag):
+        starts.append(tag)
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return result
+    return work, starts
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_collapse_onto_one_call():
+    flight = Singleflight()
+    work, starts = counting()
+
+    results = await asyncio.gather(*(flight.do("key", work, i) for i in range(5)))
+
+    assert results == ["done"] * 5
+    assert starts == [0]
+    assert (flight.leaders, flight.collapsed) == (1, 4)
+    assert flight.in_flight == {}
+
+
+@pytest.mark.asyncio
+async def test_different_keys_do_not_collapse():
+    flight = Singleflight()
+    work, starts = counting()
+
+    await asyncio.gather(flight.do("a", work, "a"), flight.do("b", work, "b"))
+
+    assert sorted(starts) == ["a", "b"]
+    assert flight.collapsed == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_does_not_cancel_the_shared_work():
+    flight = Singleflight()
+    work, starts = counting(delay=0.1)
+
+    leader = asyncio.create_task(flight.do("key", work, "leader"))
+    await asyncio.sleep(0.01)
+    follower = asyncio.create_task(flight.do("key", work, "follower"))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+
+    assert await follower == "done"
+    assert leader.cancelled()
+    assert starts == ["leader"]
+    assert flight.abandoned_waiters == 1
+
+
+@pytest.mark.asyncio
+async def test_an_error_reaches_every_waiter_and_frees_the_key():
+    flight = Singleflight()
+    work, starts = counting(error=ValueError("boom"))
+
+    results = await asyncio.gather(*(flight.do("key", work, i) for i in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert starts == [0]
+    assert flight.errors == 1
+    assert flight.in_flight == {}
+
+    ok, _ = counting(result="retried", delay=0)
+    assert await flight.do("key", ok, "retry") == "retried"
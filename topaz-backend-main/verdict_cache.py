@@ -0,0 +1,154 @@
+"""
+Per-child verdict cache
+Remembers the model's hide/keep decision for each feed item so repeated children
+(refreshes, infinite scroll) never go back to the LLM for the same filter profile
+"""
+
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Any
+
+from cache_keys import canonical_terms, hash_child_text, normalize_child_text
+
+
+def build_profile_key(whitelist: Optional[List[str]], blacklist: Optional[List[str]],
+                      prompt_pattern: str, search_query: Optional[str] = None,
+                      prompt_revision: Optional[str] = None) -> str:
+    """
+    Hash of everything besides the child text that can change a verdict:
+    the canonical whitelist/blacklist and the URL prompt pattern (plus the
+    search query on search-result pages, where relevance depends on it).
+    prompt_revision (the pattern's prompt content hash) retires verdicts when a prompt is edited.
+    """
+    parts = [
+        'w:' + '\x1f'.join(canonical_terms(whitelist)),
+        'b:' + '\x1f'.join(canonical_terms(blacklist)),
+        'p:' + (prompt_pattern or ''),
+        'q:' + normalize_child_text(search_query or ''),
+    ]
+    if prompt_revision:
+        parts.append('r:' + prompt_revision)
+    return hashlib.blake2b('\x1e'.join(parts).encode('utf-8'), digest_size=16).hexdigest()
+
+
+class VerdictCache:
+    """
+    LRU + TTL map of (child text hash, profile key) -> hide verdict
+    """
+
+    def __init__(self, max_entries: int = 50000, ttl: float = 1800):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: "OrderedDict[Tuple[str, str], Tuple[bool, float]]" = OrderedDict()
+        # Metrics for monitoring
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def get(self, text_hash: str, profile_key: str) -> Optional[bool]:
+        key = (text_hash, profile_key)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        hide, stored_at = entry
+        if time.time() - stored_at > self.ttl:
+            del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return hide
+
+    def put(self, text_hash: str, profile_key: str, hide: bool):
+        key = (text_hash, profile_key)
+        self.entries[key] = (hide, time.time())
+        self.entries.move_to_end(key)
+        self.stores += 1
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate_profile(self, profile_key: str) -> int:
+        """Drop every verdict stored under a filter profile"""
+        keys = [key for key in self.entries if key[1] == profile_key]
+        for key in keys:
+            del self.entries[key]
+        return len(keys)
+
+    def partition_grid(self, cleaned_grid: Dict, profile_key: str,
+                       text_hashes: Optional[Dict[str, str]] = None) -> Tuple[List[str], Dict, int]:
+        """
+        Split a cleaned grid into cached verdicts and the children still needing the model.
+        text_hashes (child ID -> hash_child_text) skips re-hashing children already hashed for the request.
+
+        Returns (cached hide IDs, grid of uncached children in the same shape, cached child count)
+        """
+        text_hashes = text_hashes or {}
+        cached_hide_ids = []
+        cached_count = 0
+        uncached_grids = []
+
+        for grid in cleaned_grid.get('grids', []):
+            uncached_children = []
+            for child in grid.get('children', []):
+                child_id = child.get('id')
+                if not child_id:
+                    continue
+                text_hash = text_hashes.get(child_id) or hash_child_text(child.get('text', ''))
+                verdict = self.get(text_hash, profile_key)
+                if verdict is None:
+                    uncached_children.append(child)
+                    continue
+                cached_count += 1
+                if verdict:
+                    cached_hide_ids.append(child_id)
+            if uncached_children:
+                uncached_grid = dict(grid)
+                uncached_grid['children'] = uncached_children
+                uncached_grids.append(uncached_grid)
+
+        uncached = {k: v for k, v in cleaned_grid.items() if k != 'grids'}
+        uncached['totalGrids'] = len(uncached_grids)
+        uncached['grids'] = uncached_grids
+        return cached_hide_ids, uncached, cached_count
+
+    def store_grid_verdicts(self, cleaned_grid: Dict, hide_ids: List[str], profile_key: str,
+                            text_hashes: Optional[Dict[str, str]] = None):
+        """Record a hide/keep verdict for every child the model was shown"""
+        hide_set = set(hide_ids)
+        text_hashes = text_hashes or {}
+        for grid in cleaned_grid.get('grids', []):
+            for child in grid.get('children', []):
+                child_id = child.get('id')
+                if child_id:
+                    text_hash = text_hashes.get(child_id) or hash_child_text(child.get('text', ''))
+                    self.put(text_hash, profile_key, child_id in hide_set)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate_percent': round(self.hits / lookups * 100, 2) if lookups else 0,
+            'stores': self.stores,
+            'evictions': self.evictions,
+        }
+
+
+def order_child_ids(cleaned_grid: Dict, child_ids: List[str]) -> List[str]:
+    """Return the given IDs de-duplicated and in the grid's original child order"""
+    wanted = set(child_ids)
+    ordered = []
+    for grid in cleaned_grid.get('grids', []):
+        for child in grid.get('children', []):
+            child_id = child.get('id')
+            if child_id in wanted:
+                ordered.append(child_id)
+                wanted.discard(child_id)
+    return ordered
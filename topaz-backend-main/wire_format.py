@@ -0,0 +1,69 @@
+"""
+Wire formats for the grid sent to the model
+"json" is the original indented JSON dump; "compact" is one `id<TAB>text` line per child
+with gridText dropped (it is only the children's text joined again)
+"""
+
+import re
+import json
+from typing import Any, Dict
+
+WIRE_FORMATS = ("json", "compact")
+
+_LINE_BREAKS_RE = re.compile(r'\s*[\r\n]+\s*')
+_SPACES_RE = re.compile(r'[ \t\f\v]+')
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), same heuristic as the chunk estimator"""
+    return len(text or '') // 4
+
+
+def compact_child_text(text: str) -> str:
+    """Single-line child text: line breaks become ' | ', tabs and runs of spaces collapse"""
+    text = _LINE_BREAKS_RE.sub(' | ', (text or '').strip())
+    return _SPACES_RE.sub(' ', text)
+
+
+def serialize_grid(llm_grid: Dict, wire_format: str = "json") -> str:
+    """Serialize the grid for the user message in the requested wire format"""
+    if wire_format != "compact":
+        return json.dumps(llm_grid, indent=2)
+    lines = []
+    for grid in llm_grid.get('grids', []):
+        for child in grid.get('children', []):
+            child_id = child.get('id')
+            if child_id:
+                lines.append(f"{child_id}\t{compact_child_text(child.get('text', ''))}")
+    return "\n".join(lines)
+
+
+class WireFormatStats:
+    """Estimated tokens sent and saved (vs. the JSON format) per prompt pattern"""
+
+    def __init__(self):
+        self.patterns: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, pattern: str, wire_format: str, tokens_sent: int, tokens_saved: int):
+        stats = self.patterns.setdefault(pattern, {
+            'wire_format': wire_format,
+            'requests': 0,
+            'tokens_sent': 0,
+            'tokens_saved': 0,
+        })
+        stats['wire_format'] = wire_format
+        stats['requests'] += 1
+        stats['tokens_sent'] += tokens_sent
+        stats['tokens_saved'] += tokens_saved
+
+    def get_stats(self) -> Dict[str, Any]:
+        result = {}
+        for pattern, stats in self.patterns.items():
+            requests = stats['requests']
+            baseline = stats['tokens_sent'] + stats['tokens_saved']
+            result[pattern] = {
+                **stats,
+                'avg_tokens_per_request': round(stats['tokens_sent'] / requests, 1) if requests else 0,
+                'saved_percent': round(stats['tokens_saved'] / baseline * 100, 2) if baseline else 0,
+            }
+        return result